@@ -1,12 +1,17 @@
 import streamlit as st
-from src.retrieval.rag import query_rag
+from src.retrieval.rag import query_rag_stream, get_cache_stats, get_latency_stats
 from src.utils import config
 from src.ingestion.ingest import ingest_data
+from src.ingestion.graph_ingest import ingest_graph
 import subprocess
-from qdrant_client import QdrantClient
 import time
 import json
-from src.utils.neo4j_utils import Neo4jConnection, visualize_chat_graph
+import itertools
+import calendar
+import datetime
+from src.ingestion.metadata import AUDIENCES, DEPARTMENTS
+from src.utils.neo4j_utils import visualize_chat_graph
+from src.utils.clients import current_neo4j_connection, get_health_prober
 
 # --- Page Config ---
 st.set_page_config(
@@ -217,32 +222,20 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
     
-    # Connection Status in Sidebar
-    def check_qdrant_connection():
-        """Check Qdrant connection and return status with collections"""
-        try:
-            # Initialize Qdrant client with cloud configuration
-            qdrant_client = QdrantClient(
-                url=config.QDRANT_HOST,
-                api_key=config.QDRANT_API_KEY,
-                timeout=10.0
-            )
-            
-            # Test connection by getting collections
-            collections = qdrant_client.get_collections().collections
-            collection_names = [collection.name for collection in collections]
-            
-            return True, collection_names
-        except Exception as e:
-            return False, str(e)
-    
-    # Check connection with spinner
+    # Connection status from the background prober (shared by all sessions), not a check per rerun
+    health_prober = get_health_prober()
     with st.spinner("Checking system status..."):
-        qdrant_status, collections = check_qdrant_connection()
+        # Waits briefly only on a new process; after that the results are already there
+        qdrant_health = health_prober.status("qdrant", wait=config.HEALTH_CHECK_WAIT_SECONDS)
+        neo4j_health = health_prober.status("neo4j", wait=config.HEALTH_CHECK_WAIT_SECONDS)
+    qdrant_status = qdrant_health["ok"]  # None while the first check is still running
+    collections = qdrant_health["detail"] if qdrant_status else []
     
     # Display status with colored indicators
     st.markdown("### 📊 System Status")
-    if qdrant_status:
+    if qdrant_status is None:
+        st.info("⏳ Checking Qdrant connection...")
+    elif qdrant_status:
         st.success("🟢 Qdrant Connected")
         if collections:
             st.info(f"📚 Collections: {len(collections)}")
@@ -252,7 +245,16 @@ with st.sidebar:
             st.warning("⚠️ No collections found")
     else:
         st.error("🔴 Qdrant Disconnected")
-        st.error(f"Error: {collections}")
+        st.error(f"Error: {qdrant_health['detail']}")
+    if neo4j_health["ok"] is None:
+        st.info("⏳ Checking Neo4j connection...")
+    elif neo4j_health["ok"]:
+        st.success("🟢 Neo4j Connected")
+    else:
+        st.error("🔴 Neo4j Disconnected")
+        st.error(f"Error: {neo4j_health['detail']}")
+    if qdrant_health["stale"] or neo4j_health["stale"]:
+        st.warning(f"⏳ Status last checked {max(qdrant_health['age_seconds'], neo4j_health['age_seconds']):.0f}s ago")
     
     st.markdown("---")
     
@@ -276,19 +278,62 @@ with st.sidebar:
         "✅" if config.GOOGLE_API_KEY else "❌"
     ), unsafe_allow_html=True)
     
+    # Query embedding cache counters
+    cache_stats = get_cache_stats()
+    query_stats = cache_stats["query"]
+    st.caption(
+        f"🧠 Query cache: {query_stats['hits'] + query_stats['disk_hits']} hits "
+        f"({query_stats['disk_hits']} from disk) • {query_stats['misses']} misses • "
+        f"{query_stats['hit_rate']:.0%} hit rate"
+    )
+    if cache_stats["answer"]:
+        answer_stats = cache_stats["answer"]
+        st.caption(
+            f"💬 Answer cache: {answer_stats['hits']} hits • {answer_stats['misses']} misses • "
+            f"{answer_stats['entries']} stored"
+        )
+    
+    # Answer latency: time to first token vs. full response
+    latency_stats = get_latency_stats()
+    if latency_stats["total"]["count"]:
+        ttft = latency_stats["ttft"]["p50"]
+        st.caption(
+            f"⏱️ First token p50: {f'{ttft:.2f}s' if ttft is not None else 'n/a'} • "
+            f"Total p50: {latency_stats['total']['p50']:.2f}s"
+        )
+    
+    # Search filters, applied through Qdrant payload indexes before vector search
+    st.markdown("---")
+    st.markdown("### 🔎 Search Filters")
+    search_filters = {}
+    if st.checkbox("Filter by issue date"):
+        date_range = st.date_input(
+            "Issued between",
+            value=(datetime.date(datetime.date.today().year, 1, 1), datetime.date.today())
+        )
+        if len(date_range) == 2:
+            search_filters["date_from"] = calendar.timegm(date_range[0].timetuple())
+            search_filters["date_to"] = calendar.timegm(date_range[1].timetuple()) + 86400 - 1
+    search_filters["departments"] = st.multiselect("Department", sorted(DEPARTMENTS.values()))
+    search_filters["audiences"] = st.multiselect(
+        "Meant for",
+        list(AUDIENCES),
+        format_func=lambda audience: audience.replace("_", " ").capitalize()
+    )
+    st.caption("Dates, departments and audiences named in a question are applied too.")
+    
     # Quick Actions
     st.markdown("---")
     st.markdown("### ⚡ Quick Actions")
     
     if st.button("🔄 Refresh Status", use_container_width=True):
+        # The prober thread checks; a hanging service can't freeze the page
+        health_prober.refresh(wait=config.HEALTH_CHECK_WAIT_SECONDS)
         st.rerun()
 
-# Initialize Neo4j connection
-neo4j_conn = Neo4jConnection(
-    config.NEO4J_URI,
-    config.NEO4J_USERNAME,
-    config.NEO4J_PASSWORD
-)
+# Neo4j connection (and chat-log writer) shared by every session and rerun. The health
+# prober's thread opens it; until then (or while Neo4j is down) this is None, without waiting
+neo4j_conn = current_neo4j_connection()
 
 # --- Main Content Area ---
 # Create tabs for better organization
@@ -355,6 +400,12 @@ with tab1:
                         
                         # Run the ingestion process
                         ingest_data()
+
+                        # Circulars, departments, audiences and cross-references into Neo4j
+                        graph_loaded = True
+                        if config.GRAPH_INGEST_ENABLED:
+                            status_text.text("🕸️ Loading circular graph...")
+                            graph_loaded = ingest_graph(neo4j_conn) is not None
                         
                         progress_bar.progress(75)
                         status_text.text("✅ Finalizing...")
@@ -363,10 +414,18 @@ with tab1:
                         progress_bar.progress(100)
                         st.success("🎉 Embeddings created successfully!")
                         
-                        # Show completion message
-                        st.balloons()
-                        time.sleep(1)
-                        st.rerun()
+                        if graph_loaded:
+                            # Show completion message
+                            st.balloons()
+                            time.sleep(1)
+                            st.rerun()
+                        else:
+                            # No rerun, so the warning stays on screen
+                            st.warning(
+                                "⚠️ The circular graph could not be loaded into Neo4j (see the server log). "
+                                "Graph expansion keeps using the previous graph, if any; check the Neo4j "
+                                "connection and create embeddings again, or run `python -m src.ingestion.graph_ingest`."
+                            )
                         
                     finally:
                         # Restore stdout
@@ -387,6 +446,8 @@ with tab1:
                 st.rerun()
         elif qdrant_status and not collections:
             st.warning("⚠️ Create embeddings first to enable chat")
+        elif qdrant_status is None:
+            st.info("⏳ Checking Qdrant connection, refresh the status in a moment")
         else:
             st.error("❌ Fix Qdrant connection to continue")
 
@@ -399,17 +460,32 @@ with tab2:
         # Show visualization at the top
         st.markdown("### 📊 Chat Visualization")
         try:
-            # Get chat data from Neo4j
-            chat_data = neo4j_conn.get_chat_graph()
+            if neo4j_conn is None:
+                raise RuntimeError(f"Neo4j is unavailable ({neo4j_health['detail']})")
+            # Get chat data from Neo4j: the newest page once, then only chats added since
+            if "chat_graph" not in st.session_state:
+                st.session_state.chat_graph = neo4j_conn.get_chat_graph_page()
+            else:
+                known = st.session_state.chat_graph
+                new_chats = neo4j_conn.get_new_chats(known[0]["timestamp"]) if known else neo4j_conn.get_chat_graph_page()
+                st.session_state.chat_graph = (new_chats + known)[:config.CHAT_GRAPH_MAX_CHATS]
+            chat_data = st.session_state.chat_graph
             
             # Add clear visualization button
             col1, col2, col3 = st.columns([1, 1, 1])
+            with col1:
+                can_load_older = chat_data and len(chat_data) < config.CHAT_GRAPH_MAX_CHATS
+                if can_load_older and st.button("⏪ Load Older Chats", use_container_width=True):
+                    older = neo4j_conn.get_chat_graph_page(before=chat_data[-1]["timestamp"])
+                    st.session_state.chat_graph = (chat_data + older)[:config.CHAT_GRAPH_MAX_CHATS]
+                    st.rerun()
             with col2:
                 if st.button("🗑️ Clear Visualization", use_container_width=True):
                     try:
                         with neo4j_conn.driver.session() as session:
-                            # Delete all nodes and relationships
-                            session.run("MATCH (n) DETACH DELETE n")
+                            # Delete the chat log only; the circular graph lives in the same database
+                            session.run("MATCH (n) WHERE n:Chat OR n:Source DETACH DELETE n")
+                        st.session_state.chat_graph = []
                         st.success("✅ Visualization cleared successfully!")
                         st.rerun()
                     except Exception as e:
@@ -476,48 +552,60 @@ with tab2:
                     
                     # Generate response with animated loading
                     with st.chat_message("assistant", avatar="🤖"):
-                        with st.spinner("🧠 Thinking..."):
-                            try:
-                                response, sources = query_rag(prompt)
-                                
-                                # Display response with typing effect simulation
-                                st.markdown(f"**Assistant:** {response}")
-                                
-                                if sources:
-                                    with st.expander("📚 View Sources", expanded=False):
-                                        # Try to parse sources as JSON
-                                        try:
-                                            sources_json = json.loads(sources)
-                                            if isinstance(sources_json, list):
-                                                for i, source in enumerate(sources_json, 1):
-                                                    st.markdown(f"**Source {i}:**")
-                                                    st.markdown(source.get("content", str(source)))
-                                                    st.markdown("---")
-                                            else:
-                                                st.markdown(sources)
-                                        except:
+                        try:
+                            response = ""
+                            sources = ""
+                            response_placeholder = st.empty()
+                            events = query_rag_stream(prompt, search_filters)
+                            
+                            # Spinner covers retrieval, until the first token arrives
+                            with st.spinner("🧠 Thinking..."):
+                                first_event = next(events, None)
+                            
+                            # Render tokens as they stream in
+                            for kind, value in itertools.chain([first_event] if first_event else [], events):
+                                if kind == "text":
+                                    response += value
+                                    response_placeholder.markdown(f"**Assistant:** {response}▌")
+                                else:
+                                    sources = value
+                            response_placeholder.markdown(f"**Assistant:** {response}")
+                            
+                            if sources:
+                                with st.expander("📚 View Sources", expanded=False):
+                                    # Try to parse sources as JSON
+                                    try:
+                                        sources_json = json.loads(sources)
+                                        if isinstance(sources_json, list):
+                                            for i, source in enumerate(sources_json, 1):
+                                                st.markdown(f"**Source {i}:**")
+                                                st.markdown(source.get("content", str(source)))
+                                                st.markdown("---")
+                                        else:
                                             st.markdown(sources)
-                                
-                                # Store in Neo4j
-                                try:
-                                    neo4j_conn.create_chat_interaction(prompt, response, sources)
-                                except Exception as e:
-                                    st.warning(f"Could not store chat in Neo4j: {str(e)}")
-                                
-                                # Add to session state
-                                st.session_state.messages.append({
-                                    "role": "assistant",
-                                    "content": response,
-                                    "sources": sources
-                                })
-                                
-                            except Exception as e:
-                                error_msg = f"❌ Sorry, I encountered an error: {str(e)}"
-                                st.error(error_msg)
-                                st.session_state.messages.append({
-                                    "role": "assistant",
-                                    "content": error_msg
-                                })
+                                    except:
+                                        st.markdown(sources)
+                            
+                            # Store in Neo4j, in the background
+                            if neo4j_conn is None:
+                                st.warning("Could not store chat in Neo4j: Neo4j is unavailable")
+                            elif not neo4j_conn.enqueue_chat_interaction(prompt, response, sources):
+                                st.warning("Could not store chat in Neo4j: the chat log is backed up")
+                            
+                            # Add to session state
+                            st.session_state.messages.append({
+                                "role": "assistant",
+                                "content": response,
+                                "sources": sources
+                            })
+                            
+                        except Exception as e:
+                            error_msg = f"❌ Sorry, I encountered an error: {str(e)}"
+                            st.error(error_msg)
+                            st.session_state.messages.append({
+                                "role": "assistant",
+                                "content": error_msg
+                            })
 
 # --- Footer ---
 st.markdown("""
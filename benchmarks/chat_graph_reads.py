@@ -0,0 +1,108 @@
+"""
+Chat graph reads as history grows, against a local Neo4j.
+
+Grows the chat history in steps (--steps, chats with --sources sources
+each) and at every size measures, over --repeats runs:
+    row-per-source  the previous query: one row per (Chat, Source) pair,
+                    full texts, LIMIT 50
+    first page      Neo4jConnection.get_chat_graph_page()
+    since latest    get_new_chats() with the newest cursor (nothing new),
+                    what every Streamlit rerun pays
+reporting the median query time and the size of the returned data
+(JSON-encoded). Everything the benchmark writes is deleted afterwards.
+
+Start Neo4j with `docker-compose up -d neo4j`, then:
+
+    python -m benchmarks.chat_graph_reads
+    python -m benchmarks.chat_graph_reads --steps 1000 10000 50000
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from src.utils.neo4j_utils import Neo4jConnection, _write_chats, build_chat
+
+
+def row_per_source(connection):
+    with connection.driver.session() as session:
+        result = session.run("""
+            MATCH (c:Chat)-[r:REFERENCES]->(s:Source)
+            RETURN c, s
+            ORDER BY c.timestamp DESC
+            LIMIT 50
+        """)
+        return [
+            {"chat": {**dict(record["c"]), "timestamp": str(record["c"]["timestamp"])}, "source": dict(record["s"])}
+            for record in result
+        ]
+
+
+def seed(connection, tag, count, sources, batch_size=500):
+    response = "Benchmark answer with enough text to resemble a real one. " * 30
+    source_list = [{"content": f"Benchmark source {i}. " * 40} for i in range(sources)]
+    for start in range(0, count, batch_size):
+        chats = [
+            build_chat(f"{tag} question {start + i}", response, source_list)
+            for i in range(min(batch_size, count - start))
+        ]
+        with connection.driver.session() as session:
+            session.execute_write(_write_chats, chats)
+
+
+def measure(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        data = function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, len(json.dumps(data, default=str))
+
+
+def cleanup(connection, tag, batch_size=5000):
+    with connection.driver.session() as session:
+        while True:
+            deleted = session.run("""
+                MATCH (c:Chat) WHERE c.query STARTS WITH $tag
+                WITH c LIMIT $batch_size
+                OPTIONAL MATCH (c)-[:REFERENCES]->(s:Source)
+                DETACH DELETE c, s
+                RETURN count(DISTINCT c) AS deleted
+            """, {"tag": tag, "batch_size": batch_size}).single()["deleted"]
+            if not deleted:
+                break
+
+
+def run(args):
+    connection = Neo4jConnection(args.uri, args.user, args.password)
+    tag = f"[benchmark {time.time():.0f}]"
+    print(f"{args.sources} sources per chat, median of {args.repeats} runs, {args.uri}\n")
+    print(f"{'chats':>7} {'query':<16} {'ms':>8} {'KB':>9}")
+    seeded = 0
+    try:
+        for size in sorted(args.steps):
+            seed(connection, tag, size - seeded, args.sources)
+            seeded = size
+            latest = connection.get_chat_graph_page(limit=1)
+            cursor = latest[0]["timestamp"] if latest else None
+            for label, function in (
+                ("row-per-source", lambda: row_per_source(connection)),
+                ("first page", lambda: connection.get_chat_graph_page()),
+                ("since latest", lambda: connection.get_new_chats(cursor)),
+            ):
+                ms, size_bytes = measure(function, args.repeats)
+                print(f"{size:>7} {label:<16} {ms:>8.2f} {size_bytes / 1024:>9.1f}")
+    finally:
+        cleanup(connection, tag)
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="bolt://localhost:7687")
+    parser.add_argument("--user", default="neo4j")
+    parser.add_argument("--password", default=os.getenv("NEO4J_LOCAL_PASSWORD", "rbi-local-password"))
+    parser.add_argument("--steps", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--sources", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=20)
+    run(parser.parse_args())
@@ -0,0 +1,94 @@
+"""
+Compares chunking settings on the bundled corpus.
+
+For each setting it reports the number of chunks, the characters sent for
+embedding, the embedding API calls needed (one per chunk before batching,
+and with the configured EMBEDDING_BATCH_SIZE) and the retrieval hit rate:
+for every circular a sentence is sampled from its sections and used as a
+query, and a hit means that circular appears in the top-k retrieved chunks.
+
+Retrieval is exact cosine search over embeddings from the app's providers
+(see benchmarks.embeddings): offline hashing embeddings by default, or
+--embedder gemini for real ones (through the ingestion embedding cache).
+
+    python -m benchmarks.chunking
+    python -m benchmarks.chunking --embedder gemini --top-k 5
+"""
+import argparse
+import math
+import random
+import time
+from src.utils import config
+from src.ingestion.chunking import chunk_circular, split_text
+from src.ingestion.reader import iter_circulars
+from benchmarks.embeddings import EMBEDDERS, DenseRetriever
+
+SETTINGS = [
+    # (label, max_chars, overlap_chars, min_chars)
+    ("per-section", 0, 0, 0),
+    ("1000/100/200", 1000, 100, 200),
+    ("2000/200/300", 2000, 200, 300),
+    ("4000/400/500", 4000, 400, 500),
+]
+
+def build_queries(circulars, seed=13, clean=None):
+    """
+    One (query, circular_number) pair per circular, sampled deterministically.
+    `clean` may rewrite each candidate passage, or return None to skip it.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for circular in circulars:
+        sentences = []
+        for section in circular['details']['circular']['contentSections']:
+            content = section.get('content', '').strip()
+            for start, end in split_text(content, 300, 0) if content else []:
+                sentence = content[start:end].strip()
+                if clean is not None:
+                    sentence = clean(sentence)
+                if sentence and 80 <= len(sentence) <= 300:
+                    sentences.append(sentence)
+        if sentences:
+            queries.append((rng.choice(sentences), circular['Circular Number']))
+    return queries
+
+
+def run(embedder, top_k):
+    circulars = list(iter_circulars(config.DATA_PATH))
+    queries = build_queries(circulars)
+    print(f"{len(circulars)} circulars, {len(queries)} queries, top-{top_k}, {embedder} retrieval\n")
+    print(
+        f"{'setting':<14} {'chunks':>7} {'max len':>8} {'chars':>10} "
+        f"{'calls':>7} {'batched':>8} {'hit rate':>9} {'time':>7}"
+    )
+
+    for label, max_chars, overlap_chars, min_chars in SETTINGS:
+        started = time.perf_counter()
+        chunks = [
+            chunk
+            for circular in circulars
+            for chunk in chunk_circular(circular, max_chars, overlap_chars, min_chars)
+        ]
+        texts = [chunk["chunk"] for chunk in chunks]
+        retriever = DenseRetriever(texts, embedder)
+
+        hits = 0
+        for query, expected in queries:
+            found = {chunks[doc]["circular_number"] for doc in retriever.search(query, top_k)}
+            hits += expected in found
+        retriever.save()
+
+        batched_calls = math.ceil(len(chunks) / config.EMBEDDING_BATCH_SIZE)
+        print(
+            f"{label:<14} {len(chunks):>7} {max(map(len, texts)):>8} {sum(map(len, texts)):>10} "
+            f"{len(chunks):>7} {batched_calls:>8} {hits / len(queries):>9.1%} "
+            f"{time.perf_counter() - started:>6.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embedder", choices=EMBEDDERS, default="hashing")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+    run(args.embedder, args.top_k)
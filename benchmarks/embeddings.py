@@ -0,0 +1,52 @@
+"""
+Embeddings for the retrieval benchmarks, from the same providers the app
+uses (src.utils.providers.make_embedder): "hashing" runs offline, "gemini"
+goes through the ingestion embedding cache, so reruns are served from disk.
+
+Each benchmark builds its own embedder from --embedder instead of using the
+process-wide get_embedder(), so the choice holds whatever EMBEDDING_PROVIDER
+says. Hashing similarities reflect shared words, not meaning, and are not on
+Gemini's score scale.
+"""
+import numpy as np
+from src.ingestion.embedding import embed_texts
+from src.ingestion.embedding_cache import open_embedding_cache
+from src.utils.providers import make_embedder
+
+EMBEDDERS = ("hashing", "gemini")
+
+
+def embed_corpus(texts, queries, provider):
+    """(document vectors, query vectors) as float32 arrays, one row per text."""
+    embedder = make_embedder(provider)
+    cache = open_embedding_cache() if provider == "gemini" else None
+    try:
+        documents = embed_texts(texts, cache=cache, embedder=embedder)
+        query_vectors = embed_texts(queries, task_type="retrieval_query", cache=cache, embedder=embedder)
+    finally:
+        if cache is not None:
+            cache.save()
+    return np.asarray(documents, dtype=np.float32), np.asarray(query_vectors, dtype=np.float32)
+
+
+class DenseRetriever:
+    """Exact cosine search over `texts`, embedding each query as it comes."""
+
+    def __init__(self, texts, provider):
+        self.embedder = make_embedder(provider)
+        self.cache = open_embedding_cache() if provider == "gemini" else None
+        self.matrix = self._normalize(embed_texts(texts, cache=self.cache, embedder=self.embedder))
+
+    @staticmethod
+    def _normalize(vectors):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def search(self, query, k):
+        vector = self._normalize(embed_texts([query], task_type="retrieval_query", cache=self.cache, embedder=self.embedder))[0]
+        return list(np.argsort(-(self.matrix @ vector))[:k])
+
+    def save(self):
+        if self.cache is not None:
+            self.cache.save()
@@ -0,0 +1,98 @@
+"""
+Graph expansion latency against a local Neo4j.
+
+Draws --lookups random sets of GRAPH_EXPANSION_SEEDS circulars (the
+circulars of a query's top hits) and times their expansion:
+    per-circular  one neighbourhood query per seed circular, no cache
+    batched       GraphExpander with an empty cache: one query for all seeds
+    cached        GraphExpander with the neighbourhoods already cached
+reporting the median and p95 milliseconds per lookup.
+
+Uses the circular graph already in the database, or loads it from
+DATA_PATH first (and deletes it afterwards) when there is none. Start
+Neo4j with `docker-compose up -d neo4j`, then:
+
+    python -m benchmarks.graph_expansion
+    python -m benchmarks.graph_expansion --hops 3 --lookups 500
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from neo4j import GraphDatabase
+from src.utils import config
+from src.ingestion.graph_ingest import _clear_graph, extract_graph, load_graph
+from src.retrieval.graph_expand import GraphExpander
+
+
+def per_circular(driver, numbers, hops):
+    neighbors = {}
+    with driver.session() as session:
+        for number in numbers:
+            neighbors[number] = [record.data() for record in session.run(f"""
+                MATCH path = (c:Circular {{number: $number}})-[:REFERS_TO|AMENDS|SUPERSEDES*1..{hops}]-(n:Circular)
+                WHERE n.in_corpus AND n <> c
+                RETURN n.number AS number, [r IN relationships(path) | type(r)] AS types
+            """, {"number": number})]
+    return neighbors
+
+
+def measure(function, lookups):
+    timings = []
+    for numbers in lookups:
+        started = time.perf_counter()
+        function(numbers)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000
+
+
+def run(args):
+    driver = GraphDatabase.driver(args.uri, auth=(args.user, args.password))
+    loaded = False
+    try:
+        with driver.session() as session:
+            numbers = [record["number"] for record in session.run("MATCH (c:Circular) WHERE c.in_corpus RETURN c.number AS number")]
+        if not numbers:
+            records = extract_graph()
+            load_graph(driver, records, "sync")
+            loaded = True
+            numbers = [record["number"] for record in records]
+
+        rng = random.Random(0)
+        seeds = min(config.GRAPH_EXPANSION_SEEDS, len(numbers))
+        lookups = [rng.sample(numbers, seeds) for _ in range(args.lookups)]
+        expander = GraphExpander(driver=driver, hops=args.hops)
+        expander.neighborhoods(lookups[0])  # Connect and warm up the query plan
+
+        def batched(numbers):
+            expander._neighborhoods.clear()
+            expander.neighborhoods(numbers)
+
+        print(f"{len(numbers)} circulars, {seeds} seeds per lookup, {args.hops} hops, {args.lookups} lookups, {args.uri}\n")
+        print(f"{'expansion':<14} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, function in (("per-circular", lambda numbers: per_circular(driver, numbers, args.hops)),
+                                ("batched", batched),
+                                ("cached", expander.neighborhoods)):
+            if label == "cached":
+                for numbers in lookups:
+                    expander.neighborhoods(numbers)
+            p50, p95 = measure(function, lookups)
+            print(f"{label:<14} {p50:>8.3f} {p95:>8.3f}")
+    finally:
+        if loaded:
+            with driver.session() as session:
+                while session.execute_write(_clear_graph, 10_000):
+                    pass
+        driver.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="bolt://localhost:7687")
+    parser.add_argument("--user", default="neo4j")
+    parser.add_argument("--password", default=os.getenv("NEO4J_LOCAL_PASSWORD", "rbi-local-password"))
+    parser.add_argument("--hops", type=int, default=config.GRAPH_EXPANSION_HOPS)
+    parser.add_argument("--lookups", type=int, default=200)
+    run(parser.parse_args())
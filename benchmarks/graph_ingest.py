@@ -0,0 +1,136 @@
+"""
+Circular graph load throughput against a local Neo4j.
+
+Extracts the graph from DATA_PATH once, optionally replicated --copies
+times (each copy with its own circular numbers) to test larger graphs,
+and loads it four ways:
+    per-row         the naive pattern: one auto-commit MERGE per circular,
+                    per department/audience link and per reference
+    batched cold    load_graph(mode="rebuild"): UNWIND/MERGE in
+                    transactions of --batch-size circulars
+    reload          load_graph() again with nothing changed (hash check only)
+    reload N%       load_graph() with --changed percent of circulars changed
+reporting the time, circulars per second and relationships written.
+
+The benchmark needs a database without a circular graph, and deletes
+everything it loads afterwards. Start Neo4j with
+`docker-compose up -d neo4j`, then:
+
+    python -m benchmarks.graph_ingest
+    python -m benchmarks.graph_ingest --copies 50 --batch-size 1000
+"""
+import argparse
+import os
+import time
+from neo4j import GraphDatabase
+from src.ingestion.graph_ingest import _clear_graph, ensure_graph_schema, extract_graph, load_graph
+
+
+def replicate(records, copies):
+    if copies == 1:
+        return records
+    replicated = []
+    for copy in range(copies):
+        suffix = f" #{copy}"
+        for record in records:
+            replicated.append({
+                **record,
+                "number": record["number"] + suffix,
+                "references": [{**reference, "target": reference["target"] + suffix} for reference in record["references"]],
+            })
+    return replicated
+
+
+def relationship_count(records):
+    return sum(
+        (record["department"] is not None) + len(record["audiences"]) + len(record["references"])
+        for record in records
+    )
+
+
+def per_row_load(driver, records):
+    with driver.session() as session:
+        for record in records:
+            session.run("""
+                MERGE (c:Circular {number: $number})
+                SET c.in_corpus = true, c.subject = $subject, c.date_of_issue = $date_of_issue,
+                    c.issue_date = $issue_date, c.link = $link
+            """, record).consume()
+            if record["department"] is not None:
+                session.run("""
+                    MATCH (c:Circular {number: $number})
+                    MERGE (d:Department {name: $department})
+                    MERGE (c)-[:ISSUED_BY]->(d)
+                """, record).consume()
+            for key in record["audiences"]:
+                session.run("""
+                    MATCH (c:Circular {number: $number})
+                    MERGE (a:Audience {key: $key})
+                    MERGE (c)-[:MEANT_FOR]->(a)
+                """, {"number": record["number"], "key": key}).consume()
+        for record in records:
+            for reference in record["references"]:
+                session.run(f"""
+                    MATCH (c:Circular {{number: $number}})
+                    MERGE (t:Circular {{number: $target}})
+                    ON CREATE SET t.in_corpus = false
+                    MERGE (c)-[r:{reference["type"]}]->(t)
+                    SET r.mentions = $mentions
+                """, {"number": record["number"], **reference}).consume()
+
+
+def clear(driver):
+    with driver.session() as session:
+        while session.execute_write(_clear_graph, 10_000):
+            pass
+
+
+def run(args):
+    driver = GraphDatabase.driver(args.uri, auth=(args.user, args.password))
+    try:
+        with driver.session() as session:
+            existing = session.run("MATCH (c:Circular) RETURN count(c) AS count").single()["count"]
+            if existing:
+                print(f"{args.uri} already holds {existing} Circular nodes; use an empty database")
+                return
+            ensure_graph_schema(session)
+
+        records = replicate(extract_graph(), args.copies)
+        changed = [
+            {**record, "record_hash": "changed", "references_hash": "changed"} if i % max(1, round(100 / args.changed)) == 0
+            else record
+            for i, record in enumerate(records)
+        ] if args.changed else records
+        relationships = relationship_count(records)
+        print(f"{len(records)} circulars, {relationships} relationships, batches of {args.batch_size}, {args.uri}\n")
+        print(f"{'load':<14} {'seconds':>8} {'circulars/s':>12} {'written':>8}")
+
+        def report(label, elapsed, written):
+            print(f"{label:<14} {elapsed:>8.2f} {len(records) / elapsed:>12.1f} {written:>8}")
+
+        try:
+            started = time.perf_counter()
+            per_row_load(driver, records)
+            report("per-row", time.perf_counter() - started, len(records))
+            clear(driver)
+
+            for label, batch, mode in (("batched cold", records, "rebuild"), ("reload", records, "sync"),
+                                       (f"reload {args.changed}%", changed, "sync")):
+                started = time.perf_counter()
+                counts = load_graph(driver, batch, mode, args.batch_size)
+                report(label, time.perf_counter() - started, counts["written"])
+        finally:
+            clear(driver)
+    finally:
+        driver.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="bolt://localhost:7687")
+    parser.add_argument("--user", default="neo4j")
+    parser.add_argument("--password", default=os.getenv("NEO4J_LOCAL_PASSWORD", "rbi-local-password"))
+    parser.add_argument("--copies", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--changed", type=float, default=5)
+    run(parser.parse_args())
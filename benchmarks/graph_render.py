@@ -0,0 +1,107 @@
+"""
+Chat graph render time against graph size.
+
+Builds synthetic chat histories (--sizes chats, --sources sources each)
+and for each size reports the server-side time of:
+    pyvis file     the previous path: pyvis with forceAtlas2 options,
+                   save_graph to an HTML file and read it back
+    browser        GraphRenderer below GRAPH_SERVER_LAYOUT_MIN_NODES: no
+                   layout here, the browser runs the physics as before
+    cold           GraphRenderer with the server-side layout, on an empty
+                   layout and cache
+    +N chats       N new chats on top of an already laid out graph
+                   (only the new nodes are placed)
+    cached         the same graph again (served from the render cache)
+plus the HTML size. The app takes the "browser" row for graphs under
+GRAPH_SERVER_LAYOUT_MIN_NODES nodes and the others from there up. The
+browser-side physics (a 1,000-iteration stabilization before the first
+draw, and again on every rerun) is not timed here; the server layout
+replaces it with physics disabled.
+
+    python -m benchmarks.graph_render
+    python -m benchmarks.graph_render --sizes 50 200 500 --sources 5 --new-chats 5
+"""
+import argparse
+import os
+import tempfile
+import time
+from pyvis.network import Network
+from src.utils.graph_render import GraphRenderer, GROUP_STYLES
+from src.utils.neo4j_utils import create_visualization
+
+LEGACY_OPTIONS = """
+{
+    "physics": {
+        "forceAtlas2Based": {"gravitationalConstant": -100, "centralGravity": 0.1, "springLength": 200, "springConstant": 0.1},
+        "maxVelocity": 50,
+        "solver": "forceAtlas2Based",
+        "timestep": 0.35,
+        "stabilization": {"enabled": true, "iterations": 1000}
+    },
+    "interaction": {"hover": true, "tooltipDelay": 200, "hideEdgesOnDrag": true, "navigationButtons": true}
+}
+"""
+
+
+def synthetic_chats(count, sources, offset=0):
+    """Newest first, shaped like Neo4jConnection.get_chat_graph_page results."""
+    return [
+        {
+            "id": f"chat_{number:06d}",
+            "query": f"What do the circulars say about topic {number}?",
+            "response": "A representative answer with a few sentences of text. " * 8,
+            "timestamp": f"2024-01-01T00:00:{number:06d}Z",
+            "sources": [
+                {"id": f"chat_{number:06d}_source_{i}", "content": f"Source {i} of chat {number}. " * 15}
+                for i in range(sources)
+            ],
+        }
+        for number in range(offset + count - 1, offset - 1, -1)
+    ]
+
+
+def legacy_render(G, path):
+    net = Network(height="500px", width="100%", bgcolor="#ffffff", font_color="black")
+    for node_id, node_data in G.nodes(data=True):
+        color, size = GROUP_STYLES[node_data["group"]]
+        net.add_node(node_id, label=node_data["label"], title=node_data["title"], color=color, size=size)
+    for edge in G.edges():
+        net.add_edge(edge[0], edge[1])
+    net.set_options(LEGACY_OPTIONS)
+    net.save_graph(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def run(sizes, sources, new_chats):
+    print(f"{sources} sources per chat\n")
+    print(f"{'chats':>6} {'nodes':>6} {'render':<12} {'ms':>9} {'HTML KB':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            base = create_visualization(synthetic_chats(size, sources))
+            grown = create_visualization(synthetic_chats(size + new_chats, sources))
+            renderer = GraphRenderer(min_nodes=0)
+            rows = [
+                ("pyvis file", *timed(lambda: legacy_render(base, os.path.join(tmp_dir, "chat_graph.html")))),
+                ("browser", *timed(lambda: GraphRenderer(min_nodes=base.number_of_nodes() + 1).render(base))),
+                ("cold", *timed(lambda: renderer.render(base))),
+                (f"+{new_chats} chats", *timed(lambda: renderer.render(grown))),
+                ("cached", *timed(lambda: renderer.render(grown))),
+            ]
+            for label, ms, html in rows:
+                print(f"{size:>6} {base.number_of_nodes():>6} {label:<12} {ms:>9.2f} {len(html) / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 50, 100, 200])
+    parser.add_argument("--sources", type=int, default=5)
+    parser.add_argument("--new-chats", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.sources, args.new_chats)
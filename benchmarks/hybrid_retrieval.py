@@ -0,0 +1,130 @@
+"""
+Compares dense, BM25 and hybrid (reciprocal rank fusion) retrieval.
+
+Two query sets are built from the bundled corpus: identifier queries that
+name a circular by its RBI number or department reference (as users paste
+them), and sentence queries sampled from each circular's text. A hit means
+the expected circular appears in the top-k chunks. Hybrid retrieval follows
+query_rag: circulars named by number come from the reference index, strong
+lexical matches from BM25 alone, and everything else fuses the two rankings.
+
+Dense retrieval defaults to offline hashing embeddings (see
+benchmarks.embeddings); pass --embedder gemini to use real embeddings.
+
+    python -m benchmarks.hybrid_retrieval
+    python -m benchmarks.hybrid_retrieval --embedder gemini --top-k 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from src.utils import config
+from src.ingestion.chunking import chunk_circular
+from src.ingestion.reader import iter_circulars
+from src.retrieval.bm25 import (
+    BM25Index, BM25IndexBuilder, identifier_query, is_strong_lexical_match, reciprocal_rank_fusion
+)
+from src.retrieval.reference_index import ReferenceIndex, ReferenceIndexBuilder
+from benchmarks.chunking import build_queries
+from benchmarks.embeddings import EMBEDDERS, DenseRetriever
+
+TEMPLATES = [
+    "What does circular {} say?",
+    "Summarise {}",
+    "{}",
+]
+
+
+def build_identifier_queries(circulars, seed=13):
+    """(query, circular_number) pairs quoting an RBI number or a department reference."""
+    rng = random.Random(seed)
+    queries = []
+    for circular in circulars:
+        rbi_number, _, reference = circular['details']['circular'].get('circularNumber', '').partition(" ")
+        reference = reference.strip()
+        for identifier in (rbi_number, reference.split("/")[0]):
+            if identifier:
+                queries.append((rng.choice(TEMPLATES).format(identifier), circular['Circular Number']))
+    return queries
+
+
+def build_bm25(chunks):
+    builder = BM25IndexBuilder()
+    for doc, chunk in enumerate(chunks):
+        builder.add(str(doc), chunk["chunk"], chunk["circular_number"])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bm25.npz")
+        builder.save(path)
+        return BM25Index(path)
+
+
+def build_reference_index(circulars, chunks):
+    builder = ReferenceIndexBuilder()
+    for circular in circulars:
+        builder.add_circular(circular)
+    for doc, chunk in enumerate(chunks):
+        builder.add_point(chunk["circular_number"], str(doc))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "reference_index.json")
+        builder.save(path)
+        return ReferenceIndex(path)
+
+
+def run(embedder, top_k):
+    circulars = list(iter_circulars(config.DATA_PATH))
+    chunks = [
+        chunk
+        for circular in circulars
+        for chunk in chunk_circular(circular, config.CHUNK_MAX_CHARS, config.CHUNK_OVERLAP_CHARS, config.CHUNK_MIN_CHARS)
+    ]
+    texts = [chunk["chunk"] for chunk in chunks]
+    dense = DenseRetriever(texts, embedder)
+    bm25 = build_bm25(chunks)
+    references = build_reference_index(circulars, chunks)
+
+    def dense_search(query):
+        return list(dense.search(query, max(top_k, config.BM25_CANDIDATES)))
+
+    def bm25_search(query):
+        return [int(point_id) for point_id, _, _ in bm25.search(query, config.BM25_CANDIDATES)]
+
+    def hybrid_search(query):
+        named = references.point_ids(references.match(query), config.REFERENCE_MAX_CHUNKS)
+        if named:
+            return [int(point_id) for point_id in named]
+        identifiers = identifier_query(query)
+        if identifiers:
+            identifier_hits = bm25.search(identifiers, config.BM25_CANDIDATES)
+            if is_strong_lexical_match(identifier_hits):
+                return [int(point_id) for point_id, _, _ in identifier_hits]
+        hits = bm25.search(query, config.BM25_CANDIDATES)
+        return reciprocal_rank_fusion(dense_search(query), [int(point_id) for point_id, _, _ in hits])
+
+    query_sets = [
+        ("identifier", build_identifier_queries(circulars)),
+        ("sentence", build_queries(circulars)),
+    ]
+    print(f"{len(chunks)} chunks, top-{top_k}, {embedder} dense retrieval\n")
+    print(f"{'queries':<11} {'method':<7} {'count':>6} {'hit rate':>9} {'mean ms':>8}")
+    for set_label, queries in query_sets:
+        for method, search in (("dense", dense_search), ("bm25", bm25_search), ("hybrid", hybrid_search)):
+            hits = 0
+            started = time.perf_counter()
+            for query, expected in queries:
+                found = {chunks[doc]["circular_number"] for doc in search(query)[:top_k]}
+                hits += expected in found
+            elapsed = time.perf_counter() - started
+            print(
+                f"{set_label:<11} {method:<7} {len(queries):>6} {hits / len(queries):>9.1%} "
+                f"{elapsed / len(queries) * 1000:>8.2f}"
+            )
+    dense.save()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embedder", choices=EMBEDDERS, default="hashing")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+    run(args.embedder, args.top_k)
@@ -0,0 +1,139 @@
+"""
+Chat persistence throughput against a local Neo4j.
+
+Writes --chats interactions with --sources sources each, three ways:
+    per-statement  the previous pattern: one CREATE for the chat, then a
+                   CREATE and a MATCH/MATCH/CREATE per source, each in its
+                   own auto-commit transaction
+    unwind         Neo4jConnection.create_chat_interaction: one managed write
+                   transaction, sources written with UNWIND
+    write-behind   Neo4jConnection.enqueue_chat_interaction: the caller only
+                   buffers the interaction; a background thread writes
+                   batches of CHAT_LOG_BATCH_SIZE (throughput counts until
+                   everything is written, latency is the caller's wait)
+and reports writes (interactions) per second, plus the latency of looking
+a chat up by id, which the Chat.id constraint turns into an index seek.
+Everything the benchmark writes is deleted afterwards.
+
+Start Neo4j with `docker-compose up -d neo4j`, then:
+
+    python -m benchmarks.neo4j_writes
+    python -m benchmarks.neo4j_writes --chats 2000 --sources 5 --workers 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.utils import config
+from src.utils.neo4j_utils import Neo4jConnection, new_chat_id
+
+
+def per_statement_write(connection, query, response, sources):
+    with connection.driver.session() as session:
+        chat_id = new_chat_id()
+        session.run(
+            "CREATE (c:Chat {id: $chat_id, query: $query, response: $response, timestamp: datetime()})",
+            {"chat_id": chat_id, "query": query, "response": response}
+        ).consume()
+        for i, source in enumerate(sources):
+            source_id = f"{chat_id}_source_{i}"
+            session.run(
+                "CREATE (s:Source {id: $source_id, content: $content})",
+                {"source_id": source_id, "content": source["content"]}
+            ).consume()
+            session.run(
+                "MATCH (c:Chat {id: $chat_id}) MATCH (s:Source {id: $source_id}) CREATE (c)-[:REFERENCES]->(s)",
+                {"chat_id": chat_id, "source_id": source_id}
+            ).consume()
+
+
+def unwind_write(connection, query, response, sources):
+    if not connection.create_chat_interaction(query, response, sources):
+        raise RuntimeError("create_chat_interaction failed; see the error above")
+
+
+def write_behind(connection, query, response, sources):
+    if not connection.enqueue_chat_interaction(query, response, sources):
+        raise RuntimeError("enqueue_chat_interaction dropped an interaction")
+
+
+def wait_until_written(connection, count):
+    while connection.chats_written + connection.chats_dropped < count:
+        time.sleep(0.005)
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure_lookups(connection, tag, samples=200):
+    with connection.driver.session() as session:
+        chat_ids = [record["id"] for record in session.run(
+            "MATCH (c:Chat) WHERE c.query STARTS WITH $tag RETURN c.id AS id LIMIT $limit",
+            {"tag": tag, "limit": samples}
+        )]
+        latencies = []
+        for chat_id in chat_ids:
+            started = time.perf_counter()
+            session.run("MATCH (c:Chat {id: $chat_id}) RETURN c.query", {"chat_id": chat_id}).consume()
+            latencies.append(time.perf_counter() - started)
+    return sorted(latencies)
+
+
+def cleanup(connection, tag):
+    with connection.driver.session() as session:
+        session.run("""
+            MATCH (c:Chat) WHERE c.query STARTS WITH $tag
+            OPTIONAL MATCH (c)-[:REFERENCES]->(s:Source)
+            DETACH DELETE c, s
+        """, {"tag": tag}).consume()
+
+
+def run(args):
+    config.CHAT_LOG_ENQUEUE_TIMEOUT_MS = 60_000  # Measure backpressure, don't drop
+    connection = Neo4jConnection(args.uri, args.user, args.password)
+    tag = f"[benchmark {time.time():.0f}]"
+    response = "Benchmark answer. " * 40
+    sources = [{"content": f"Benchmark source {i}. " * 20} for i in range(args.sources)]
+
+    print(f"{args.chats} chats x {args.sources} sources, {args.workers} workers, {args.uri}\n")
+    print(f"{'method':<14} {'writes/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    try:
+        for label, write in (("per-statement", per_statement_write), ("unwind", unwind_write),
+                             ("write-behind", write_behind)):
+            def timed(i):
+                started = time.perf_counter()
+                write(connection, f"{tag} {label} question {i}", response, sources)
+                return time.perf_counter() - started
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                latencies = sorted(executor.map(timed, range(args.chats)))
+            if write is write_behind:
+                wait_until_written(connection, args.chats)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{label:<14} {args.chats / elapsed:>9.1f} "
+                f"{_percentile(latencies, 0.50) * 1000:>8.2f} {_percentile(latencies, 0.95) * 1000:>8.2f}"
+            )
+
+        lookups = measure_lookups(connection, tag)
+        if lookups:
+            print(
+                f"\nChat lookup by id: p50 {_percentile(lookups, 0.50) * 1000:.2f} ms, "
+                f"p95 {_percentile(lookups, 0.95) * 1000:.2f} ms over {len(lookups)} lookups"
+            )
+    finally:
+        cleanup(connection, tag)
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="bolt://localhost:7687")
+    parser.add_argument("--user", default="neo4j")
+    parser.add_argument("--password", default=os.getenv("NEO4J_LOCAL_PASSWORD", "rbi-local-password"))
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--sources", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    run(parser.parse_args())
@@ -0,0 +1,80 @@
+"""
+Compares vector compression modes for the local index.
+
+Embeds the bundled corpus (chunked with the configured settings) and one
+sampled sentence per circular as queries, then for each mode reports the
+in-RAM size of the first-pass vectors, mean search latency and recall@k
+against exact float32 search, with and without rescoring.
+
+Embeddings come from the app's providers (see benchmarks.embeddings):
+offline hashing embeddings by default, or --embedder gemini for Gemini
+embeddings (through the ingestion embedding cache).
+
+Qdrant's int8/binary quantization is configured from the same setting
+(VECTOR_COMPRESSION) but needs a Qdrant server to measure; the local
+Qdrant mode ignores quantization.
+
+    python -m benchmarks.quantization
+    python -m benchmarks.quantization --embedder gemini --top-k 10
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+from src.utils import config
+from src.ingestion.chunking import chunk_circular
+from src.ingestion.reader import iter_circulars
+from src.retrieval.compression import COMPRESSION_MODES
+from src.retrieval.local_index import POINTS_FILE, VECTORS_FILE, LocalVectorIndex
+from benchmarks.chunking import build_queries
+from benchmarks.embeddings import EMBEDDERS, embed_corpus
+
+
+def write_index(index_dir, vectors):
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.save(os.path.join(index_dir, VECTORS_FILE), vectors.astype(np.float32))
+    with open(os.path.join(index_dir, POINTS_FILE), "w") as f:
+        json.dump({"ids": [str(i) for i in range(len(vectors))], "payloads": [{}] * len(vectors)}, f)
+
+
+def run(embedder, top_k):
+    circulars = list(iter_circulars(config.DATA_PATH))
+    texts = [chunk["chunk"] for circular in circulars for chunk in chunk_circular(circular)]
+    queries = [query for query, _ in build_queries(circulars)]
+    documents, query_vectors = embed_corpus(texts, queries, embedder)
+
+    print(
+        f"{len(texts)} chunks x {documents.shape[1]} dims, {len(queries)} queries, top-{top_k}, "
+        f"{embedder} embeddings, oversampling {config.RESCORE_OVERSAMPLING}, "
+        f"reduced dim {config.VECTOR_REDUCED_DIM}\n"
+    )
+    print(f"{'mode':<10} {'rescore':<8} {'RAM':>10} {'x smaller':>10} {'mean ms':>8} {f'recall@{top_k}':>10}")
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        write_index(index_dir, documents)
+        exact = LocalVectorIndex(index_dir)
+        truth = [{point.id for point in exact.search(query, top_k)} for query in query_vectors]
+        full_bytes = exact.vectors.nbytes
+
+        for mode in COMPRESSION_MODES:
+            for rescore in ((False,) if mode == "none" else (False, True)):
+                index = LocalVectorIndex(index_dir, compression=mode, rescore=rescore)
+                ram = index.codes.nbytes if index.codes is not None else full_bytes
+                started = time.perf_counter()
+                results = [{point.id for point in index.search(query, top_k)} for query in query_vectors]
+                elapsed = time.perf_counter() - started
+                recall = sum(len(found & expected) for found, expected in zip(results, truth)) / (top_k * len(truth))
+                print(
+                    f"{mode:<10} {'yes' if rescore else 'no':<8} {ram / 1024:>8.0f}KB {full_bytes / ram:>10.1f} "
+                    f"{elapsed / len(query_vectors) * 1000:>8.3f} {recall:>10.1%}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embedder", choices=EMBEDDERS, default="hashing")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    run(args.embedder, args.top_k)
@@ -0,0 +1,90 @@
+"""
+Load test: thread-per-request query_rag vs. the asyncio query engine.
+
+Fires --requests queries with --concurrency simultaneous users against the
+configured Qdrant collection and Gemini, and reports throughput and latency
+percentiles for both paths. Every query is unique and the answer cache is
+disabled, so each request pays for its own embedding and generation.
+
+To measure the pipeline without Gemini, run with the offline providers,
+e.g. EMBEDDING_PROVIDER=hashing GENERATION_PROVIDER=template, with
+LOCAL_EMBEDDING_LATENCY_MS (plus LOCAL_EMBEDDING_JITTER_MS) and
+LOCAL_GENERATION_LATENCY_MS set to realistic model latencies (the
+collection must have been ingested with the same embedding provider).
+
+    python -m benchmarks.query_load --requests 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.retrieval import rag
+from src.retrieval.async_service import AsyncQueryEngine
+
+QUESTIONS = [
+    "What are the KYC updation requirements for low-risk customers?",
+    "What does the circular on Government Debt Relief Schemes require from lenders?",
+    "What are the revised limits for UPI123Pay transactions?",
+    "Which entities must comply with the Master Direction on KYC?",
+    "What changed in the Liquidity Coverage Ratio framework?",
+    "What are the instructions for the Interest Subvention Scheme?",
+]
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _report(label, latencies, elapsed):
+    ordered = sorted(latencies)
+    print(
+        f"{label:<8} {len(ordered):>5} req  {len(ordered) / elapsed:7.2f} req/s  "
+        f"p50 {_percentile(ordered, 0.50) * 1000:7.0f} ms  "
+        f"p95 {_percentile(ordered, 0.95) * 1000:7.0f} ms  "
+        f"p99 {_percentile(ordered, 0.99) * 1000:7.0f} ms"
+    )
+
+
+def _queries(count, tag):
+    # Unique suffixes keep the caches from answering, across both runs too
+    return [f"{QUESTIONS[i % len(QUESTIONS)]} ({tag} #{i})" for i in range(count)]
+
+
+def run_sync(queries, concurrency):
+    def timed(query):
+        started = time.perf_counter()
+        rag.query_rag(query)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, queries))
+    _report("sync", latencies, time.perf_counter() - started)
+
+
+async def run_async(queries, concurrency):
+    engine = AsyncQueryEngine()
+    users = asyncio.Semaphore(concurrency)
+
+    async def timed(query):
+        async with users:
+            started = time.perf_counter()
+            await engine.query(query)
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(query) for query in queries))
+    _report("async", latencies, time.perf_counter() - started)
+    print(f"         embedding batches: {engine.stats()}")
+    await engine.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    rag.answer_cache = None
+    run_sync(_queries(args.requests, f"sync {time.time()}"), args.concurrency)
+    asyncio.run(run_async(_queries(args.requests, f"async {time.time()}"), args.concurrency))
@@ -0,0 +1,365 @@
+"""
+Offline evaluation of the query_rag retrieval path against a golden set.
+
+The golden set (benchmarks/golden_set.json) pairs questions with the
+circulars that answer them, in four categories: identifier questions
+quoting an RBI number or department reference, subject questions asking
+about a circular's subject, sentence questions quoting a passage of its
+text (leaving out sign-offs, addresses, cross-references and short
+fragments), and paraphrase questions. The first three are generated from
+the bundled corpus and mostly share their wording with it; paraphrase
+questions are hand-written in benchmarks/paraphrase_questions.json, in
+the words a user would pick rather than the circular's, and are the
+category that tells whether retrieval understands a question. Rebuild the
+set after the corpus or that file changes with --build-golden.
+
+Each run chunks the corpus with the configured settings, loads it into an
+in-memory Qdrant collection (or, with --backend local, the exported NumPy
+index), builds the BM25 and reference indexes, and sends every question
+through the same functions query_rag uses: filter parsing, hybrid search
+and context assembly. Nothing is sent to Gemini for generation.
+
+Reported, overall and per category:
+    recall@k         share of questions whose circular is among the top-k
+                     distinct circulars retrieved
+    mrr              mean reciprocal rank of that circular
+    context_recall   share whose circular made it into the assembled context
+and per-stage latency percentiles in milliseconds. The report is JSON,
+printed or written to --output, so runs can be compared over time.
+
+Embeddings default to the offline hashing provider (see
+benchmarks.embeddings), whose similarities are not on Gemini's scale, so
+the score threshold defaults to 0 for it. --embedder gemini uses Gemini embeddings
+through the ingestion embedding cache: after one online run, reruns are
+served from the cache. Chunking follows CHUNK_MAX_CHARS and friends; the
+other retrieval settings follow their environment variables, with
+--limit and --score-threshold as shortcuts.
+
+    python -m benchmarks.retrieval_eval
+    python -m benchmarks.retrieval_eval --backend local --output eval.json
+    python -m benchmarks.retrieval_eval --embedder gemini --score-threshold 0.7
+    python -m benchmarks.retrieval_eval --build-golden
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+import numpy as np
+from qdrant_client import QdrantClient, models
+from src.utils import config
+from src.ingestion.ingest import point_id_for
+from src.ingestion.reader import iter_chunks, iter_circulars
+from src.retrieval.bm25 import BM25IndexBuilder, BM25IndexHandle
+from src.retrieval.local_index import LocalIndexHandle, export_local_index
+from src.retrieval.reference_index import ReferenceIndexBuilder, ReferenceIndexHandle
+from benchmarks.chunking import build_queries
+from benchmarks.hybrid_retrieval import build_identifier_queries
+from benchmarks.embeddings import EMBEDDERS, embed_corpus
+
+GOLDEN_SET_PATH = os.path.join(os.path.dirname(__file__), "golden_set.json")
+PARAPHRASE_PATH = os.path.join(os.path.dirname(__file__), "paraphrase_questions.json")
+RECALL_AT = (1, 3, 5, 10)
+STAGES = ("filters", "reference", "lexical", "embed", "dense", "fetch", "search", "context", "total")
+SUBJECT_TEMPLATES = [
+    "What are the instructions on {}?",
+    "What has RBI said about {}?",
+    "Explain the circular on {}",
+]
+
+
+# Passages no user would ask about: sign-offs, contact details, enclosures, the
+# statutory "issued under Section ..." line and openings that only point at other circulars
+_BOILERPLATE = re.compile(
+    r"yours (?:faithfully|sincerely)|general manager|https?://|www\.|\S@\S|\bencl\b"
+    r"|^(?:a )?reference is (?:also )?(?:invited|drawn)|^please refer|^this has reference|^(?:this circular|these directions) (?:is|are) issued",
+    re.IGNORECASE
+)
+# Paragraph numbering such as "2.6.", "13 " or "(ii)" ahead of the text
+_ENUMERATOR = re.compile(r"^(?:\d+(?:\.\d+)*\.?\s+|\([0-9a-z]+\)\s*)+")
+MIN_PASSAGE_WORDS = 12
+
+
+def passage_question(passage):
+    """
+    The first paragraph of `passage` without its numbering, or None for
+    boilerplate and fragments (including text cut mid-sentence).
+    """
+    text = " ".join(_ENUMERATOR.sub("", passage.split("\n\n")[0].strip()).split())
+    if not text[:1].isupper() and not text.startswith(("‘", "“", '"')):
+        return None
+    if _BOILERPLATE.search(text) or len(text.split()) < MIN_PASSAGE_WORDS:
+        return None
+    return text
+
+
+def build_golden_set(circulars, seed=13, paraphrase_path=PARAPHRASE_PATH):
+    """Question entries for every circular; `expected` lists every circular the question fits equally well."""
+    rng = random.Random(seed)
+    by_subject = defaultdict(list)
+    for circular in circulars:
+        by_subject[circular['Subject'].strip().lower()].append(circular['Circular Number'])
+    by_identifier = defaultdict(list)
+    identifier_queries = build_identifier_queries(circulars, seed)
+    for question, circular_number in identifier_queries:
+        by_identifier[question].append(circular_number)
+
+    entries = []
+    for question, circular_numbers in by_identifier.items():
+        entries.append(("identifier", question, sorted(set(circular_numbers))))
+    for circular in circulars:
+        subject = circular['Subject'].strip()
+        if subject:
+            question = rng.choice(SUBJECT_TEMPLATES).format(subject.rstrip("."))
+            entries.append(("subject", question, sorted(by_subject[subject.lower()])))
+    for question, circular_number in build_queries(circulars, seed, clean=passage_question):
+        entries.append(("sentence", question, [circular_number]))
+    known = {circular['Circular Number'] for circular in circulars}
+    with open(paraphrase_path) as f:
+        for entry in json.load(f):
+            missing = set(entry["expected"]) - known
+            if missing:
+                raise ValueError(f"Paraphrase question {entry['question']!r} expects unknown circulars {sorted(missing)}")
+            entries.append(("paraphrase", entry["question"], sorted(entry["expected"])))
+
+    return [
+        {"id": f"q{number:04d}", "category": category, "question": question, "expected": expected}
+        for number, (category, question, expected) in enumerate(entries, 1)
+    ]
+
+
+def load_corpus(qdrant_client, vectors, chunks, index_dir):
+    """Loads chunks into the collection and writes the BM25 and reference indexes into `index_dir`."""
+    qdrant_client.recreate_collection(
+        collection_name=config.QDRANT_COLLECTION_NAME,
+        vectors_config=models.VectorParams(size=vectors.shape[1], distance=models.Distance.COSINE)
+    )
+    bm25_builder = BM25IndexBuilder()
+    reference_builder = ReferenceIndexBuilder()
+    for circular in iter_circulars(config.DATA_PATH):
+        reference_builder.add_circular(circular)
+
+    points = []
+    for chunk, vector in zip(chunks, vectors):
+        point_id = point_id_for(chunk["circular_number"], chunk["chunk_key"])
+        bm25_builder.add(point_id, chunk["chunk"], chunk["circular_number"])
+        reference_builder.add_point(chunk["circular_number"], point_id)
+        points.append(models.PointStruct(
+            id=point_id,
+            vector=vector.tolist(),
+            payload={"text": chunk["chunk"], "metadata": chunk["metadata"]}
+        ))
+    for start in range(0, len(points), 500):
+        qdrant_client.upsert(collection_name=config.QDRANT_COLLECTION_NAME, points=points[start:start + 500])
+
+    bm25_path = os.path.join(index_dir, "bm25_index.npz")
+    reference_path = os.path.join(index_dir, "reference_index.json")
+    bm25_builder.save(bm25_path)
+    reference_builder.save(reference_path)
+    return bm25_path, reference_path
+
+
+class StageTimer:
+    """Accumulates wall time per stage for the question being evaluated."""
+
+    def __init__(self):
+        self.current = defaultdict(float)
+        self.samples = defaultdict(list)
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.current[stage] += time.perf_counter() - started
+        return timed
+
+    def finish(self, record=True):
+        if record:
+            for stage in STAGES:
+                self.samples[stage].append(self.current.get(stage, 0.0) * 1000)
+        self.current = defaultdict(float)
+
+    def percentiles(self):
+        report = {}
+        for stage in STAGES:
+            samples = np.asarray(self.samples[stage])
+            if not len(samples):
+                continue
+            report[stage] = {
+                "mean": round(float(samples.mean()), 3),
+                **{f"p{q}": round(float(np.percentile(samples, q)), 3) for q in (50, 90, 95, 99)},
+                "max": round(float(samples.max()), 3),
+            }
+        return report
+
+
+def ranked_circulars(results):
+    """Distinct circular numbers of the hits, best first."""
+    seen = []
+    for result in results:
+        circular_number = result.payload['metadata']['circular_number']
+        if circular_number not in seen:
+            seen.append(circular_number)
+    return seen
+
+
+def summarize(rows):
+    summary = {"questions": len(rows)}
+    if not rows:
+        return summary
+    for k in RECALL_AT:
+        summary[f"recall@{k}"] = round(sum(row["rank"] is not None and row["rank"] <= k for row in rows) / len(rows), 4)
+    summary["mrr"] = round(sum(1 / row["rank"] for row in rows if row["rank"] is not None) / len(rows), 4)
+    summary["context_recall"] = round(sum(row["in_context"] for row in rows) / len(rows), 4)
+    return summary
+
+
+def evaluate(golden, embedder, backend, warmup=5):
+    # Imported here: rag reads the retrieval settings the command line may have changed
+    import src.retrieval.rag as rag
+
+    circulars = list(iter_circulars(config.DATA_PATH))
+    chunks = list(iter_chunks(circulars))
+    texts = [chunk["chunk"] for chunk in chunks]
+    questions = [entry["question"] for entry in golden]
+    documents, query_vectors = embed_corpus(texts, questions, embedder)
+    # Questions are embedded up front, so the embed stage measures a cache lookup
+    embedded = {question: vector.tolist() for question, vector in zip(questions, query_vectors)}
+
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as index_dir:
+        qdrant_client = QdrantClient(":memory:")
+        bm25_path, reference_path = load_corpus(qdrant_client, documents, chunks, index_dir)
+        rag.qdrant_client = qdrant_client
+        rag.bm25_index = BM25IndexHandle(bm25_path)
+        rag.reference_index = ReferenceIndexHandle(reference_path)
+        config.RETRIEVAL_BACKEND = backend
+        if backend == "local":
+            export_local_index(qdrant_client, index_dir)
+            rag.local_index = LocalIndexHandle(index_dir)
+
+        rag.embed_query = timer.wrap("embed", lambda question: embedded[question])
+        for stage, name in (("reference", "reference_point_ids"), ("lexical", "lexical_search"),
+                            ("dense", "dense_search"), ("fetch", "fetch_points")):
+            setattr(rag, name, timer.wrap(stage, getattr(rag, name)))
+        resolve_filters = timer.wrap("filters", rag.resolve_filters)
+        search_points = timer.wrap("search", rag.search_points)
+        build_context = timer.wrap("context", rag.build_context)
+
+        rows = []
+        for position, entry in enumerate(golden[:warmup] + golden):
+            with contextlib.redirect_stdout(io.StringIO()):  # query_rag's per-query log lines
+                started = time.perf_counter()
+                _, query_filter = resolve_filters(entry["question"], None)
+                _, results = search_points(entry["question"], query_filter)
+                source_ids, _, _ = build_context(results)
+                timer.current["total"] = time.perf_counter() - started
+            measured = position >= warmup
+            timer.finish(record=measured)
+            if not measured:
+                continue
+
+            circulars_found = ranked_circulars(results)
+            ranks = [circulars_found.index(number) + 1 for number in entry["expected"] if number in circulars_found]
+            in_context = {
+                result.payload['metadata']['circular_number'] for result in results if str(result.id) in source_ids
+            }
+            rows.append({
+                "category": entry["category"],
+                "rank": min(ranks) if ranks else None,
+                "in_context": bool(in_context.intersection(entry["expected"])),
+            })
+
+    by_category = defaultdict(list)
+    for row in rows:
+        by_category[row["category"]].append(row)
+    return {
+        "overall": summarize(rows),
+        "by_category": {category: summarize(category_rows) for category, category_rows in sorted(by_category.items())},
+        "latency_ms": timer.percentiles(),
+        "chunks": len(chunks),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    if args.build_golden:
+        golden = build_golden_set(list(iter_circulars(config.DATA_PATH)))
+        with open(args.golden, "w") as f:
+            json.dump(golden, f, indent=1, ensure_ascii=False)
+            f.write("\n")
+        print(f"Wrote {len(golden)} questions to {args.golden}")
+        return
+
+    if args.limit is not None:
+        config.RETRIEVAL_LIMIT = args.limit
+    if args.score_threshold is not None:
+        config.RETRIEVAL_SCORE_THRESHOLD = args.score_threshold
+    elif args.embedder == "hashing":
+        config.RETRIEVAL_SCORE_THRESHOLD = 0.0
+
+    with open(args.golden) as f:
+        golden = json.load(f)
+    results = evaluate(golden, args.embedder, args.backend)
+    report = {
+        "run": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "golden_set": os.path.relpath(args.golden),
+            "embedder": args.embedder,
+            "backend": args.backend,
+        },
+        "settings": {
+            name: getattr(config, name) for name in (
+                "CHUNK_MAX_CHARS", "CHUNK_OVERLAP_CHARS", "CHUNK_MIN_CHARS",
+                "RETRIEVAL_LIMIT", "RETRIEVAL_SCORE_THRESHOLD", "CONTEXT_CANDIDATES", "CONTEXT_TOKEN_BUDGET",
+                "MMR_LAMBDA", "HYBRID_RETRIEVAL_ENABLED", "BM25_CANDIDATES", "REFERENCE_INDEX_ENABLED",
+                "QUERY_FILTER_PARSING_ENABLED", "VECTOR_COMPRESSION",
+            )
+        },
+        **results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        overall = report["overall"]
+        categories = ", ".join(
+            f"{category} {summary['recall@5']:.1%}" for category, summary in report["by_category"].items()
+        )
+        print(
+            f"{overall['questions']} questions: recall@5 {overall['recall@5']:.1%} ({categories}), "
+            f"mrr {overall['mrr']:.3f}, total p50 {report['latency_ms']['total']['p50']:.2f} ms; "
+            f"report written to {args.output}"
+        )
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--golden", default=GOLDEN_SET_PATH)
+    parser.add_argument("--build-golden", action="store_true", help="rebuild the golden set from the corpus and exit")
+    parser.add_argument("--embedder", choices=EMBEDDERS, default="hashing")
+    parser.add_argument("--backend", choices=["qdrant", "local"], default="qdrant")
+    parser.add_argument("--limit", type=int, help="override RETRIEVAL_LIMIT")
+    parser.add_argument("--score-threshold", type=float, help="override RETRIEVAL_SCORE_THRESHOLD")
+    parser.add_argument("--output", help="write the JSON report here instead of printing it")
+    run(parser.parse_args())
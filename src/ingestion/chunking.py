@@ -0,0 +1,188 @@
+import re
+from src.utils import config
+from src.ingestion.metadata import audience_keywords, normalize_department, parse_issue_date
+
+# Paragraph breaks, then sentence ends followed by whitespace
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+(?=[\"'(\[A-Z0-9])")
+
+
+def _split_units(text):
+    """Returns (start, end) offsets of sentences, grouped along paragraph breaks."""
+    units = []
+    paragraph_start = 0
+    for match in list(_PARAGRAPH_BREAK.finditer(text)) + [None]:
+        paragraph_end = match.start() if match else len(text)
+        sentence_start = paragraph_start
+        for sentence in _SENTENCE_END.finditer(text, paragraph_start, paragraph_end):
+            units.append((sentence_start, sentence.start()))
+            sentence_start = sentence.end()
+        if sentence_start < paragraph_end:
+            units.append((sentence_start, paragraph_end))
+        if match:
+            paragraph_start = match.end()
+    return [(start, end) for start, end in units if text[start:end].strip()]
+
+
+def _hard_split(start, end, text, max_chars):
+    """Splits a single over-long sentence on whitespace."""
+    pieces = []
+    while end - start > max_chars:
+        cut = text.rfind(" ", start, start + max_chars)
+        if cut <= start:
+            cut = start + max_chars
+        pieces.append((start, cut))
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+    if start < end:
+        pieces.append((start, end))
+    return pieces
+
+
+def split_text(text, max_chars, overlap_chars=0):
+    """
+    Splits text into windows of at most `max_chars` characters.
+
+    Windows end on sentence or paragraph boundaries where possible and each
+    one repeats roughly `overlap_chars` characters of trailing sentences from
+    the window before it. Returns a list of (start, end) offsets.
+    """
+    if len(text) <= max_chars:
+        return [(0, len(text))]
+
+    units = []
+    for start, end in _split_units(text):
+        units.extend(_hard_split(start, end, text, max_chars))
+
+    windows = []
+    first = 0
+    while first < len(units):
+        last = first
+        while last + 1 < len(units) and units[last + 1][1] - units[first][0] <= max_chars:
+            last += 1
+        windows.append((units[first][0], units[last][1]))
+        if last + 1 >= len(units):
+            break
+
+        # Step back over trailing sentences to build the overlap, always making progress
+        next_first = last + 1
+        while next_first - 1 > first and units[last][1] - units[next_first - 1][0] <= overlap_chars:
+            next_first -= 1
+        first = next_first
+    return windows
+
+
+def _format_chunk(circular, section_title, content):
+    return (
+        f"Circular Number: {circular['Circular Number']}\n"
+        f"Subject: {circular['Subject']}\n"
+        f"Section: {section_title}\n\n"
+        f"{content}"
+    )
+
+
+def split_chunk_header(text):
+    """Inverse of the chunk text format: returns (section_title, content) without the circular header."""
+    header, separator, content = text.partition("\n\n")
+    if not separator or not header.startswith("Circular Number:"):
+        return None, text
+    section_title = next((line[len("Section: "):] for line in header.splitlines() if line.startswith("Section: ")), None)
+    return section_title, content
+
+
+def _make_chunk(circular, chunk_key, section_title, content, provenance):
+    return {
+        "circular_number": circular['Circular Number'],
+        "chunk_key": chunk_key,
+        "chunk": _format_chunk(circular, section_title, content),
+        "metadata": {
+            "circular_number": circular['Circular Number'],
+            "subject": circular['Subject'],
+            "date_of_issue": circular['Date Of Issue'],
+            "source_link": circular['link'],
+            # Normalized fields for payload-indexed filtering
+            "issue_date": parse_issue_date(circular.get('Date Of Issue')),
+            "department": normalize_department(circular.get('Department')),
+            "audience": audience_keywords(circular.get('Meant For')),
+            **provenance
+        }
+    }
+
+
+def chunk_circular(circular, max_chars=None, overlap_chars=None, min_chars=None):
+    """
+    Yields the chunks of one circular.
+
+    Sections longer than `max_chars` are split into overlapping windows;
+    consecutive sections shorter than `min_chars` are merged with their
+    neighbours as long as the result stays within `max_chars`. Each chunk
+    carries the section indices, titles and character offsets it came from.
+    With max_chars=0 every non-empty section becomes exactly one chunk.
+    """
+    max_chars = config.CHUNK_MAX_CHARS if max_chars is None else max_chars
+    overlap_chars = config.CHUNK_OVERLAP_CHARS if overlap_chars is None else overlap_chars
+    min_chars = config.CHUNK_MIN_CHARS if min_chars is None else min_chars
+
+    sections = []
+    for section_index, section in enumerate(circular['details']['circular']['contentSections']):
+        content = section.get('content', '').strip()
+        if content:
+            sections.append((section_index, section.get('title') or 'N/A', content))
+
+    merged = []  # Pending run of small whole sections
+
+    def flush():
+        if not merged:
+            return None
+        if len(merged) == 1:
+            section_index, title, content = merged[0]
+            chunk = _make_chunk(circular, str(section_index), title, content, {
+                "section_indices": [section_index],
+                "section_titles": [title]
+            })
+        else:
+            chunk = _make_chunk(
+                circular,
+                f"{merged[0][0]}-{merged[-1][0]}",
+                " | ".join(title for _, title, _ in merged),
+                "\n\n".join(f"{title}\n{content}" for _, title, content in merged),
+                {
+                    "section_indices": [section_index for section_index, _, _ in merged],
+                    "section_titles": [title for _, title, _ in merged]
+                }
+            )
+        merged.clear()
+        return chunk
+
+    for section_index, title, content in sections:
+        if max_chars and len(content) > max_chars:
+            chunk = flush()
+            if chunk:
+                yield chunk
+            windows = split_text(content, max_chars, overlap_chars)
+            for part, (start, end) in enumerate(windows):
+                yield _make_chunk(circular, f"{section_index}.{part}", title, content[start:end], {
+                    "section_indices": [section_index],
+                    "section_titles": [title],
+                    "part": part,
+                    "parts": len(windows),
+                    "char_start": start,
+                    "char_end": end
+                })
+            continue
+
+        if merged and max_chars:
+            merged_chars = sum(len(c) + len(t) for _, t, c in merged)
+            small = merged_chars < min_chars or len(content) < min_chars
+            if small and merged_chars + len(title) + len(content) <= max_chars:
+                merged.append((section_index, title, content))
+                continue
+        chunk = flush()
+        if chunk:
+            yield chunk
+        merged.append((section_index, title, content))
+
+    chunk = flush()
+    if chunk:
+        yield chunk
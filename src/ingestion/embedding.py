@@ -0,0 +1,135 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from src.utils import config
+from src.utils.providers import get_embedder
+
+
+def iter_batches(items, batch_size):
+    """Group any iterable into lists of at most `batch_size` items, lazily."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def validate_embedding(embedding, position):
+    """Check that a single embedding has the shape Qdrant expects."""
+    if not isinstance(embedding, list) or len(embedding) != config.EMBEDDING_DIM:
+        raise ValueError(f"Invalid embedding format for chunk {position}")
+    return embedding
+
+
+def embed_batch(texts, task_type="retrieval_document", first_position=1, embedder=None):
+    """
+    Embeds a list of texts with a single call to `embedder` (by default the
+    process-wide one). Transient failures are retried with exponential backoff.
+    """
+    embedder = embedder or get_embedder()
+    for attempt in range(config.EMBEDDING_MAX_RETRIES + 1):
+        try:
+            embeddings = embedder.embed(texts, task_type)
+            break
+        except Exception as e:
+            if attempt == config.EMBEDDING_MAX_RETRIES:
+                raise
+            delay = 2 ** attempt
+            print(f"Embedding batch at chunk {first_position} failed ({e}), retrying in {delay}s...")
+            time.sleep(delay)
+
+    if len(embeddings) != len(texts):
+        raise ValueError(
+            f"Expected {len(texts)} embeddings for batch at chunk {first_position}, got {len(embeddings)}"
+        )
+
+    return [validate_embedding(e, first_position + i) for i, e in enumerate(embeddings)]
+
+
+def embed_items(items, get_text=lambda item: item, task_type="retrieval_document",
+                batch_size=None, max_workers=None, cache=None, embedder=None):
+    """
+    Yields (item, embedding) pairs in input order.
+
+    Items are consumed lazily and grouped into multi-document batches; at most
+    `max_workers` batches are in flight at any time, so memory stays bounded
+    no matter how long the input is. When an `EmbeddingCache` is given, only
+    cache misses are sent to the API and new embeddings are written back.
+    `embedder` defaults to the process-wide one (get_embedder()).
+    """
+    batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+    max_workers = max_workers or config.EMBEDDING_MAX_WORKERS
+    max_window = batch_size * max_workers * 4
+    embedder = embedder or get_embedder()
+    model_name = embedder.model_name
+
+    window = deque()     # [item, cache_key, embedding, future, offset], in input order
+    in_flight = deque()  # submitted futures, oldest first
+    miss_batch = []      # window entries not yet sent to the API
+    position = 1
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def submit():
+            nonlocal position
+            texts = [get_text(entry[0]) for entry in miss_batch]
+            future = executor.submit(embed_batch, texts, task_type, position, embedder)
+            for offset, entry in enumerate(miss_batch):
+                entry[3] = future
+                entry[4] = offset
+            in_flight.append(future)
+            position += len(miss_batch)
+            miss_batch.clear()
+
+        def drain(block):
+            while window:
+                entry = window[0]
+                if entry[2] is None:
+                    future = entry[3]
+                    if future is None or (not block and not future.done()):
+                        return
+                    entry[2] = future.result()[entry[4]]
+                    if cache is not None:
+                        cache.put(entry[1], entry[2])
+                window.popleft()
+                yield entry[0], entry[2]
+
+        for item in items:
+            key = None
+            embedding = None
+            if cache is not None:
+                key = cache.make_key(get_text(item), model_name, task_type)
+                embedding = cache.get(key)
+
+            entry = [item, key, embedding, None, 0]
+            window.append(entry)
+            if embedding is None:
+                miss_batch.append(entry)
+                if len(miss_batch) == batch_size:
+                    submit()
+
+            # Don't let cache hits pile up behind a partially filled batch
+            if len(window) >= max_window and miss_batch:
+                submit()
+
+            # Keep the number of batches in flight bounded
+            while len(in_flight) >= max_workers or (in_flight and in_flight[0].done()):
+                in_flight.popleft().result()
+
+            yield from drain(block=len(window) >= max_window)
+
+        if miss_batch:
+            submit()
+        yield from drain(block=True)
+
+
+def embed_texts(texts, task_type="retrieval_document", batch_size=None, max_workers=None, cache=None, embedder=None):
+    """Embeds a list of texts and returns the embeddings in the same order."""
+    return [
+        embedding for _, embedding in
+        embed_items(texts, task_type=task_type, batch_size=batch_size, max_workers=max_workers,
+                    cache=cache, embedder=embedder)
+    ]
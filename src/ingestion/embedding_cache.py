@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+import numpy as np
+from src.utils import config
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding store on local disk.
+
+    Vectors live in a memory-mapped float32 file (`vectors.f32`), one row per
+    slot. A small JSON index maps each key to its slot and keeps the entries in
+    least-recently-used order so the oldest ones can be evicted once
+    `max_entries` is reached, plus the wall-clock time each key was written,
+    so readers can ignore entries older than a maximum age.
+
+    Lookups never write: an expired entry is dropped in memory and `dirty`
+    is set, and its slot is only reused after the next `save`, so the saved
+    index never points at a slot that was overwritten.
+
+    The cache is single-process: every instance keeps its own index and free
+    slot list in memory, and `save` overwrites `index.json` with its own view.
+    Two processes sharing a cache directory will lose each other's entries
+    and can hand the same slot to different keys.
+    """
+
+    def __init__(self, cache_dir, dim=None, max_entries=None):
+        self.cache_dir = cache_dir
+        self.dim = dim or config.EMBEDDING_DIM
+        self.max_entries = max_entries or config.EMBEDDING_CACHE_MAX_ENTRIES
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.index_path = os.path.join(cache_dir, "index.json")
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = False  # changes not yet in index.json
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._entries = OrderedDict()  # key -> slot, oldest first
+        self._written = {}  # key -> time.time() of the last put
+        self._capacity = 0
+        self._load()
+
+    @staticmethod
+    def make_key(text, model, task_type):
+        """Hash of the text plus everything that changes its embedding."""
+        digest = hashlib.sha256()
+        digest.update(f"{model}\n{task_type}\n".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _load(self):
+        index = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r") as f:
+                    index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Embedding cache index unreadable, starting empty: {e}")
+                index = {}
+
+        if index.get("dim") != self.dim or not os.path.exists(self.vectors_path):
+            index = {}
+
+        self._entries = OrderedDict(index.get("entries", []))
+        # Indexes written before write times were kept count as written at the epoch
+        written = index.get("written", {})
+        self._written = {key: written.get(key, 0.0) for key in self._entries}
+        capacity = index.get("capacity", 0)
+        self._open_vectors(max(capacity, min(self.max_entries, 1024)))
+
+        used = set(self._entries.values())
+        self._free = [slot for slot in range(self._capacity - 1, -1, -1) if slot not in used]
+        self._released = []  # slots of dropped entries, free once the index is saved
+
+        # A smaller max_entries than the cache was written with: trim right away
+        if len(self._entries) > self.max_entries:
+            self._evict(len(self._entries) - self.max_entries)
+
+    def _open_vectors(self, capacity):
+        """Map the vector file, growing it on disk to `capacity` rows if needed."""
+        size = capacity * self.dim * 4
+        with open(self.vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def _grow(self):
+        new_capacity = min(self.max_entries, max(self._capacity * 2, 1))
+        self._vectors.flush()
+        del self._vectors
+        old_capacity = self._capacity
+        self._open_vectors(new_capacity)
+        self._free.extend(range(new_capacity - 1, old_capacity - 1, -1))
+
+    def _evict(self, count):
+        """
+        Drop the `count` least recently used entries.
+        The index is saved before the freed slots are handed out again, so a
+        crash can never leave an old key pointing at a new key's vector.
+        """
+        for _ in range(min(count, len(self._entries))):
+            key, slot = self._entries.popitem(last=False)
+            self._written.pop(key, None)
+            self._released.append(slot)
+            self.evictions += 1
+        self.save()
+
+    def _expire(self, key):
+        """Drop one entry that outlived its maximum age; its slot is freed by the next `save`."""
+        self._released.append(self._entries.pop(key))
+        self._written.pop(key, None)
+        self.evictions += 1
+        self.dirty = True
+
+    def _allocate_slot(self):
+        if not self._free:
+            if self._released:
+                # Slots of expired entries: saving the index makes them safe to reuse
+                self.save()
+            elif self._capacity < self.max_entries:
+                self._grow()
+            else:
+                # Evict in bulk to amortize the index write
+                self._evict(max(1, self.max_entries // 10))
+        return self._free.pop()
+
+    def get(self, key, max_age=None):
+        """
+        Returns the cached embedding as a list of floats, or None. With
+        `max_age` (seconds), an entry written longer ago is removed and
+        reported as a miss.
+        """
+        slot = self._entries.get(key)
+        if slot is not None and max_age is not None and time.time() - self._written[key] > max_age:
+            self._expire(key)
+            slot = None
+        if slot is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._vectors[slot].tolist()
+
+    def put(self, key, embedding):
+        slot = self._entries.get(key)
+        if slot is None:
+            slot = self._allocate_slot()
+        self._vectors[slot] = np.asarray(embedding, dtype=np.float32)
+        self._entries[key] = slot
+        self._entries.move_to_end(key)
+        self._written[key] = time.time()
+        self.dirty = True
+
+    def written_at(self, key):
+        """time.time() when `key` was last written, or None if it isn't cached."""
+        return self._written.get(key)
+
+    def save(self):
+        """Flush vectors to disk, then atomically replace the index."""
+        self._vectors.flush()
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "dim": self.dim,
+                "capacity": self._capacity,
+                "entries": list(self._entries.items()),
+                "written": self._written
+            }, f)
+        os.replace(tmp_path, self.index_path)
+        self._free.extend(self._released)
+        self._released = []
+        self.dirty = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def report(self):
+        lookups = self.hits + self.misses
+        hit_rate = (self.hits / lookups * 100) if lookups else 0.0
+        return (
+            f"Embedding cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+            f"{self.evictions} evictions, {len(self)}/{self.max_entries} entries"
+        )
+
+
+def open_embedding_cache():
+    """Returns the configured ingestion cache, or None when caching is disabled."""
+    if not config.EMBEDDING_CACHE_ENABLED:
+        return None
+    try:
+        return EmbeddingCache(config.EMBEDDING_CACHE_DIR)
+    except Exception as e:
+        print(f"Could not open embedding cache at {config.EMBEDDING_CACHE_DIR}: {e}")
+        return None
@@ -0,0 +1,340 @@
+"""
+Circular knowledge graph in Neo4j: circulars, the departments that issued
+them, the audiences they are meant for, and the references between
+circulars found in their text.
+
+    (:Circular)-[:ISSUED_BY]->(:Department {name})
+    (:Circular)-[:MEANT_FOR]->(:Audience {key})
+    (:Circular)-[:REFERS_TO|AMENDS|SUPERSEDES {mentions}]->(:Circular)
+
+Circulars from the data file have in_corpus = true and are keyed by their
+"Circular Number". Most references point at older circulars that are not
+in the data; those become Circular nodes with in_corpus = false, keyed by
+the normalized reference. The reference type is a heuristic read of the
+words around the mention ("superseded", "amended", ...).
+
+Loads are batched (UNWIND/MERGE, GRAPH_INGEST_BATCH_SIZE rows per
+transaction) and incremental: every circular node stores a hash of its
+properties and one of its resolved references, and only circulars whose
+hashes changed are rewritten. Reloading unchanged data writes nothing.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from src.utils import config
+from src.utils.clients import get_neo4j_connection
+from src.utils.ingest_version import bump_ingest_version
+from src.ingestion.metadata import audience_keywords, normalize_department, parse_issue_date
+from src.ingestion.reader import iter_circulars
+from src.retrieval.reference_index import ReferenceIndexBuilder, iter_reference_spans
+
+# Bump when extraction changes, so the next load rewrites every circular
+EXTRACTION_VERSION = 1
+
+GRAPH_SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT circular_number_unique IF NOT EXISTS FOR (c:Circular) REQUIRE c.number IS UNIQUE",
+    "CREATE CONSTRAINT department_name_unique IF NOT EXISTS FOR (d:Department) REQUIRE d.name IS UNIQUE",
+    "CREATE CONSTRAINT audience_key_unique IF NOT EXISTS FOR (a:Audience) REQUIRE a.key IS UNIQUE",
+]
+
+# Strongest first: a circular both citing and superseding another gets one SUPERSEDES edge
+REFERENCE_TYPES = ("SUPERSEDES", "AMENDS", "REFERS_TO")
+_REFERENCE_TYPE_PATTERNS = {
+    "SUPERSEDES": re.compile(r"supersed|supersession|withdrawn|repeal|rescind", re.IGNORECASE),
+    "AMENDS": re.compile(r"amend|modif|revis|substitut", re.IGNORECASE),
+}
+# Standing phrases that don't mean this circular changes the one it cites
+_BOILERPLATE = re.compile(r"(?:as )?(?:amended|updated|modified|revised) from time to time", re.IGNORECASE)
+# "... Circular No. 36 dated April 04, 2008": the year disambiguates A.P. (DIR Series) numbers
+_DATED_YEAR = re.compile(r"\s*(?:\([^)]*\)\s*)?,?\s*dated\s+[^;\n]{0,20}?\b((?:19|20)\d{2})\b", re.IGNORECASE)
+# Keys that look like a circular reference even when no circular in the data carries them
+_EXTERNAL_REFERENCE = re.compile(r"(?=.*[a-z])(?=.*/)(?=.*\b(?:19|20)\d{2}-\d{2}\b).+")
+_CONTEXT_CHARS = 200
+
+
+def _issue_year(circular):
+    issue_date = parse_issue_date(circular.get('Date Of Issue'))
+    return time.gmtime(issue_date).tm_year if issue_date is not None else None
+
+
+def _mention_type(text, start, end):
+    """Reference type from the words around a mention, within its paragraph."""
+    line_start = text.rfind("\n", 0, start) + 1
+    line_end = text.find("\n", end)
+    line_end = len(text) if line_end < 0 else line_end
+    context = _BOILERPLATE.sub(" ", text[max(line_start, start - _CONTEXT_CHARS):min(line_end, end + _CONTEXT_CHARS)])
+    for reference_type, pattern in _REFERENCE_TYPE_PATTERNS.items():
+        if pattern.search(context):
+            return reference_type
+    return "REFERS_TO"
+
+
+def _resolve(key, year, keys, years):
+    """Target node keys for one mention: circulars in the data, else the external reference, else []."""
+    candidates = keys.get(key) or keys.get(key.split("/")[0]) or []
+    if year is not None:
+        candidates = [number for number in candidates if years.get(number) in (None, year)]
+    if candidates:
+        return candidates
+    if key.startswith("a.p.(dir)/"):
+        # Numbering restarts every year, so an undated A.P. (DIR) mention can't be pinned down
+        return [f"{key}/{year}"] if year is not None else []
+    return [key] if _EXTERNAL_REFERENCE.fullmatch(key) else []
+
+
+def circular_references(circular, keys, years):
+    """[{"target", "type", "mentions"}] for the circulars this one mentions, sorted by target."""
+    number = circular['Circular Number']
+    references = {}  # target -> [type, mentions]
+    for section in circular.get('details', {}).get('circular', {}).get('contentSections', []):
+        text = section.get('content') or ""
+        for key, start, end in iter_reference_spans(text):
+            dated = _DATED_YEAR.match(text, end)
+            targets = _resolve(key, int(dated.group(1)) if dated else None, keys, years)
+            if not targets:
+                continue
+            reference_type = _mention_type(text, start, end)
+            for target in targets:
+                if target == number:
+                    continue
+                reference = references.setdefault(target, [reference_type, 0])
+                if REFERENCE_TYPES.index(reference_type) < REFERENCE_TYPES.index(reference[0]):
+                    reference[0] = reference_type
+                reference[1] += 1
+    return [
+        {"target": target, "type": reference_type, "mentions": mentions}
+        for target, (reference_type, mentions) in sorted(references.items())
+    ]
+
+
+def _fingerprint(value):
+    digest = hashlib.sha256(str(EXTRACTION_VERSION).encode("utf-8"))
+    digest.update(json.dumps(value, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def extract_graph(path=None):
+    """
+    Graph records for every circular in the data file, in two streaming
+    passes: the first collects every circular's reference keys, so the
+    second can resolve mentions against the whole corpus.
+    """
+    path = path or config.DATA_PATH
+    key_builder = ReferenceIndexBuilder()
+    years = {}
+    for circular in iter_circulars(path):
+        key_builder.add_circular(circular)
+        years[circular['Circular Number']] = _issue_year(circular)
+
+    records = []
+    for circular in iter_circulars(path):
+        properties = {
+            "number": circular['Circular Number'],
+            "subject": circular.get('Subject'),
+            "date_of_issue": circular.get('Date Of Issue'),
+            "issue_date": parse_issue_date(circular.get('Date Of Issue')),
+            "link": circular.get('link'),
+            "department": normalize_department(circular.get('Department')),
+            "audiences": audience_keywords(circular.get('Meant For')),
+        }
+        references = circular_references(circular, key_builder.keys, years)
+        records.append({
+            **properties,
+            "references": references,
+            "record_hash": _fingerprint(properties),
+            "references_hash": _fingerprint(references),
+        })
+    return records
+
+
+def _write_circulars(tx, rows):
+    tx.run("""
+        UNWIND $rows AS row
+        MATCH (:Circular {number: row.number})-[old:ISSUED_BY|MEANT_FOR]->()
+        DELETE old
+    """, {"rows": rows}).consume()
+    tx.run("""
+        UNWIND $rows AS row
+        MERGE (c:Circular {number: row.number})
+        SET c.in_corpus = true,
+            c.subject = row.subject,
+            c.date_of_issue = row.date_of_issue,
+            c.issue_date = row.issue_date,
+            c.link = row.link,
+            c.record_hash = row.record_hash
+        FOREACH (name IN CASE WHEN row.department IS NULL THEN [] ELSE [row.department] END |
+            MERGE (d:Department {name: name})
+            MERGE (c)-[:ISSUED_BY]->(d))
+        FOREACH (key IN row.audiences |
+            MERGE (a:Audience {key: key})
+            MERGE (c)-[:MEANT_FOR]->(a))
+    """, {"rows": rows}).consume()
+
+
+def _write_references(tx, rows):
+    tx.run("""
+        UNWIND $rows AS row
+        MATCH (:Circular {number: row.number})-[old:REFERS_TO|AMENDS|SUPERSEDES]->()
+        DELETE old
+    """, {"rows": rows}).consume()
+    # Relationship types can't be parameters, so one statement per type
+    for reference_type in REFERENCE_TYPES:
+        edges = [
+            {"source": row["number"], "target": reference["target"], "mentions": reference["mentions"]}
+            for row in rows
+            for reference in row["references"]
+            if reference["type"] == reference_type
+        ]
+        if edges:
+            tx.run(f"""
+                UNWIND $edges AS edge
+                MATCH (c:Circular {{number: edge.source}})
+                MERGE (t:Circular {{number: edge.target}})
+                ON CREATE SET t.in_corpus = false
+                MERGE (c)-[r:{reference_type}]->(t)
+                SET r.mentions = edge.mentions
+            """, {"edges": edges}).consume()
+    tx.run("""
+        UNWIND $rows AS row
+        MATCH (c:Circular {number: row.number})
+        SET c.references_hash = row.references_hash
+    """, {"rows": rows}).consume()
+
+
+def _remove_circulars(tx, numbers):
+    # Circulars dropped from the data stay as external nodes while something still refers to them
+    tx.run("""
+        UNWIND $numbers AS number
+        MATCH (c:Circular {number: number})
+        OPTIONAL MATCH (c)-[old]->()
+        DELETE old
+        WITH DISTINCT c
+        SET c.in_corpus = false
+        REMOVE c.subject, c.date_of_issue, c.issue_date, c.link, c.record_hash, c.references_hash
+    """, {"numbers": numbers}).consume()
+
+
+def _prune_unreferenced(tx):
+    return tx.run("""
+        MATCH (n)
+        WHERE (n:Department OR n:Audience OR (n:Circular AND NOT n.in_corpus)) AND NOT ()-->(n)
+        DETACH DELETE n
+        RETURN count(n) AS pruned
+    """).single()["pruned"]
+
+
+def _clear_graph(tx, batch_size):
+    return tx.run("""
+        MATCH (n) WHERE n:Circular OR n:Department OR n:Audience
+        WITH n LIMIT $batch_size
+        DETACH DELETE n
+        RETURN count(n) AS deleted
+    """, {"batch_size": batch_size}).single()["deleted"]
+
+
+def fetch_graph_hashes(session):
+    """{number: (record_hash, references_hash)} for every circular loaded from the data."""
+    result = session.run("""
+        MATCH (c:Circular) WHERE c.in_corpus
+        RETURN c.number AS number, c.record_hash AS record_hash, c.references_hash AS references_hash
+    """)
+    return {record["number"]: (record["record_hash"], record["references_hash"]) for record in result}
+
+
+def ensure_graph_schema(session):
+    for statement in GRAPH_SCHEMA_STATEMENTS:
+        session.run(statement).consume()
+
+
+def load_graph(driver, records, mode=None, batch_size=None):
+    """
+    Brings the circular graph in line with `records` (from extract_graph).
+    mode="sync" (default) rewrites only changed circulars and removes
+    circulars no longer in the data; mode="rebuild" deletes the graph first.
+    Returns counts of what was written.
+    """
+    mode = mode or config.INGEST_MODE
+    if mode not in ("sync", "rebuild"):
+        raise ValueError(f"Unknown ingestion mode '{mode}', expected 'sync' or 'rebuild'")
+    batch_size = batch_size or config.GRAPH_INGEST_BATCH_SIZE
+
+    with driver.session() as session:
+        ensure_graph_schema(session)
+        if mode == "rebuild":
+            while session.execute_write(_clear_graph, 10_000):
+                pass
+        existing = fetch_graph_hashes(session)
+
+        current = {record["number"] for record in records}
+        changed = [record for record in records if existing.get(record["number"], (None,))[0] != record["record_hash"]]
+        relinked = [
+            record for record in records
+            if existing.get(record["number"], (None, None))[1] != record["references_hash"]
+        ]
+        removed = [number for number in existing if number not in current]
+
+        # Circular nodes first, so reference edges between them find both ends
+        for i in range(0, len(changed), batch_size):
+            session.execute_write(_write_circulars, changed[i:i + batch_size])
+        for i in range(0, len(relinked), batch_size):
+            session.execute_write(_write_references, relinked[i:i + batch_size])
+        for i in range(0, len(removed), batch_size):
+            session.execute_write(_remove_circulars, removed[i:i + batch_size])
+        pruned = session.execute_write(_prune_unreferenced) if (changed or relinked or removed) else 0
+
+    return {
+        "circulars": len(records),
+        "written": len(changed),
+        "relinked": len(relinked),
+        "removed": len(removed),
+        "pruned": pruned,
+        "references": sum(len(record["references"]) for record in relinked),
+    }
+
+
+def ingest_graph(connection=None, mode=None):
+    """
+    Extracts the circular graph from DATA_PATH and loads it into Neo4j,
+    through `connection` (a Neo4jConnection) or the process-wide one.
+    Returns the load counts, or None if it failed.
+    """
+    print("--- Starting Graph Ingestion ---")
+    if not os.path.exists(config.DATA_PATH):
+        print(f"Error loading data file: {config.DATA_PATH} does not exist")
+        return None
+    try:
+        started = time.perf_counter()
+        records = extract_graph()
+        references = sum(len(record["references"]) for record in records)
+        numbers = {record["number"] for record in records}
+        in_corpus = sum(1 for record in records for reference in record["references"] if reference["target"] in numbers)
+        print(
+            f"Extracted {len(records)} circulars and {references} references "
+            f"({in_corpus} to circulars in the data) in {time.perf_counter() - started:.2f}s"
+        )
+
+        connection = connection or get_neo4j_connection()
+        started = time.perf_counter()
+        counts = load_graph(connection.driver, records, mode)
+        elapsed = time.perf_counter() - started
+        print(
+            f"Loaded graph in {elapsed:.2f}s: {counts['written']} circulars written, "
+            f"references rewritten for {counts['relinked']} ({counts['references']} edges), "
+            f"{counts['circulars'] - counts['written']} unchanged, {counts['removed']} removed, "
+            f"{counts['pruned']} unreferenced nodes pruned"
+        )
+        # Cached graph neighbourhoods (and answers built on them) are now stale
+        if counts["written"] or counts["relinked"] or counts["removed"]:
+            bump_ingest_version()
+        print("--- Graph Ingestion Complete ---")
+        return counts
+    except Exception as e:
+        print(f"Error loading circular graph into Neo4j: {str(e)}")
+        return None
+
+
+if __name__ == "__main__":
+    ingest_graph(mode=sys.argv[1] if len(sys.argv) > 1 else None)
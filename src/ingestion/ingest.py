@@ -1,21 +1,141 @@
+import hashlib
 import json
+import os
 import uuid
 from qdrant_client import QdrantClient, models
-import google.generativeai as genai
 from src.utils import config
+from src.utils.providers import get_embedder
+from src.utils.ingest_version import bump_ingest_version
+from src.ingestion.embedding import embed_items, iter_batches
+from src.ingestion.embedding_cache import open_embedding_cache
+from src.ingestion.reader import iter_circulars, iter_chunks
+from src.ingestion.pipeline import Pipeline, report_stage_stats
+from src.retrieval.bm25 import BM25IndexBuilder
+from src.retrieval.reference_index import ReferenceIndexBuilder
+from src.retrieval.local_index import export_local_index
+from src.retrieval.compression import qdrant_quantization_config
 import time
 import sys
 
-def ingest_data():
+# Namespace for point IDs derived from circular number + chunk key
+POINT_ID_NAMESPACE = uuid.UUID("5d0c3c1e-6f1a-4b0e-9a8e-2b7c1f4e9d21")
+
+def point_id_for(circular_number, chunk_key):
+    """
+    Deterministic Qdrant point ID for one chunk of a circular.
+    `chunk_key` is the section index, "<section>.<part>" for a window of a
+    long section, or "<first>-<last>" for merged small sections.
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{circular_number}#{chunk_key}"))
+
+
+def content_hash_for(chunk, metadata):
+    """Fingerprint of everything stored in a point, used to skip unchanged chunks."""
+    digest = hashlib.sha256()
+    digest.update(get_embedder().model_name.encode("utf-8"))
+    digest.update(chunk.encode("utf-8"))
+    digest.update(json.dumps(metadata, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# Payload fields that retrieval filters on; indexed so filters don't scan every point
+PAYLOAD_INDEXES = {
+    "metadata.issue_date": models.PayloadSchemaType.INTEGER,
+    "metadata.department": models.PayloadSchemaType.KEYWORD,
+    "metadata.audience": models.PayloadSchemaType.KEYWORD,
+}
+
+
+def ensure_payload_indexes(qdrant_client):
+    """Creates any missing payload indexes on the collection."""
+    existing = qdrant_client.get_collection(config.QDRANT_COLLECTION_NAME).payload_schema or {}
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        if field_name in existing:
+            continue
+        qdrant_client.create_payload_index(
+            collection_name=config.QDRANT_COLLECTION_NAME,
+            field_name=field_name,
+            field_schema=field_schema,
+            wait=True
+        )
+        print(f"Created {field_schema.value} payload index on '{field_name}'")
+
+
+def vector_params():
+    """
+    Collection vector config. With quantization the original vectors move to
+    disk and only the quantized copies stay in RAM; they are read back only
+    to rescore candidates.
+    """
+    return models.VectorParams(
+        size=config.EMBEDDING_DIM,
+        distance=models.Distance.COSINE,
+        on_disk=qdrant_quantization_config() is not None
+    )
+
+
+def ensure_quantization(qdrant_client):
+    """
+    Brings an existing collection's quantization (type and every setting)
+    and its vector storage (`on_disk`) in line with VECTOR_COMPRESSION.
+    """
+    collection_config = qdrant_client.get_collection(config.QDRANT_COLLECTION_NAME).config
+    current = collection_config.quantization_config
+    desired = qdrant_quantization_config()
+    if current != desired:
+        qdrant_client.update_collection(
+            collection_name=config.QDRANT_COLLECTION_NAME,
+            quantization_config=desired if desired is not None else models.Disabled.DISABLED
+        )
+        print(f"Set collection quantization to '{config.VECTOR_COMPRESSION}': {desired}")
+
+    # on_disk comes back unset for collections created with the default (in RAM)
+    on_disk = vector_params().on_disk
+    if bool(collection_config.params.vectors.on_disk) != on_disk:
+        qdrant_client.update_collection(
+            collection_name=config.QDRANT_COLLECTION_NAME,
+            vectors_config={"": models.VectorParamsDiff(on_disk=on_disk)}  # "" is the unnamed vector
+        )
+        print(f"Moved collection vectors {'to disk' if on_disk else 'into RAM'}")
+
+
+def fetch_point_hashes(qdrant_client):
+    """Returns {point_id: content_hash} for every point already in the collection."""
+    existing = {}
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=config.QDRANT_COLLECTION_NAME,
+            limit=1000,
+            offset=offset,
+            with_payload=["content_hash"],
+            with_vectors=False
+        )
+        for point in points:
+            existing[str(point.id)] = (point.payload or {}).get("content_hash")
+        if offset is None:
+            return existing
+
+
+def ingest_data(mode=None):
     """
     Reads data, creates embeddings, and upserts them into Qdrant.
+
+    mode="sync" (default) keeps the collection online: only new or changed
+    chunks are embedded and upserted, and points for removed sections are
+    deleted. mode="rebuild" drops and recreates the collection first.
     """
-    print("--- Starting Data Ingestion ---")
+    mode = mode or config.INGEST_MODE
+    if mode not in ("sync", "rebuild"):
+        raise ValueError(f"Unknown ingestion mode '{mode}', expected 'sync' or 'rebuild'")
+
+    print(f"--- Starting Data Ingestion ({mode}) ---")
     print(f"Python version: {sys.version}")
     print(f"Environment variables:")
     print(f"QDRANT_HOST: {config.QDRANT_HOST}")
     print(f"QDRANT_PORT: {config.QDRANT_PORT}")
     print(f"GOOGLE_API_KEY: {'Set' if config.GOOGLE_API_KEY else 'Not Set'}")
+    print(f"EMBEDDING_PROVIDER: {config.EMBEDDING_PROVIDER}")
 
     # --- 1. Initialize Clients ---
     try:
@@ -36,18 +156,16 @@ def ingest_data():
             print(f"Error testing Qdrant connection: {e}")
             raise
         
-        if not config.GOOGLE_API_KEY:
+        if config.EMBEDDING_PROVIDER == "gemini" and not config.GOOGLE_API_KEY:
             raise ValueError("GOOGLE_API_KEY is not set in environment variables")
-            
-        genai.configure(api_key=config.GOOGLE_API_KEY)
-        print("Successfully configured Gemini API")
+        print(f"Embedding with {get_embedder().model_name}")
     except Exception as e:
         print(f"Error initializing clients: {e}")
         return
 
     # --- 2. Create Qdrant Collection ---
     try:
-        print(f"\nCreating collection '{config.QDRANT_COLLECTION_NAME}'...")
+        print(f"\nPreparing collection '{config.QDRANT_COLLECTION_NAME}'...")
         
         # Check if collection exists
         try:
@@ -58,152 +176,217 @@ def ingest_data():
             print(f"Error getting collections: {e}")
             raise
         
-        if config.QDRANT_COLLECTION_NAME in collection_names:
+        collection_exists = config.QDRANT_COLLECTION_NAME in collection_names
+        if collection_exists and mode == "rebuild":
             print(f"Collection '{config.QDRANT_COLLECTION_NAME}' already exists. Recreating...")
             try:
                 qdrant_client.delete_collection(collection_name=config.QDRANT_COLLECTION_NAME)
                 print("Successfully deleted existing collection")
+                collection_exists = False
                 time.sleep(1)  # Wait for deletion to complete
             except Exception as e:
                 print(f"Error deleting collection: {e}")
                 raise
         
-        # Create new collection
-        try:
-            qdrant_client.create_collection(
-                collection_name=config.QDRANT_COLLECTION_NAME,
-                vectors_config=models.VectorParams(size=768, distance=models.Distance.COSINE),
-            )
-            print(f"Collection '{config.QDRANT_COLLECTION_NAME}' created successfully")
-        except Exception as e:
-            print(f"Error creating collection: {e}")
-            raise
-        
-        # Verify collection was created
+        if collection_exists:
+            print(f"Collection '{config.QDRANT_COLLECTION_NAME}' already exists. Syncing in place...")
+        else:
+            # Create new collection
+            try:
+                qdrant_client.create_collection(
+                    collection_name=config.QDRANT_COLLECTION_NAME,
+                    vectors_config=vector_params(),
+                    quantization_config=qdrant_quantization_config()
+                )
+                print(f"Collection '{config.QDRANT_COLLECTION_NAME}' created successfully")
+            except Exception as e:
+                print(f"Error creating collection: {e}")
+                raise
+            
+            # Verify collection was created
+            try:
+                collections = qdrant_client.get_collections().collections
+                collection_names = [collection.name for collection in collections]
+                if config.QDRANT_COLLECTION_NAME not in collection_names:
+                    raise Exception(f"Collection '{config.QDRANT_COLLECTION_NAME}' was not created successfully")
+                print(f"Verified collection exists: {config.QDRANT_COLLECTION_NAME}")
+            except Exception as e:
+                print(f"Error verifying collection: {e}")
+                raise
+
+        # Index filterable fields up front, so points are indexed as they arrive
         try:
-            collections = qdrant_client.get_collections().collections
-            collection_names = [collection.name for collection in collections]
-            if config.QDRANT_COLLECTION_NAME not in collection_names:
-                raise Exception(f"Collection '{config.QDRANT_COLLECTION_NAME}' was not created successfully")
-            print(f"Verified collection exists: {config.QDRANT_COLLECTION_NAME}")
+            ensure_payload_indexes(qdrant_client)
+            ensure_quantization(qdrant_client)
         except Exception as e:
-            print(f"Error verifying collection: {e}")
+            print(f"Error configuring payload indexes or quantization: {e}")
             raise
+
+        # Fetch what is already stored so unchanged chunks can be skipped
+        existing_hashes = fetch_point_hashes(qdrant_client) if collection_exists else {}
+        print(f"Collection currently holds {len(existing_hashes)} points")
             
     except Exception as e:
         print(f"Error in collection creation process: {e}")
         return
 
-    # --- 3. Load and Process Data ---
-    print(f"\nLoading data from {config.DATA_PATH}...")
-    try:
-        with open(config.DATA_PATH, 'r') as f:
-            data = json.load(f)
-        print(f"Successfully loaded data file with {len(data.get('circulars', []))} circulars")
-    except Exception as e:
-        print(f"Error loading data file: {e}")
+    # --- 3. Stream and Diff Data ---
+    print(f"\nStreaming data from {config.DATA_PATH}...")
+    if not os.path.exists(config.DATA_PATH):
+        print(f"Error loading data file: {config.DATA_PATH} does not exist")
         return
 
-    points_to_upsert = []
-    for circular in data['circulars']:
-        for section in circular['details']['circular']['contentSections']:
-            content = section.get('content', '').strip()
-            if not content:
+    # Only point IDs, hashes, compact BM25 postings and reference keys are kept
+    # for the whole corpus; circulars, chunks and vectors flow between the stages below
+    # through bounded queues.
+    current_ids = set()
+    counts = {"chunks": 0, "unchanged": 0, "upserted": 0}
+    stale_ids = []
+    batch_size = 100
+    bm25_builder = BM25IndexBuilder()
+    reference_builder = ReferenceIndexBuilder()
+
+    def read_stage():
+        return iter_circulars(config.DATA_PATH)
+
+    def register_references(circulars):
+        for circular in circulars:
+            reference_builder.add_circular(circular)
+            yield circular
+
+    def chunk_stage(circulars):
+        for chunk in iter_chunks(register_references(circulars)):
+            point_id = point_id_for(chunk["circular_number"], chunk["chunk_key"])
+            content_hash = content_hash_for(chunk["chunk"], chunk["metadata"])
+            current_ids.add(point_id)
+            counts["chunks"] += 1
+            # The lexical index covers every chunk, changed or not
+            bm25_builder.add(point_id, chunk["chunk"], chunk["circular_number"])
+            reference_builder.add_point(chunk["circular_number"], point_id)
+            if existing_hashes.get(point_id) == content_hash:
+                counts["unchanged"] += 1
                 continue
+            chunk["id"] = point_id
+            chunk["hash"] = content_hash
+            yield chunk
 
-            # Create a meaningful document chunk with metadata
-            document_chunk = (
-                f"Circular Number: {circular['Circular Number']}\n"
-                f"Subject: {circular['Subject']}\n"
-                f"Section: {section.get('title', 'N/A')}\n\n"
-                f"{content}"
-            )
-            
-            points_to_upsert.append({
-                "chunk": document_chunk,
-                "metadata": {
-                    "circular_number": circular['Circular Number'],
-                    "subject": circular['Subject'],
-                    "date_of_issue": circular['Date Of Issue'],
-                    "source_link": circular['link']
+    def embed_stage(chunks):
+        # Embed in multi-document batches with a bounded number of requests in flight
+        return embed_items(
+            chunks,
+            get_text=lambda chunk: chunk["chunk"],
+            task_type="retrieval_document",
+            cache=embedding_cache
+        )
+
+    def upsert_batch(batch, wait):
+        points = [
+            models.PointStruct(
+                id=chunk["id"],
+                vector=embedding,
+                payload={
+                    "text": chunk["chunk"],
+                    "metadata": chunk["metadata"],
+                    "content_hash": chunk["hash"]
                 }
-            })
-    
-    print(f"Processed {len(points_to_upsert)} text chunks.")
+            )
+            for chunk, embedding in batch
+        ]
+        try:
+            qdrant_client.upsert(
+                collection_name=config.QDRANT_COLLECTION_NAME,
+                points=points,
+                wait=wait
+            )
+        except Exception as e:
+            print(f"Error upserting batch ending at point {counts['upserted'] + len(points)}: {e}")
+            raise
+        counts["upserted"] += len(points)
+
+    def upsert_stage(embedded):
+        # Upserts don't wait for Qdrant to apply them. The last batch is held
+        # back so the final write of the run can act as the consistency barrier:
+        # Qdrant applies updates in order, so waiting on it covers all earlier ones.
+        held_batch = []
+        for batch in iter_batches(embedded, batch_size):
+            if held_batch:
+                upsert_batch(held_batch, wait=False)
+                print(f"Upserted {counts['upserted']} points so far")
+                yield from (chunk["id"] for chunk, _ in held_batch)
+            held_batch = batch
+
+        # The chunk stage has finished by now, so the set of current IDs is complete
+        stale_ids.extend(point_id for point_id in existing_hashes if point_id not in current_ids)
+        if held_batch:
+            upsert_batch(held_batch, wait=not stale_ids)
+            yield from (chunk["id"] for chunk, _ in held_batch)
 
     # --- 4. Generate Embeddings and Upsert to Qdrant ---
     print("\nGenerating embeddings and upserting to Qdrant...")
+    print(
+        f"Embedding in batches of up to {config.EMBEDDING_BATCH_SIZE} "
+        f"({config.EMBEDDING_MAX_WORKERS} in flight)"
+    )
     try:
-        # Get embeddings in a batch
-        text_chunks = [p['chunk'] for p in points_to_upsert]
-        embeddings = []
-        
-        # Process embeddings in smaller batches to avoid rate limits
-        batch_size = 5  # Reduced batch size for better error handling
-        for i in range(0, len(text_chunks), batch_size):
-            batch = text_chunks[i:i + batch_size]
-            print(f"\nProcessing batch {i//batch_size + 1} of {(len(text_chunks) + batch_size - 1)//batch_size}")
-            
-            for j, text in enumerate(batch):
-                try:
-                    print(f"Generating embedding for chunk {i + j + 1} of {len(text_chunks)}")
-                    result = genai.embed_content(
-                        model="models/embedding-001",
-                        content=text,
-                        task_type="retrieval_document"
-                    )
-                    
-                    if not result or "embedding" not in result:
-                        raise ValueError(f"Invalid embedding result for chunk {i + j + 1}")
-                        
-                    embedding = result["embedding"]
-                    if not isinstance(embedding, list) or len(embedding) != 768:
-                        raise ValueError(f"Invalid embedding format for chunk {i + j + 1}")
-                        
-                    embeddings.append(embedding)
-                    print(f"Successfully generated embedding for chunk {i + j + 1}")
-                    
-                except Exception as e:
-                    print(f"Error generating embedding for chunk {i + j + 1}: {e}")
-                    raise  # Re-raise to stop the process
-
-        print(f"\nSuccessfully generated {len(embeddings)} embeddings")
-
-        # Verify we have embeddings for all chunks
-        if len(embeddings) != len(points_to_upsert):
-            raise ValueError(f"Number of embeddings ({len(embeddings)}) doesn't match number of chunks ({len(points_to_upsert)})")
-
-        # Upsert points with embeddings
-        print(f"\nUpserting {len(embeddings)} points to Qdrant...")
-        points = []
-        for point, embedding in zip(points_to_upsert, embeddings):
-            points.append(
-                models.PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=embedding,
-                    payload={
-                        "text": point["chunk"],
-                        "metadata": point["metadata"]
-                    }
-                )
+        embedding_cache = open_embedding_cache()
+        try:
+            stats = (
+                Pipeline()
+                .add_stage("read", read_stage)
+                .add_stage("chunk", chunk_stage)
+                .add_stage("embed", embed_stage)
+                .add_stage("upsert", upsert_stage)
+                .run()
             )
+        finally:
+            if embedding_cache is not None:
+                embedding_cache.save()
+                print(embedding_cache.report())
 
-        # Upsert in smaller batches
-        batch_size = 100
-        for i in range(0, len(points), batch_size):
-            batch = points[i:i + batch_size]
-            print(f"Upserting batch {i//batch_size + 1} of {(len(points) + batch_size - 1)//batch_size}")
+        # Remove points for sections that no longer exist; the last delete is the barrier
+        for i in range(0, len(stale_ids), batch_size):
+            batch = stale_ids[i:i + batch_size]
             try:
-                qdrant_client.upsert(
+                qdrant_client.delete(
                     collection_name=config.QDRANT_COLLECTION_NAME,
-                    points=batch,
-                    wait=True
+                    points_selector=models.PointIdsList(points=batch),
+                    wait=i + batch_size >= len(stale_ids)
                 )
-                print(f"Successfully upserted batch {i//batch_size + 1}")
+                print(f"Deleted {len(batch)} stale points")
             except Exception as e:
-                print(f"Error upserting batch {i//batch_size + 1}: {e}")
+                print(f"Error deleting stale points: {e}")
                 raise
-        
+
+        print(
+            f"\nProcessed {counts['chunks']} text chunks: {counts['upserted']} new or changed, "
+            f"{counts['unchanged']} unchanged, {len(stale_ids)} deleted."
+        )
+        report_stage_stats(stats)
+
+        try:
+            bm25_builder.save(config.BM25_INDEX_PATH)
+            print(f"Saved BM25 index for {counts['chunks']} chunks to {config.BM25_INDEX_PATH}")
+        except Exception as e:
+            print(f"Error saving BM25 index: {e}")
+
+        try:
+            reference_builder.save(config.REFERENCE_INDEX_PATH)
+            print(f"Saved reference index with {len(reference_builder.keys)} keys to {config.REFERENCE_INDEX_PATH}")
+        except Exception as e:
+            print(f"Error saving reference index: {e}")
+
+        # The final upsert/delete waited for Qdrant, so the export sees this run's points
+        if config.RETRIEVAL_BACKEND == "local":
+            try:
+                exported = export_local_index(qdrant_client)
+                print(f"Exported {exported} points to local index {config.LOCAL_INDEX_DIR}")
+            except Exception as e:
+                print(f"Error exporting local index: {e}")
+
+        # Let query-side caches know the collection contents changed
+        if counts["upserted"] or stale_ids:
+            bump_ingest_version()
+
         # Verify points were added
         try:
             collection_info = qdrant_client.get_collection(config.QDRANT_COLLECTION_NAME)
@@ -233,15 +416,15 @@ def create_qdrant_collection():
         
         if config.QDRANT_COLLECTION_NAME in collection_names:
             print(f"Collection '{config.QDRANT_COLLECTION_NAME}' already exists")
+            ensure_payload_indexes(client)
+            ensure_quantization(client)
             return client
         
         # Create collection with proper configuration
         client.create_collection(
             collection_name=config.QDRANT_COLLECTION_NAME,
-            vectors_config=models.VectorParams(
-                size=768,  # Gemini embedding size
-                distance=models.Distance.COSINE
-            )
+            vectors_config=vector_params(),  # Gemini embedding size
+            quantization_config=qdrant_quantization_config()
         )
         
         # Verify collection was created
@@ -249,7 +432,8 @@ def create_qdrant_collection():
         collection_names = [collection.name for collection in collections]
         if config.QDRANT_COLLECTION_NAME not in collection_names:
             raise Exception(f"Failed to create collection '{config.QDRANT_COLLECTION_NAME}'")
-            
+
+        ensure_payload_indexes(client)
         print(f"Successfully created collection '{config.QDRANT_COLLECTION_NAME}'")
         return client
         
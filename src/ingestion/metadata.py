@@ -0,0 +1,76 @@
+import calendar
+import re
+from datetime import datetime
+
+# RBI department codes as they appear in reference numbers, and the names used in the data
+DEPARTMENTS = {
+    "DOR": "Department of Regulation",
+    "DOS": "Department of Supervision",
+    "FED": "Foreign Exchange Department",
+    "FIDD": "Financial Inclusion and Development Department",
+    "FMRD": "Financial Markets Regulation Department",
+    "DPSS": "Department of Payment and Settlement Systems",
+    "DGBA": "Department of Government and Bank Accounts",
+    "DCM": "Department of Currency Management",
+    "CEPD": "Consumer Education and Protection Department",
+    "IDMD": "Internal Debt Management Department",
+    "FMOD": "Financial Markets Operations Department",
+}
+
+# Audience keywords and the "Meant For" phrasings that imply them
+AUDIENCES = {
+    "all_banks": r"\ball (?:the )?banks\b|commercial and co-?\s?operative banks",
+    "commercial_banks": r"commercial banks?|\bscbs?\b",
+    "cooperative_banks": r"co-?\s?operative banks?|\bucbs?\b|\bdccbs?\b|\bstcbs?\b",
+    "regional_rural_banks": r"regional rural banks|\brrbs?\b",
+    "small_finance_banks": r"small finance banks|\bsfbs?\b",
+    "payments_banks": r"payments? banks",
+    "local_area_banks": r"local area banks",
+    "nbfcs": r"non-banking financial|\bnbfcs?\b|housing finance compan",
+    "all_india_financial_institutions": r"financial institutions|\bnabard\b|\bnhb\b|\bexim\b|\bsidbi\b|\baifis?\b",
+    "authorised_dealers": r"authori[sz]ed dealer|\bad category|\bad banks?\b",
+    "authorised_persons": r"authori[sz]ed persons",
+    "payment_system_operators": r"payment system|prepaid payment|\bnpci\b|\brtgs\b|\bneft\b|\bpsos?\b",
+    "agency_banks": r"agency banks",
+    "lead_banks": r"lead banks|\bslbcs?\b|\butlbcs?\b",
+    "currency_chests": r"currency chest",
+    "regulated_entities": r"regulated entities|\bres\b",
+    "asset_reconstruction_companies": r"asset reconstruction|\barcs?\b",
+    "credit_information_companies": r"credit information compan|\bcics?\b",
+    "market_participants": r"market participants|participants in government securities|central counterpart",
+}
+_AUDIENCE_PATTERNS = {name: re.compile(pattern, re.IGNORECASE) for name, pattern in AUDIENCES.items()}
+# "(excluding RRBs)" names who a circular is *not* meant for
+_EXCLUSION = re.compile(r"\(?\s*excluding[^)]*\)?", re.IGNORECASE)
+
+
+def parse_issue_date(text):
+    """"31.12.2024" (also "-" or "/" separated) -> Unix epoch seconds at UTC midnight, or None."""
+    match = re.fullmatch(r"\s*(\d{1,2})[./\-](\d{1,2})[./\-](\d{4})\s*", text or "")
+    if not match:
+        return None
+    day, month, year = (int(part) for part in match.groups())
+    try:
+        return calendar.timegm(datetime(year, month, day).timetuple())
+    except ValueError:
+        return None
+
+
+def normalize_department(text):
+    """Full department name for a name or code ("FED", "Foreign Exchange Department"), or None."""
+    text = (text or "").strip()
+    if not text:
+        return None
+    code = DEPARTMENTS.get(text.upper())
+    if code:
+        return code
+    for name in DEPARTMENTS.values():
+        if name.lower() == text.lower():
+            return name
+    return text
+
+
+def audience_keywords(text):
+    """Sorted audience keywords for a "Meant For" line (or any phrase naming regulated entities)."""
+    text = _EXCLUSION.sub(" ", text or "")
+    return sorted(name for name, pattern in _AUDIENCE_PATTERNS.items() if pattern.search(text))
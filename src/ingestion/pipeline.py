@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+from src.utils import config
+
+_DONE = object()
+_POLL_INTERVAL = 0.1
+
+
+class _PipelineStopped(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+
+class StageStats:
+    """Per-stage counters: items produced and time spent blocked on queues."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.blocked = 0.0
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def busy(self):
+        """Wall time minus time spent waiting on neighbouring stages."""
+        return max(self.elapsed - self.blocked, 0.0)
+
+    def report(self):
+        rate = self.items / self.busy if self.busy > 0 else 0.0
+        return (
+            f"{self.name:<8} {self.items:>7} items  busy {self.busy:7.2f}s  "
+            f"blocked {self.blocked:7.2f}s  {rate:9.1f} items/s"
+        )
+
+
+class Pipeline:
+    """
+    Runs a chain of generator stages concurrently.
+
+    Each stage is a function that takes the previous stage's output as an
+    iterable (the first stage takes no arguments) and returns an iterable.
+    Stages are connected by bounded queues, so a slow stage applies
+    backpressure instead of letting work pile up in memory. The last stage
+    runs in the calling thread; the others each get a worker thread.
+    """
+
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or config.PIPELINE_QUEUE_SIZE
+        self._stages = []
+
+    def add_stage(self, name, func):
+        self._stages.append((name, func))
+        return self
+
+    def run(self):
+        """Runs every stage to completion and returns their StageStats."""
+        stop = threading.Event()
+        errors = []
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self._stages[1:]]
+        stats = [StageStats(name) for name, _ in self._stages]
+
+        workers = []
+        for i, (name, func) in enumerate(self._stages[:-1]):
+            in_queue = queues[i - 1] if i > 0 else None
+            worker = threading.Thread(
+                target=self._run_stage,
+                args=(func, in_queue, queues[i], stats[i], stop, errors),
+                name=f"pipeline-{name}",
+                daemon=True
+            )
+            workers.append(worker)
+            worker.start()
+
+        _, last_func = self._stages[-1]
+        last_input = queues[-1] if queues else None
+        self._run_stage(last_func, last_input, None, stats[-1], stop, errors)
+
+        for worker in workers:
+            worker.join()
+        if errors:
+            raise errors[0]
+        return stats
+
+    def _run_stage(self, func, in_queue, out_queue, stats, stop, errors):
+        stats.started = time.perf_counter()
+        try:
+            output = func(self._drain(in_queue, stats, stop)) if in_queue is not None else func()
+            for item in output:
+                stats.items += 1
+                if out_queue is not None:
+                    self._put(out_queue, item, stats, stop)
+        except _PipelineStopped:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            stats.finished = time.perf_counter()
+            if out_queue is not None:
+                try:
+                    self._put(out_queue, _DONE, stats, stop)
+                except _PipelineStopped:
+                    pass
+
+    @staticmethod
+    def _put(out_queue, item, stats, stop):
+        started = time.perf_counter()
+        try:
+            while True:
+                if stop.is_set():
+                    raise _PipelineStopped()
+                try:
+                    out_queue.put(item, timeout=_POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    continue
+        finally:
+            stats.blocked += time.perf_counter() - started
+
+    @staticmethod
+    def _drain(in_queue, stats, stop):
+        while True:
+            started = time.perf_counter()
+            try:
+                while True:
+                    if stop.is_set():
+                        raise _PipelineStopped()
+                    try:
+                        item = in_queue.get(timeout=_POLL_INTERVAL)
+                        break
+                    except queue.Empty:
+                        continue
+            finally:
+                stats.blocked += time.perf_counter() - started
+            if item is _DONE:
+                return
+            yield item
+
+
+def report_stage_stats(stats):
+    """Prints per-stage throughput and names the slowest stage."""
+    print("\nStage throughput:")
+    for stage in stats:
+        print(f"  {stage.report()}")
+    bottleneck = max(stats, key=lambda stage: stage.busy)
+    print(f"Bottleneck: {bottleneck.name} ({bottleneck.busy:.2f}s busy)")
@@ -0,0 +1,106 @@
+import json
+import re
+from src.ingestion.chunking import chunk_circular
+
+try:
+    import ijson
+except ImportError:  # Optional: the built-in incremental decoder below is used instead
+    ijson = None
+
+READ_SIZE = 1 << 16
+_WHITESPACE = re.compile(r"\s*")
+
+
+class _StreamDecoder:
+    """Minimal incremental JSON tokenizer over a text file, built on raw_decode."""
+
+    def __init__(self, f, read_size=READ_SIZE):
+        self.f = f
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        data = self.f.read(self.read_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Malformed JSON: expected '{char}', found '{found or 'EOF'}'")
+        self.pos += 1
+
+    def value(self):
+        """Decodes the next complete JSON value, reading more input as needed."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may continue in the next read
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_circulars(path):
+    """
+    Yields circulars one at a time from the top-level "circulars" array,
+    without loading the whole file into memory.
+    """
+    if ijson is not None:
+        with open(path, "rb") as f:
+            yield from ijson.items(f, "circulars.item", use_float=True)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _StreamDecoder(f)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if key == "circulars":
+                stream.expect("[")
+                if stream.peek() == "]":
+                    stream.pos += 1
+                else:
+                    while True:
+                        yield stream.value()
+                        if stream.peek() == ",":
+                            stream.pos += 1
+                            continue
+                        stream.expect("]")
+                        break
+            else:
+                stream.value()  # Skip "title", "headers", ...
+
+            if stream.peek() == ",":
+                stream.pos += 1
+                continue
+            stream.expect("}")
+            return
+
+
+def iter_chunks(circulars, **chunk_options):
+    """Turns a stream of circulars into a stream of chunks with metadata."""
+    for circular in circulars:
+        yield from chunk_circular(circular, **chunk_options)
@@ -0,0 +1,113 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from src.utils import config
+from src.utils.ingest_version import read_ingest_version
+
+
+class SemanticAnswerCache:
+    """
+    Remembers recent answers and serves them again for paraphrased questions.
+
+    A stored answer is reused when the new query's embedding has cosine
+    similarity of at least `threshold` with the stored query and retrieval
+    returned exactly the same set of points. Entries are evicted in LRU
+    order and dropped entirely when an ingestion run changes the collection.
+    """
+
+    def __init__(self, max_entries=None, threshold=None):
+        self.max_entries = max_entries or config.ANSWER_CACHE_MAX_ENTRIES
+        self.threshold = threshold or config.ANSWER_CACHE_SIMILARITY
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._entries = OrderedDict()  # entry id -> (unit vector, source ids, response, sources)
+        self._matrix = None            # Stacked unit vectors, rebuilt lazily after changes
+        self._matrix_keys = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._version_mtime = None
+        self._version = None
+        self._check_version()
+
+    def _check_version(self):
+        """Clears the cache if the ingestion version marker changed since the last look."""
+        try:
+            mtime = os.stat(config.INGEST_VERSION_PATH).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._version_mtime:
+            return
+        self._version_mtime = mtime
+        version = read_ingest_version()
+        if self._version is not None and version != self._version:
+            self._clear()
+            self.invalidations += 1
+        self._version = version
+
+    def _clear(self):
+        self._entries.clear()
+        self._matrix = None
+        self._matrix_keys = []
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query_embedding, source_ids):
+        """Returns (response, sources) for a near-duplicate question, or None."""
+        source_ids = frozenset(source_ids)
+        with self._lock:
+            self._check_version()
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries)
+                self._matrix = np.stack([self._entries[key][0] for key in self._matrix_keys])
+
+            scores = self._matrix @ self._unit(query_embedding)
+            for index in np.argsort(-scores):
+                if scores[index] < self.threshold:
+                    break
+                key = self._matrix_keys[index]
+                _, stored_ids, response, sources = self._entries[key]
+                if stored_ids == source_ids:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return response, sources
+
+            self.misses += 1
+            return None
+
+    def store(self, query_embedding, source_ids, response, sources):
+        with self._lock:
+            self._check_version()
+            self._entries[self._next_id] = (self._unit(query_embedding), frozenset(source_ids), response, sources)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self):
+        """Drops every stored answer, e.g. right after re-ingesting in this process."""
+        with self._lock:
+            self._clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "invalidations": self.invalidations
+            }
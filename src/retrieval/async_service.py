@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+from qdrant_client import AsyncQdrantClient
+from src.utils import config
+from src.ingestion.embedding import embed_batch
+from src.retrieval import rag
+
+
+class EmbeddingMicroBatcher:
+    """
+    Coalesces query embeddings from concurrent callers.
+
+    Queries arriving within `window_ms` of each other (up to `max_batch`)
+    are embedded with a single batch call. Calls toward Gemini are limited
+    by the shared `semaphore`.
+    """
+
+    def __init__(self, semaphore, window_ms=None, max_batch=None):
+        self.semaphore = semaphore
+        self.window = (window_ms if window_ms is not None else config.QUERY_BATCH_WINDOW_MS) / 1000
+        self.max_batch = max_batch or config.QUERY_BATCH_MAX_SIZE
+        self.batches = 0
+        self.queries = 0
+        self._pending = []  # (query, future)
+        self._flush_handle = None
+        self._tasks = set()  # running batches; the loop only keeps weak references to tasks
+
+    async def embed(self, query):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        texts = [query for query, _ in batch]
+        self.batches += 1
+        self.queries += len(texts)
+        try:
+            async with self.semaphore:
+                embeddings = await asyncio.to_thread(embed_batch, texts, "retrieval_query")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+
+class AsyncQueryEngine:
+    """
+    asyncio counterpart of query_rag for the UI or an HTTP front end.
+
+    Uses the async Qdrant client, micro-batches query embeddings across
+    concurrent requests and caps the number of in-flight Gemini calls
+    (embedding and generation together) at GEMINI_MAX_CONCURRENCY. The
+    query embedding and answer caches are shared with the sync path.
+    """
+
+    def __init__(self, max_concurrency=None, batch_window_ms=None, max_batch_size=None):
+        self.qdrant_client = AsyncQdrantClient(
+            host=config.QDRANT_HOST,
+            port=config.QDRANT_PORT,
+            api_key=config.QDRANT_API_KEY
+        )
+        self.gemini_semaphore = asyncio.Semaphore(max_concurrency or config.GEMINI_MAX_CONCURRENCY)
+        self.batcher = EmbeddingMicroBatcher(self.gemini_semaphore, batch_window_ms, max_batch_size)
+
+    async def embed_query(self, query):
+        # The cache takes a lock shared with sync callers and may touch its disk store
+        embedding = await asyncio.to_thread(rag.query_embedding_cache.get, query)
+        if embedding is None:
+            embedding = await self.batcher.embed(query)
+            await asyncio.to_thread(rag.query_embedding_cache.put, query, embedding)
+        return embedding
+
+    async def fetch_points(self, point_ids, query_filter=None, with_payload=True):
+        """Async version of rag.fetch_points."""
+        if not point_ids:
+            return []
+        if rag.get_local_index() is not None:
+            return rag.fetch_points(point_ids, query_filter, with_payload)
+        method, request = rag.points_request(point_ids, query_filter, with_payload)
+        if method == "retrieve":
+            records = await self.qdrant_client.retrieve(**request)
+        else:
+            records, _ = await self.qdrant_client.scroll(**request)
+        return rag.order_points(records, point_ids)
+
+    async def dense_search(self, query_embedding, limit, query_filter=None):
+        """Async version of rag.dense_search."""
+        if rag.get_local_index() is not None:
+            # Sub-millisecond and CPU-bound: no point leaving the event loop
+            return rag.dense_search(query_embedding, limit, query_filter)
+        return await self.qdrant_client.search(**rag.dense_search_request(query_embedding, limit, query_filter))
+
+    async def search_points(self, query, query_filter=None):
+        """Async version of rag.search_points, with the same steps: returns (query_embedding, hits)."""
+        named_points = await self.fetch_points(rag.reference_point_ids(query), query_filter)
+        if named_points:
+            return None, named_points
+
+        lexical_hits, exact = rag.lexical_search(query)
+        if query_filter is not None and lexical_hits:
+            lexical_hits = rag.restrict_lexical_hits(
+                lexical_hits, await self.fetch_points([hit[0] for hit in lexical_hits], query_filter, with_payload=False)
+            )
+        if exact and lexical_hits:
+            return None, await self.fetch_points(rag.exact_match_ids(lexical_hits))
+
+        query_embedding = await self.embed_query(query)
+        dense_results = await self.dense_search(query_embedding, rag.dense_limit(lexical_hits), query_filter)
+        if not lexical_hits:
+            return query_embedding, dense_results
+
+        fused = rag.fuse_ids(dense_results, lexical_hits)
+        fetched = await self.fetch_points(rag.missing_fused_ids(fused, dense_results))
+        return query_embedding, rag.fused_hits(fused, dense_results, fetched)
+
+    async def query(self, query: str, filters=None) -> tuple[str, str]:
+        """Same contract as query_rag: returns (response, formatted_sources)."""
+        started = time.perf_counter()
+        _, query_filter = rag.resolve_filters(query, filters)
+        query_embedding, search_results = await self.search_points(query, query_filter)
+        # Usually a cache hit; a miss is one Neo4j query, kept off the event loop
+        expansion = await asyncio.to_thread(rag.graph_expansion_ids, search_results) if rag.graph_expander is not None else {}
+        if expansion:
+            points = await self.fetch_points([point_id for point_ids in expansion.values() for point_id in point_ids], query_filter)
+            search_results = rag.attach_expansion(search_results, expansion, points)
+        source_ids, context, sources = rag.build_context(search_results)
+
+        if rag.answer_cache is not None and query_embedding is not None:
+            cached = rag.answer_cache.lookup(query_embedding, source_ids)
+            if cached is not None:
+                rag.record_latency("total", time.perf_counter() - started)
+                return cached
+
+        prompt = rag.build_prompt(context, query)
+        rag.log_prompt_tokens(prompt)
+        async with self.gemini_semaphore:
+            formatted_response = await rag.generator.generate_async(prompt)
+
+        formatted_sources = rag.format_sources(sources)
+        if rag.answer_cache is not None and query_embedding is not None:
+            rag.answer_cache.store(query_embedding, source_ids, formatted_response, formatted_sources)
+        rag.record_latency("total", time.perf_counter() - started)
+        return formatted_response, formatted_sources
+
+    def stats(self):
+        batches = self.batcher.batches
+        return {
+            "embedding_batches": batches,
+            "embedded_queries": self.batcher.queries,
+            "mean_batch_size": self.batcher.queries / batches if batches else 0.0
+        }
+
+    async def close(self):
+        await self.qdrant_client.close()
+
+
+class BackgroundQueryEngine:
+    """
+    Runs one AsyncQueryEngine on a dedicated event loop thread, so synchronous
+    callers (e.g. Streamlit session threads) share it and their queries get
+    batched together.
+    """
+
+    def __init__(self, **engine_options):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-query-engine", daemon=True)
+        self._thread.start()
+        self.engine = self._call(self._create_engine(engine_options))
+
+    @staticmethod
+    async def _create_engine(engine_options):
+        return AsyncQueryEngine(**engine_options)
+
+    def _call(self, coroutine, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(timeout)
+
+    def query(self, query: str, filters=None, timeout=None) -> tuple[str, str]:
+        return self._call(self.engine.query(query, filters), timeout)
+
+    def close(self):
+        self._call(self.engine.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
@@ -0,0 +1,195 @@
+import math
+import os
+import re
+from array import array
+from collections import Counter, defaultdict
+import numpy as np
+from src.utils import config
+
+# Keeps identifiers such as "dor.str.rec.54/21.04.048/2024-25" or "35a" intact
+_TOKEN = re.compile(r"[a-z0-9]+(?:[./\-][a-z0-9]+)*")
+_PARTS = re.compile(r"[./\-]")
+# "2024-2025" and "2024-25" name the same financial year
+_LONG_YEAR_RANGE = re.compile(r"\b(\d{4})-\d{2}(\d{2})\b")
+# An RBI number glued to the department reference, as in "RBI/2024-2025/100DOR.STR.REC.54"
+_GLUED_RBI_NUMBER = re.compile(r"\b(rbi/\d{4}-\d{2}/\d+)(?=[a-z])")
+
+
+def tokenize(text):
+    """
+    Lowercased word tokens. Compound identifiers are emitted whole, per
+    "/"-separated segment and as their individual parts, so both exact
+    reference numbers and their pieces can match. Bare numbers inside an
+    identifier are dropped: a serial like the "99" in "RBI/2024-25/99" would
+    otherwise match every "99" in running text.
+    """
+    tokens = []
+    text = _GLUED_RBI_NUMBER.sub(r"\1 ", _LONG_YEAR_RANGE.sub(r"\1-\2", text.lower()))
+    for token in _TOKEN.findall(text):
+        tokens.append(token)
+        pieces = token.split("/") if "/" in token else []
+        if _PARTS.search(token):
+            pieces.extend(_PARTS.split(token))
+        tokens.extend(piece for piece in pieces if piece and not piece.isdigit())
+    return tokens
+
+
+def identifier_query(text):
+    """
+    Only the identifier-like tokens of `text` (e.g. "RBI/2024-25/99",
+    "DOR.STR.REC.54"), joined back into a query; empty if there are none.
+    Scoring these alone keeps question words from diluting an exact match.
+    """
+    text = _LONG_YEAR_RANGE.sub(r"\1-\2", text.lower())
+    return " ".join(token for token in _TOKEN.findall(text) if _PARTS.search(token))
+
+
+class BM25IndexBuilder:
+    """
+    Accumulates postings for chunks as they stream past during ingestion.
+    Postings are kept per term in typed arrays (4-byte doc, 2-byte tf)
+    rather than lists of tuples, so a corpus costs about 6 bytes per
+    posting until save() lays them out flat.
+    """
+
+    def __init__(self):
+        self.point_ids = []
+        self.doc_lengths = array("I")
+        self._groups = array("I")  # doc -> index into _group_index
+        self._group_index = {}
+        self._doc_postings = defaultdict(lambda: array("I"))  # term -> docs
+        self._tf_postings = defaultdict(lambda: array("H"))  # term -> tfs, same order
+
+    def add(self, point_id, text, group):
+        """`group` is the circular the chunk belongs to, used to judge lexical confidence."""
+        doc = len(self.point_ids)
+        counts = Counter(tokenize(text))
+        self.point_ids.append(point_id)
+        self._groups.append(self._group_index.setdefault(group, len(self._group_index)))
+        self.doc_lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            self._doc_postings[term].append(doc)
+            self._tf_postings[term].append(min(tf, 65535))
+
+    def save(self, path):
+        """Writes the index as flat numpy arrays (CSR-style postings) to a single .npz file."""
+        terms = sorted(self._doc_postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(self._doc_postings[term]) for term in terms], out=offsets[1:])
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            doc_ids[offsets[i]:offsets[i + 1]] = self._doc_postings[term]
+            tfs[offsets[i]:offsets[i + 1]] = self._tf_postings[term]
+
+        group_names = sorted(self._group_index)
+        renumber = np.empty(len(group_names), dtype=np.int32)
+        for i, name in enumerate(group_names):
+            renumber[self._group_index[name]] = i
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            terms=np.array(terms, dtype=str),
+            offsets=offsets,
+            doc_ids=doc_ids,
+            tfs=tfs,
+            doc_lengths=np.array(self.doc_lengths, dtype=np.int32),
+            point_ids=np.array(self.point_ids, dtype=str),
+            groups=renumber[np.array(self._groups, dtype=np.int64)],
+            group_names=np.array(group_names, dtype=str)
+        )
+        os.replace(tmp_path, path)
+
+
+class BM25Index:
+    """Read-only BM25 index loaded from the .npz written by BM25IndexBuilder."""
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        with np.load(path, allow_pickle=False) as data:
+            self._terms = {term: i for i, term in enumerate(data["terms"].tolist())}
+            self._offsets = data["offsets"]
+            self._doc_ids = data["doc_ids"]
+            self._tfs = data["tfs"].astype(np.float32)
+            self._doc_lengths = data["doc_lengths"].astype(np.float32)
+            self.point_ids = data["point_ids"].tolist()
+            self.groups = data["groups"]
+            self.group_names = data["group_names"].tolist()
+
+        self.doc_count = len(self.point_ids)
+        average_length = float(self._doc_lengths.mean()) if self.doc_count else 1.0
+        self._length_norm = self.k1 * (1 - self.b + self.b * self._doc_lengths / average_length)
+
+    def search(self, query, limit):
+        """Returns up to `limit` (point_id, score, group_name) tuples, best first."""
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term, query_tf in Counter(tokenize(query)).items():
+            index = self._terms.get(term)
+            if index is None:
+                continue
+            start, end = self._offsets[index], self._offsets[index + 1]
+            docs = self._doc_ids[start:end]
+            tfs = self._tfs[start:end]
+            idf = math.log(1 + (self.doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += query_tf * idf * tfs * (self.k1 + 1) / (tfs + self._length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        ranked = matched[np.argsort(-scores[matched])]
+        return [
+            (self.point_ids[doc], float(scores[doc]), self.group_names[self.groups[doc]])
+            for doc in ranked
+        ]
+
+
+def is_strong_lexical_match(hits, min_score=None, min_margin=None):
+    """
+    True when the best lexical hit clearly identifies one circular: its score
+    is high and beats the best hit from any other circular by `min_margin`x.
+    """
+    min_score = config.BM25_STRONG_SCORE if min_score is None else min_score
+    min_margin = config.BM25_STRONG_MARGIN if min_margin is None else min_margin
+    if not hits or hits[0][1] < min_score:
+        return False
+    best_group = hits[0][2]
+    runner_up = next((score for _, score, group in hits if group != best_group), 0.0)
+    return runner_up == 0.0 or hits[0][1] / runner_up >= min_margin
+
+
+def reciprocal_rank_fusion(*rankings, k=None, limit=None):
+    """Fuses ranked lists of point IDs; returns IDs ordered by summed 1 / (k + rank)."""
+    k = config.RRF_K if k is None else k
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, point_id in enumerate(ranking, 1):
+            scores[point_id] += 1.0 / (k + rank)
+    fused = sorted(scores, key=scores.get, reverse=True)
+    return fused[:limit] if limit else fused
+
+
+class BM25IndexHandle:
+    """Loads the on-disk index lazily and reloads it when ingestion rewrites the file."""
+
+    def __init__(self, path=None):
+        self.path = path or config.BM25_INDEX_PATH
+        self._index = None
+        self._mtime = None
+
+    def get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            try:
+                self._index = BM25Index(self.path)
+                self._mtime = mtime
+            except Exception as e:
+                print(f"Error loading BM25 index from {self.path}: {e}")
+                return self._index
+        return self._index
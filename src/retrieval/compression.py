@@ -0,0 +1,153 @@
+"""
+Compressed vector representations for a fast first search pass.
+
+Modes (VECTOR_COMPRESSION):
+    none      full float32 vectors only
+    int8      scalar quantization, 4x smaller
+    binary    one sign bit per dimension, 32x smaller
+    pca       projection onto the top VECTOR_REDUCED_DIM principal components
+    truncate  the first VECTOR_REDUCED_DIM dimensions
+
+Candidates found on the compressed vectors (RESCORE_OVERSAMPLING times
+the requested limit) are rescored against the full vectors. int8 and
+binary map onto Qdrant's own quantization; pca and truncate apply to the
+local index only.
+"""
+import math
+import numpy as np
+from qdrant_client import models
+from src.utils import config
+
+COMPRESSION_MODES = ("none", "int8", "binary", "pca", "truncate")
+
+# Set bits per byte value, for Hamming distances over packed bits
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class Int8Compressor:
+    """Symmetric scalar quantization to int8, clipped at the `quantile` of absolute values."""
+
+    def __init__(self, quantile=0.99):
+        self.quantile = quantile
+        self.scale = 1.0
+
+    def fit(self, vectors):
+        self.scale = float(np.quantile(np.abs(vectors), self.quantile)) / 127 or 1.0
+        return self
+
+    def encode(self, vectors):
+        return np.clip(np.rint(np.asarray(vectors) / self.scale), -127, 127).astype(np.int8)
+
+    def scores(self, codes, query, block_rows=8192):
+        query_codes = self.encode(query).astype(np.float32)
+        # NumPy has no fast integer matmul; widening a block at a time to float32
+        # is exact here (|sum| <= dim * 127^2 < 2^24) and keeps temporaries small
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), block_rows):
+            scores[start:start + block_rows] = codes[start:start + block_rows].astype(np.float32) @ query_codes
+        # Codes of unit vectors scaled back: dot products approximate cosine similarity
+        return scores * (self.scale * self.scale)
+
+
+class BinaryCompressor:
+    """Sign bits, packed eight to a byte; scored by Hamming distance."""
+
+    def fit(self, vectors):
+        self.dim = vectors.shape[1]
+        return self
+
+    def encode(self, vectors):
+        return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+    def scores(self, codes, query):
+        hamming = _POPCOUNT[np.bitwise_xor(codes, self.encode(query))].sum(axis=1, dtype=np.int32)
+        # The angle between two vectors is about pi * (differing sign bits / dim)
+        return np.cos(np.pi * hamming / self.dim)
+
+
+class PCACompressor:
+    """Projection onto the leading principal components, renormalized."""
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def fit(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.mean = vectors.mean(axis=0)
+        _, _, components = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        self.components = components[:self.dim].astype(np.float32)
+        return self
+
+    def encode(self, vectors):
+        return _normalize((np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T).astype(np.float32)
+
+    def scores(self, codes, query):
+        return codes @ self.encode(query)
+
+
+class TruncateCompressor:
+    """The first `dim` dimensions, renormalized."""
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def fit(self, vectors):
+        return self
+
+    def encode(self, vectors):
+        return _normalize(np.asarray(vectors, dtype=np.float32)[..., :self.dim]).astype(np.float32)
+
+    def scores(self, codes, query):
+        return codes @ self.encode(query)
+
+
+def make_compressor(mode=None, reduced_dim=None):
+    """Compressor for `mode` (default VECTOR_COMPRESSION), or None for "none"."""
+    mode = mode or config.VECTOR_COMPRESSION
+    reduced_dim = reduced_dim or config.VECTOR_REDUCED_DIM
+    if mode not in COMPRESSION_MODES:
+        raise ValueError(f"Unknown vector compression {mode!r}; expected one of {COMPRESSION_MODES}")
+    if mode == "int8":
+        return Int8Compressor()
+    if mode == "binary":
+        return BinaryCompressor()
+    if mode == "pca":
+        return PCACompressor(reduced_dim)
+    if mode == "truncate":
+        return TruncateCompressor(reduced_dim)
+    return None
+
+
+def candidate_count(limit, oversampling=None):
+    """Candidates to take from the compressed pass before rescoring down to `limit`."""
+    oversampling = config.RESCORE_OVERSAMPLING if oversampling is None else oversampling
+    return max(limit, math.ceil(limit * oversampling))
+
+
+def qdrant_quantization_config(mode=None):
+    """Qdrant quantization for `mode`, or None when Qdrant should keep plain vectors."""
+    mode = mode or config.VECTOR_COMPRESSION
+    if mode == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if mode == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def qdrant_search_params(mode=None):
+    """Search params that rescore quantized candidates with the original vectors, or None."""
+    if qdrant_quantization_config(mode) is None:
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            rescore=config.RESCORE_ENABLED,
+            oversampling=config.RESCORE_OVERSAMPLING
+        )
+    )
@@ -0,0 +1,107 @@
+import math
+import re
+from src.utils import config
+from src.ingestion.chunking import split_chunk_header
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def estimate_tokens(text):
+    """Rough Gemini token count: about four characters per token for English prose."""
+    return math.ceil(len(text) / 4)
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def select_mmr(bodies, limit, mmr_lambda=None):
+    """
+    Maximal marginal relevance over candidates given best first: repeatedly
+    picks the candidate maximising
+        lambda * relevance - (1 - lambda) * max similarity to those already picked.
+    Relevance comes from the retrieval rank (hybrid results have no common
+    score scale); similarity is word-set Jaccard overlap of the chunk bodies,
+    which is what near-duplicate sections share. Returns indices in pick order.
+    """
+    mmr_lambda = config.MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    words = [set(_WORD.findall(body.lower())) for body in bodies]
+    relevance = [1.0 - rank / len(bodies) for rank in range(len(bodies))]
+    redundancy = [0.0] * len(bodies)
+    remaining = list(range(len(bodies)))
+    selected = []
+    while remaining and len(selected) < limit:
+        best = max(remaining, key=lambda i: mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy[i])
+        selected.append(best)
+        remaining.remove(best)
+        for i in remaining:
+            redundancy[i] = max(redundancy[i], _jaccard(words[i], words[best]))
+    return selected
+
+
+def _truncate(text, max_chars):
+    """Cuts at the last paragraph or sentence break (else whitespace) before `max_chars`."""
+    if len(text) <= max_chars:
+        return text
+    cut = max(text.rfind("\n", 0, max_chars), text.rfind(". ", 0, max_chars) + 1)
+    if cut < max_chars // 2:
+        cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > 0 else max_chars].rstrip() + " […]"
+
+
+def _circular_header(circular_number, metadata):
+    return f"=== Circular {circular_number} | {metadata.get('subject', '')} | Issued {metadata.get('date_of_issue', 'N/A')} ==="
+
+
+def _section_order(result):
+    metadata = result.payload.get('metadata', {})
+    return (metadata.get('section_indices') or [0])[0], metadata.get('part', 0)
+
+
+def assemble_context(search_results, limit=None, token_budget=None):
+    """
+    Picks up to `limit` diverse hits (MMR) and packs them under `token_budget`
+    estimated tokens, grouped by circular so each circular's header appears
+    once; within a circular, sections keep document order. A hit that does
+    not fit is skipped, except the first, which is truncated to fit.
+    Returns (selected_results, context, stats).
+    """
+    limit = config.RETRIEVAL_LIMIT if limit is None else limit
+    token_budget = config.CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+
+    parsed = [split_chunk_header(result.payload['text']) for result in search_results]
+    order = select_mmr([content for _, content in parsed], limit)
+
+    budget_chars = token_budget * 4
+    packed = {}  # circular number -> [(result, body)], in first-pick order
+    used_chars = 0
+    for i in order:
+        result = search_results[i]
+        section_title, content = parsed[i]
+        metadata = result.payload['metadata']
+        circular_number = metadata.get('circular_number', "")
+        header_chars = 0 if circular_number in packed else len(_circular_header(circular_number, metadata)) + 2
+        body = f"[Section: {section_title}]\n{content}" if section_title else content
+        if used_chars + header_chars + len(body) > budget_chars:
+            if packed:
+                continue
+            body = _truncate(body, max(budget_chars - header_chars, 200))
+        packed.setdefault(circular_number, []).append((result, body))
+        used_chars += header_chars + len(body)
+
+    selected = []
+    blocks = []
+    for circular_number, entries in packed.items():
+        entries.sort(key=lambda entry: _section_order(entry[0]))
+        header = _circular_header(circular_number, entries[0][0].payload['metadata'])
+        blocks.append(header + "\n\n" + "\n\n".join(body for _, body in entries))
+        selected.extend(result for result, _ in entries)
+
+    context = "\n\n".join(blocks)
+    stats = {
+        "candidates": len(search_results),
+        "chunks": len(selected),
+        "circulars": len(packed),
+        "context_tokens": estimate_tokens(context),
+    }
+    return selected, context, stats
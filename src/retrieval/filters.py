@@ -0,0 +1,179 @@
+import calendar
+import re
+from datetime import datetime
+from qdrant_client import models
+from src.ingestion.metadata import DEPARTMENTS, audience_keywords
+
+# Filters are plain dicts with any of these keys:
+#   date_from, date_to  Unix epoch seconds (inclusive), compared with metadata.issue_date
+#   departments         full department names, matched against metadata.department
+#   audiences           audience keywords, matched against metadata.audience
+
+# Audience keywords a narrower one falls under: a circular for all regulated
+# entities, or for all banks, also applies to commercial banks
+_BANK_AUDIENCES = {
+    "commercial_banks", "cooperative_banks", "regional_rural_banks", "small_finance_banks",
+    "payments_banks", "local_area_banks", "agency_banks", "lead_banks", "currency_chests",
+}
+_ENTITY_AUDIENCES = _BANK_AUDIENCES | {
+    "all_banks", "nbfcs", "all_india_financial_institutions",
+    "asset_reconstruction_companies", "credit_information_companies",
+}
+
+_MONTHS = {name.lower()[:3]: number for number, name in enumerate(calendar.month_name) if name}
+# Financial years ("2024-25", "2024-2025") before bare years, so the year alone doesn't match
+_DATE = (
+    r"(\d{1,2}[./\-]\d{1,2}[./\-]\d{4}|(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?,?\s+\d{4}"
+    r"|(?:19|20)\d{2}-(?:\d{4}|\d{2})(?![\d/])|(?:19|20)\d{2}(?![\d\-]))"
+)
+_BETWEEN = re.compile(rf"\bbetween\s+{_DATE}\s+and\s+{_DATE}", re.IGNORECASE)
+_FROM = re.compile(rf"\b(since|from|after)\s+{_DATE}", re.IGNORECASE)
+_TO = re.compile(rf"\b(before|prior to|until|till|up to)\s+{_DATE}", re.IGNORECASE)
+# Not "dated": "the circular dated 01.04.2024" names a referenced circular, and
+# restricting to that day would drop the later circulars that amend it
+_DURING = re.compile(rf"\b(?:in|during|issued in)\s+(?:fy\s*)?{_DATE}", re.IGNORECASE)
+# Capitalised codes ("FED", "DoR") count as a department on their own, not
+# inside a reference like "DOR.STR.REC.54"; "fed" in running text does not
+_DEPARTMENT_CODE = re.compile(r"(?<![\w./])([A-Z][A-Za-z]{1,3}[A-Z])(?![\w./])")
+_DEPARTMENT_NAME = re.compile("|".join(re.escape(name) for name in DEPARTMENTS.values()), re.IGNORECASE)
+# Only explicit phrasings become an audience filter: a bare "for" is too common
+# ("the timeline for NEFT settlement") to restrict the search on. The phrase
+# ends at the next preposition, so the topic after it ("... on interest
+# rates") can't add audiences of its own
+_AUDIENCE_PHRASE = re.compile(
+    r"\b(?:meant for|applicable to|issued to|addressed to)\s+(?:all\s+)?"
+    r"([^?.,;:]{2,80}?)(?=\s+(?:on|about|regarding|for|in|under|with|to|from|since)\b|[?.,;:]|$)",
+    re.IGNORECASE
+)
+
+
+def _date_bounds(text):
+    """
+    (first second, last second) of the day, month, year or financial year
+    named by `text`. RBI's financial year "2024-25" runs from 1 April 2024
+    to 31 March 2025.
+    """
+    text = text.lower().strip()
+    parts = re.fullmatch(r"(\d{4})-(\d{2}|\d{4})", text)
+    if parts:
+        start_year, end_year = int(parts.group(1)), int(parts.group(2))
+        if end_year % 100 != (start_year + 1) % 100 or (end_year >= 100 and end_year != start_year + 1):
+            raise ValueError(f"Not a financial year: {text}")
+        return (
+            calendar.timegm(datetime(start_year, 4, 1).timetuple()),
+            calendar.timegm(datetime(start_year + 1, 4, 1).timetuple()) - 1
+        )
+    parts = re.fullmatch(r"(\d{1,2})[./\-](\d{1,2})[./\-](\d{4})", text)
+    if parts:
+        day, month, year = (int(part) for part in parts.groups())
+        start = datetime(year, month, day)
+        end = calendar.timegm(start.timetuple()) + 86400 - 1
+        return calendar.timegm(start.timetuple()), end
+    parts = re.fullmatch(r"([a-z]+)\.?,?\s+(\d{4})", text)
+    if parts:
+        month, year = _MONTHS[parts.group(1)[:3]], int(parts.group(2))
+        last_day = calendar.monthrange(year, month)[1]
+        return (
+            calendar.timegm(datetime(year, month, 1).timetuple()),
+            calendar.timegm(datetime(year, month, last_day).timetuple()) + 86400 - 1
+        )
+    year = int(text)
+    return calendar.timegm(datetime(year, 1, 1).timetuple()), calendar.timegm(datetime(year + 1, 1, 1).timetuple()) - 1
+
+
+def parse_filters(query):
+    """
+    Filters implied by the wording of a question, e.g. "since March 2024",
+    "in 2023", "FED circulars", "applicable to NBFCs". Returns a (possibly empty) dict.
+    """
+    filters = {}
+    try:
+        between = _BETWEEN.search(query)
+        if between:
+            filters["date_from"] = _date_bounds(between.group(1))[0]
+            filters["date_to"] = _date_bounds(between.group(2))[1]
+        else:
+            for match in _FROM.finditer(query):
+                start, end = _date_bounds(match.group(2))
+                filters["date_from"] = end + 1 if match.group(1).lower() == "after" else start
+            for match in _TO.finditer(query):
+                start, end = _date_bounds(match.group(2))
+                filters["date_to"] = start - 1 if match.group(1).lower() in ("before", "prior to") else end
+            during = _DURING.search(query)
+            if during and not filters:
+                filters["date_from"], filters["date_to"] = _date_bounds(during.group(1))
+    except (ValueError, KeyError):
+        pass  # Not a real date (e.g. "31.02.2024"); leave the date unfiltered
+
+    departments = [DEPARTMENTS[code.upper()] for code in _DEPARTMENT_CODE.findall(query) if code.upper() in DEPARTMENTS]
+    for name in _DEPARTMENT_NAME.findall(query):
+        departments.extend(full for full in DEPARTMENTS.values() if full.lower() == name.lower())
+    if departments:
+        filters["departments"] = sorted(set(departments))
+
+    audiences = set()
+    for phrase in _AUDIENCE_PHRASE.findall(query):
+        audiences.update(audience_keywords(phrase))
+    if audiences:
+        filters["audiences"] = sorted(audiences)
+    return filters
+
+
+def merge_filters(explicit, parsed):
+    """Explicit (UI) filters win field by field over ones parsed from the question."""
+    merged = {key: value for key, value in (parsed or {}).items() if value not in (None, [], ())}
+    merged.update({key: value for key, value in (explicit or {}).items() if value not in (None, [], ())})
+    return merged
+
+
+def expand_audiences(audiences):
+    """Adds the umbrella audiences ("all_banks", "regulated_entities") that cover the given ones."""
+    expanded = set(audiences)
+    if expanded & _BANK_AUDIENCES:
+        expanded.add("all_banks")
+    if expanded & _ENTITY_AUDIENCES:
+        expanded.add("regulated_entities")
+    return sorted(expanded)
+
+
+def to_qdrant_filter(filters):
+    """A Qdrant Filter on the indexed payload fields, or None when there is nothing to filter on."""
+    if not filters:
+        return None
+    conditions = []
+    if filters.get("date_from") is not None or filters.get("date_to") is not None:
+        conditions.append(models.FieldCondition(
+            key="metadata.issue_date",
+            range=models.Range(gte=filters.get("date_from"), lte=filters.get("date_to"))
+        ))
+    if filters.get("departments"):
+        conditions.append(models.FieldCondition(
+            key="metadata.department",
+            match=models.MatchAny(any=list(filters["departments"]))
+        ))
+    if filters.get("audiences"):
+        conditions.append(models.FieldCondition(
+            key="metadata.audience",
+            match=models.MatchAny(any=expand_audiences(filters["audiences"]))
+        ))
+    return models.Filter(must=conditions) if conditions else None
+
+
+def describe_filters(filters):
+    """Short human-readable summary, e.g. "issued 01.01.2024–31.12.2024 · Foreign Exchange Department"."""
+    parts = []
+    date_from, date_to = filters.get("date_from"), filters.get("date_to")
+    if date_from is not None or date_to is not None:
+        def day(epoch):
+            return datetime.utcfromtimestamp(epoch).strftime("%d.%m.%Y")
+        if date_from is not None and date_to is not None:
+            parts.append(f"issued {day(date_from)}–{day(date_to)}")
+        elif date_from is not None:
+            parts.append(f"issued from {day(date_from)}")
+        else:
+            parts.append(f"issued up to {day(date_to)}")
+    if filters.get("departments"):
+        parts.append(", ".join(filters["departments"]))
+    if filters.get("audiences"):
+        parts.append("for " + ", ".join(audience.replace("_", " ") for audience in filters["audiences"]))
+    return " · ".join(parts)
@@ -0,0 +1,167 @@
+"""
+Graph expansion of retrieval hits: circulars linked to the hits' circulars
+in the Neo4j circular graph (see src.ingestion.graph_ingest), up to
+GRAPH_EXPANSION_HOPS reference edges away in either direction.
+
+A neighbour scores (vector score of the hit it was reached from) x (the
+product of GRAPH_EXPANSION_WEIGHTS along the strongest path), so a
+superseded circular one hop from the top hit outranks something two
+REFERS_TO hops from the fifth. Neighbourhoods of all uncached circulars
+are fetched in one Cypher query and kept in an in-process LRU; a repeat
+question costs no round trip at all.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from neo4j import Query
+from src.utils import config
+from src.utils.clients import current_neo4j_connection
+from src.utils.ingest_version import read_ingest_version
+
+
+class GraphExpander:
+    """
+    Cached neighbourhood lookups, safe to share between threads. When Neo4j
+    can't be reached, expansion is skipped (retrieval goes on without it)
+    and retried after GRAPH_EXPANSION_RETRY_SECONDS. The cache is dropped
+    when an ingestion run changes the data. Hit circulars missing from the
+    graph (it was never loaded, or the last load failed) are counted in
+    stats()["missing"], with a warning printed the first time.
+    """
+
+    def __init__(self, driver=None, cache_size=None, hops=None, weights=None):
+        self.cache_size = cache_size or config.GRAPH_NEIGHBORHOOD_CACHE_SIZE
+        self.hops = hops or config.GRAPH_EXPANSION_HOPS
+        self.weights = weights or config.GRAPH_EXPANSION_WEIGHTS
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+        self.missing = 0  # Looked-up circulars that had no node in the graph
+        self._warned_missing = False
+        self._driver = driver
+        self._neighborhoods = OrderedDict()  # circular number -> [(neighbour, weight, hops)], least recently used first
+        self._lock = threading.Lock()
+        self._unavailable_until = 0.0
+        self._version_mtime = None
+        self._version = None
+
+    def _get_driver(self):
+        # The process-wide connection unless a driver was given (benchmarks). Never waits
+        # for a connect on the query path: until one is open, expansion backs off like any error
+        if self._driver is not None:
+            return self._driver
+        connection = current_neo4j_connection()
+        if connection is None:
+            raise RuntimeError("Neo4j is not connected yet")
+        return connection.driver
+
+    def _check_version(self):
+        """Clears the cache if the ingestion version marker changed since the last look."""
+        try:
+            mtime = os.stat(config.INGEST_VERSION_PATH).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._version_mtime:
+            return
+        self._version_mtime = mtime
+        version = read_ingest_version()
+        if self._version is not None and version != self._version:
+            self._neighborhoods.clear()
+        self._version = version
+
+    def _fetch(self, circular_numbers):
+        """{number: [(neighbour, weight, hops)]} for every number, best first, in one query."""
+        # Path length can't be a parameter; hops is an int from config, not user input
+        query = Query(f"""
+            UNWIND $numbers AS number
+            OPTIONAL MATCH (c:Circular {{number: number}})
+            OPTIONAL MATCH path = (c)-[:REFERS_TO|AMENDS|SUPERSEDES*1..{int(self.hops)}]-(n:Circular)
+            WHERE n.in_corpus AND n <> c
+            WITH number, c IS NOT NULL AS in_graph, n,
+                 max(reduce(w = 1.0, r IN relationships(path) | w * coalesce($weights[type(r)], 0.0))) AS weight,
+                 min(length(path)) AS hops
+            ORDER BY weight DESC
+            RETURN number, in_graph,
+                   [x IN collect({{number: n.number, weight: weight, hops: hops}}) WHERE x.number IS NOT NULL][..$limit] AS neighbors
+        """, timeout=config.GRAPH_EXPANSION_TIMEOUT_SECONDS)
+        with self._get_driver().session() as session:
+            result = session.run(query, {
+                "numbers": circular_numbers,
+                "weights": self.weights,
+                "limit": config.GRAPH_EXPANSION_MAX_NEIGHBORS,
+            })
+            found = {}
+            for record in result:
+                if record["in_graph"]:
+                    found[record["number"]] = [(n["number"], n["weight"], n["hops"]) for n in record["neighbors"] if n["weight"]]
+        missing = [number for number in circular_numbers if number not in found]
+        if missing:
+            # An empty graph, or one older than the vectors: expansion quietly finds nothing
+            self.missing += len(missing)
+            if not self._warned_missing:
+                self._warned_missing = True
+                print(f"Warning: {len(missing)} of {len(circular_numbers)} circulars are not in the Neo4j graph "
+                      f"(e.g. {missing[0]}); load it with `python -m src.ingestion.graph_ingest`")
+        # Circulars missing from the graph are cached as having no neighbours
+        return {number: found.get(number, []) for number in circular_numbers}
+
+    def neighborhoods(self, circular_numbers):
+        """{number: [(neighbour, weight, hops)]}, fetching the uncached ones in one round trip."""
+        with self._lock:
+            self._check_version()
+            cached = {}
+            for number in circular_numbers:
+                if number in self._neighborhoods:
+                    self._neighborhoods.move_to_end(number)
+                    cached[number] = self._neighborhoods[number]
+            missing = [number for number in circular_numbers if number not in cached]
+            self.hits += len(cached)
+            self.misses += len(missing)
+        if not missing or time.monotonic() < self._unavailable_until:
+            return cached
+
+        try:
+            fetched = self._fetch(missing)
+            self.queries += 1
+        except Exception as e:
+            self._unavailable_until = time.monotonic() + config.GRAPH_EXPANSION_RETRY_SECONDS
+            print(f"Error expanding retrieval through Neo4j, skipping expansion for "
+                  f"{config.GRAPH_EXPANSION_RETRY_SECONDS:.0f}s: {str(e)}")
+            return cached
+
+        with self._lock:
+            for number, neighbors in fetched.items():
+                self._neighborhoods[number] = neighbors
+                self._neighborhoods.move_to_end(number)
+            while len(self._neighborhoods) > self.cache_size:
+                self._neighborhoods.popitem(last=False)
+        return {**cached, **fetched}
+
+    def expand(self, seed_scores, exclude=(), limit=None):
+        """
+        Circulars linked to the seeds ({number: vector score}), as
+        [(number, score, seed)] best first, without the seeds themselves
+        and anything in `exclude`.
+        """
+        limit = config.GRAPH_EXPANSION_MAX_CIRCULARS if limit is None else limit
+        neighborhoods = self.neighborhoods(list(seed_scores))
+        best = {}  # neighbour -> (score, seed)
+        for seed, seed_score in seed_scores.items():
+            for neighbor, weight, _ in neighborhoods.get(seed, []):
+                if neighbor in seed_scores or neighbor in exclude:
+                    continue
+                score = seed_score * weight
+                if neighbor not in best or score > best[neighbor][0]:
+                    best[neighbor] = (score, seed)
+        ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [(neighbor, score, seed) for neighbor, (score, seed) in ranked]
+
+    def stats(self):
+        return {
+            "cached": len(self._neighborhoods),
+            "hits": self.hits,
+            "misses": self.misses,
+            "queries": self.queries,
+            "missing": self.missing,
+        }
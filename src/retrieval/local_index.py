@@ -0,0 +1,217 @@
+"""
+In-process exact vector index for small corpora.
+
+The Qdrant collection is exported to LOCAL_INDEX_DIR as
+    vectors.npy    float32 (n, dim), L2-normalized rows, memory-mapped on load
+    points.json    point IDs and payloads, in row order
+and searched with one matrix-vector product. Scores are cosine
+similarities, as Qdrant's COSINE distance reports them, so rankings and
+score thresholds carry over unchanged.
+
+    python -m src.retrieval.local_index            # export from the configured Qdrant
+"""
+import json
+import os
+import numpy as np
+from qdrant_client import QdrantClient, models
+from src.utils import config
+from src.retrieval.compression import candidate_count, make_compressor
+
+VECTORS_FILE = "vectors.npy"
+POINTS_FILE = "points.json"
+
+
+def export_local_index(qdrant_client, index_dir=None, batch_size=1000):
+    """Copies every point (vector and payload) of the collection into a local index. Returns the point count."""
+    index_dir = index_dir or config.LOCAL_INDEX_DIR
+    ids, payloads, vectors = [], [], []
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=config.QDRANT_COLLECTION_NAME,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        for point in points:
+            ids.append(str(point.id))
+            payloads.append(point.payload)
+            vectors.append(point.vector)
+        if offset is None:
+            break
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+
+    # Points first, vectors last: readers reload when vectors.npy changes
+    os.makedirs(index_dir, exist_ok=True)
+    points_path = os.path.join(index_dir, POINTS_FILE)
+    with open(points_path + ".tmp", "w") as f:
+        json.dump({"ids": ids, "payloads": payloads}, f)
+    os.replace(points_path + ".tmp", points_path)
+    vectors_path = os.path.join(index_dir, VECTORS_FILE)
+    with open(vectors_path + ".tmp", "wb") as f:
+        np.save(f, matrix)
+    os.replace(vectors_path + ".tmp", vectors_path)
+    return len(ids)
+
+
+class LocalVectorIndex:
+    """
+    Exact cosine search over an exported collection. Returns the same
+    ScoredPoint / Record objects as the Qdrant client, so callers can use
+    either interchangeably. Supports the payload filters built by
+    src.retrieval.filters (ranges, MatchAny/MatchValue, HasId).
+
+    With a `compression` mode (see src.retrieval.compression) the first
+    pass runs over compressed vectors held in memory, and only the
+    oversampled candidates are read from the memory-mapped full vectors
+    for rescoring.
+    """
+
+    def __init__(self, index_dir, compression=None, rescore=None):
+        with open(os.path.join(index_dir, POINTS_FILE)) as f:
+            points = json.load(f)
+        self.vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode="r")
+        self.ids = points["ids"]
+        self.payloads = points["payloads"]
+        if len(self.ids) != len(self.vectors):
+            raise ValueError(f"{index_dir} holds {len(self.vectors)} vectors but {len(self.ids)} points")
+        self.rows = {point_id: row for row, point_id in enumerate(self.ids)}
+        self._field_values = {}
+
+        self.rescore = config.RESCORE_ENABLED if rescore is None else rescore
+        self.compressor = make_compressor(compression)
+        self.codes = None
+        if self.compressor is not None and len(self.ids):
+            self.codes = self.compressor.fit(self.vectors).encode(self.vectors)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _values(self, key):
+        """Payload values at a dotted key ("metadata.department"), one per row, cached."""
+        if key not in self._field_values:
+            values = []
+            for payload in self.payloads:
+                value = payload
+                for part in key.split("."):
+                    value = value.get(part) if isinstance(value, dict) else None
+                values.append(value)
+            self._field_values[key] = values
+        return self._field_values[key]
+
+    def _condition_mask(self, condition):
+        if isinstance(condition, models.HasIdCondition):
+            mask = np.zeros(len(self.ids), dtype=bool)
+            mask[[self.rows[str(i)] for i in condition.has_id if str(i) in self.rows]] = True
+            return mask
+        if isinstance(condition, models.Filter):
+            return self.filter_mask(condition)
+        values = self._values(condition.key)
+        if condition.range is not None:
+            bounds = condition.range
+            # Missing values are NaN, which fails every comparison, as in Qdrant
+            numbers = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            mask = ~np.isnan(numbers)
+            for bound, compare in ((bounds.gte, np.greater_equal), (bounds.gt, np.greater),
+                                   (bounds.lte, np.less_equal), (bounds.lt, np.less)):
+                if bound is not None:
+                    mask &= compare(numbers, bound)
+            return mask
+        match = condition.match
+        wanted = set(match.any) if isinstance(match, models.MatchAny) else {match.value}
+        return np.array([
+            bool(wanted.intersection(v if isinstance(v, list) else [v])) for v in values
+        ], dtype=bool)
+
+    def filter_mask(self, query_filter):
+        """Boolean row mask for a Qdrant Filter (must / should / must_not)."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for condition in query_filter.must or []:
+            mask &= self._condition_mask(condition)
+        if query_filter.should:
+            mask &= np.logical_or.reduce([self._condition_mask(c) for c in query_filter.should])
+        for condition in query_filter.must_not or []:
+            mask &= ~self._condition_mask(condition)
+        return mask
+
+    def search(self, query_vector, limit, score_threshold=None, query_filter=None):
+        """Top-`limit` rows by cosine similarity, best first, as ScoredPoints."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        if query_filter is None:
+            candidates = np.arange(len(self.ids))
+        else:
+            candidates = np.flatnonzero(self.filter_mask(query_filter))
+
+        if self.codes is not None:
+            # First pass on the compressed vectors, then rescore the best few exactly
+            codes = self.codes if query_filter is None else self.codes[candidates]
+            approximate = self.compressor.scores(codes, query)
+            keep = candidate_count(limit)
+            if len(candidates) > keep:
+                best = np.argpartition(-approximate, keep - 1)[:keep]
+                candidates, approximate = candidates[best], approximate[best]
+            scores = self.vectors[candidates] @ query if self.rescore else approximate.astype(np.float32)
+        elif query_filter is None:
+            scores = self.vectors @ query
+        else:
+            scores = self.vectors[candidates] @ query
+
+        if score_threshold is not None:
+            passing = scores >= score_threshold
+            candidates, scores = candidates[passing], scores[passing]
+        if len(candidates) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return [
+            models.ScoredPoint(id=self.ids[row], version=0, score=float(score), payload=self.payloads[row])
+            for row, score in zip(candidates[order], scores[order])
+        ]
+
+    def retrieve(self, point_ids, query_filter=None, with_payload=True):
+        """Points by ID, in the order given, skipping unknown IDs and those not matching `query_filter`."""
+        rows = [self.rows[point_id] for point_id in point_ids if point_id in self.rows]
+        if query_filter is not None:
+            mask = self.filter_mask(query_filter)
+            rows = [row for row in rows if mask[row]]
+        return [
+            models.Record(id=self.ids[row], payload=self.payloads[row] if with_payload else None)
+            for row in rows
+        ]
+
+
+class LocalIndexHandle:
+    """Loads the exported index lazily and reloads it when a new export replaces it."""
+
+    def __init__(self, index_dir=None):
+        self.index_dir = index_dir or config.LOCAL_INDEX_DIR
+        self._index = None
+        self._mtime = None
+
+    def get(self):
+        try:
+            mtime = os.stat(os.path.join(self.index_dir, VECTORS_FILE)).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            try:
+                self._index = LocalVectorIndex(self.index_dir, config.VECTOR_COMPRESSION)
+                self._mtime = mtime
+            except Exception as e:
+                print(f"Error loading local vector index from {self.index_dir}: {e}")
+        return self._index
+
+
+if __name__ == "__main__":
+    client = QdrantClient(
+        host=config.QDRANT_HOST,
+        port=config.QDRANT_PORT,
+        api_key=config.QDRANT_API_KEY
+    )
+    count = export_local_index(client)
+    print(f"Exported {count} points to {config.LOCAL_INDEX_DIR}")
@@ -0,0 +1,140 @@
+import atexit
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from src.utils import config
+from src.utils.providers import get_embedder
+from src.ingestion.embedding_cache import EmbeddingCache
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?.!,;:]+$")
+
+
+def normalize_query(query):
+    """Canonical form used as the cache key: case, spacing and trailing punctuation don't matter."""
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = _WHITESPACE.sub(" ", query).strip()
+    return _TRAILING_PUNCTUATION.sub("", query)
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe LRU cache of query embeddings with a time-to-live.
+
+    An optional on-disk `EmbeddingCache` backs the in-process entries so
+    embeddings survive restarts; it is saved every `save_every` new entries
+    and at interpreter exit, never during a lookup. The TTL counts from when the embedding was first
+    computed, in memory and on disk alike: an entry read back from disk keeps
+    its original write time, and expired disk entries are dropped.
+
+    The disk cache is single-process (see `EmbeddingCache`): give each
+    process its own QUERY_CACHE_DIR, or leave it empty to keep memory only.
+    """
+
+    def __init__(self, max_entries=None, ttl_seconds=None, disk_cache=None, save_every=20):
+        self.max_entries = max_entries or config.QUERY_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or config.QUERY_CACHE_TTL_SECONDS
+        self.disk_cache = disk_cache
+        self.save_every = save_every
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()  # key -> (embedding, time.time() when computed)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        if disk_cache is not None:
+            atexit.register(self.save)
+
+    def _key(self, query):
+        return EmbeddingCache.make_key(normalize_query(query), get_embedder().model_name, "retrieval_query")
+
+    def _remember(self, key, embedding, stored_at):
+        self._entries[key] = (embedding, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, query):
+        """Returns the cached embedding for `query`, or None."""
+        key = self._key(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                embedding, stored_at = entry
+                if time.time() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+
+            if self.disk_cache is not None:
+                embedding = self.disk_cache.get(key, max_age=self.ttl_seconds)
+                if embedding is not None:
+                    self._remember(key, embedding, self.disk_cache.written_at(key))
+                    self.disk_hits += 1
+                    return embedding
+
+            self.misses += 1
+            return None
+
+    def put(self, query, embedding):
+        key = self._key(query)
+        with self._lock:
+            self._remember(key, embedding, time.time())
+            if self.disk_cache is not None:
+                self.disk_cache.put(key, embedding)
+                self._unsaved += 1
+                if self._unsaved >= self.save_every:
+                    self._save_locked()
+
+    def get_or_embed(self, query, embed):
+        """Returns the cached embedding, calling `embed(query)` only on a miss."""
+        embedding = self.get(query)
+        if embedding is None:
+            embedding = embed(query)
+            self.put(query, embedding)
+        return embedding
+
+    def _save_locked(self):
+        try:
+            self.disk_cache.save()
+            self._unsaved = 0
+        except Exception as e:
+            print(f"Error saving query embedding cache: {e}")
+
+    def save(self):
+        if self.disk_cache is None:
+            return
+        with self._lock:
+            if self._unsaved or self.disk_cache.dirty:
+                self._save_locked()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries)
+            }
+
+
+def open_query_cache():
+    """Builds the configured query embedding cache, with disk backing if QUERY_CACHE_DIR is set."""
+    disk_cache = None
+    if config.QUERY_CACHE_DIR:
+        try:
+            disk_cache = EmbeddingCache(config.QUERY_CACHE_DIR, max_entries=config.QUERY_CACHE_DISK_MAX_ENTRIES)
+        except Exception as e:
+            print(f"Could not open query cache at {config.QUERY_CACHE_DIR}, using memory only: {e}")
+    return QueryEmbeddingCache(disk_cache=disk_cache)
@@ -1,15 +1,30 @@
-from qdrant_client import QdrantClient
-import google.generativeai as genai
+import time
+from collections import deque
+from qdrant_client import models
 from src.utils import config
+from src.utils.clients import get_qdrant_client
+from src.utils.providers import get_embedder, get_generator
+from src.retrieval.query_cache import open_query_cache
+from src.retrieval.answer_cache import SemanticAnswerCache
+from src.retrieval.reference_index import ReferenceIndexHandle
+from src.retrieval.graph_expand import GraphExpander
+from src.retrieval.local_index import LocalIndexHandle
+from src.retrieval.compression import qdrant_search_params
+from src.retrieval.context import assemble_context, estimate_tokens
+from src.retrieval.filters import describe_filters, merge_filters, parse_filters, to_qdrant_filter
+from src.retrieval.bm25 import BM25IndexHandle, identifier_query, is_strong_lexical_match, reciprocal_rank_fusion
 
 # --- Initialize Clients (globally for efficiency) ---
-qdrant_client = QdrantClient(
-    host=config.QDRANT_HOST,
-    port=config.QDRANT_PORT,
-    api_key=config.QDRANT_API_KEY
-)
-genai.configure(api_key=config.GOOGLE_API_KEY)
-generation_model = genai.GenerativeModel(config.GEMINI_GENERATION_MODEL)
+qdrant_client = get_qdrant_client()
+generator = get_generator()
+query_embedding_cache = open_query_cache()
+answer_cache = SemanticAnswerCache() if config.ANSWER_CACHE_ENABLED else None
+bm25_index = BM25IndexHandle()
+reference_index = ReferenceIndexHandle()
+local_index = LocalIndexHandle()
+graph_expander = GraphExpander() if config.GRAPH_EXPANSION_ENABLED else None  # Connects on first use
+_local_index_missing_reported = False
+_latencies = {"ttft": deque(maxlen=500), "total": deque(maxlen=500)}
 
 def format_sources(sources):
     """Format sources into a readable markdown string."""
@@ -21,39 +36,289 @@ def format_sources(sources):
         formatted += f"{i}. [{src['subject']}]({src['link']})\n"
     return formatted
 
-def query_rag(query: str) -> tuple[str, str]:
+def embed_query(query: str) -> list[float]:
+    """Embeds a query, reusing cached embeddings for repeated questions."""
+    def embed(text):
+        return get_embedder().embed([text], task_type="retrieval_query")[0]
+
+    return query_embedding_cache.get_or_embed(query, embed)
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters for the query embedding and answer caches."""
+    return {
+        "query": query_embedding_cache.stats(),
+        "answer": answer_cache.stats() if answer_cache is not None else None
+    }
+
+def get_latency_stats() -> dict:
+    """Recent time-to-first-token and total answer latencies, in seconds."""
+    stats = {}
+    for kind, samples in _latencies.items():
+        ordered = sorted(samples)
+        stats[kind] = {
+            "count": len(ordered),
+            "p50": ordered[len(ordered) // 2] if ordered else None,
+            "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else None
+        }
+    return stats
+
+def record_latency(kind, seconds):
+    _latencies[kind].append(seconds)
+    print(f"query_rag {kind}: {seconds * 1000:.0f} ms")
+
+def reference_point_ids(query: str) -> list[str]:
     """
-    Queries the RAG system.
-    1. Embeds the query.
-    2. Searches Qdrant for relevant context.
-    3. Generates a response using Gemini.
-    """
-    # 1. Embed the query
-    embedding_result = genai.embed_content(
-        model="models/embedding-001",
-        content=query,
-        task_type="retrieval_query"
-    )
-    query_embedding = embedding_result["embedding"]
+    Point IDs of the circulars a query names by circular, reference or
+    department number; empty when it names none (or the fast path is off).
+    """
+    index = reference_index.get() if config.REFERENCE_INDEX_ENABLED else None
+    if index is None:
+        return []
+    return index.point_ids(index.match(query), config.REFERENCE_MAX_CHUNKS)
 
-    # 2. Search Qdrant
-    search_results = qdrant_client.search(
+def lexical_search(query: str):
+    """
+    BM25 hits as (point_id, score, circular) tuples, plus whether the
+    identifiers in the query (reference numbers) pin down a single circular;
+    in that case the hits are ranked on those identifiers alone.
+    Returns ([], False) when hybrid retrieval is off or nothing is indexed.
+    """
+    index = bm25_index.get() if config.HYBRID_RETRIEVAL_ENABLED else None
+    if index is None:
+        return [], False
+    identifiers = identifier_query(query)
+    if identifiers:
+        identifier_hits = index.search(identifiers, config.BM25_CANDIDATES)
+        if is_strong_lexical_match(identifier_hits):
+            return identifier_hits, True
+    return index.search(query, config.BM25_CANDIDATES), False
+
+def get_local_index():
+    """The exported in-process index when RETRIEVAL_BACKEND is "local", else None (use Qdrant)."""
+    if config.RETRIEVAL_BACKEND != "local":
+        return None
+    global _local_index_missing_reported
+    index = local_index.get()
+    if index is None and not _local_index_missing_reported:
+        print(f"Local index not found in {config.LOCAL_INDEX_DIR}; falling back to Qdrant")
+        _local_index_missing_reported = True
+    return index
+
+# Request building and ranking shared by search_points and the async engine
+# (src.retrieval.async_service); only the Qdrant calls differ between them
+
+def dense_search_request(query_embedding, limit, query_filter=None):
+    """Keyword arguments of the Qdrant search for dense_search."""
+    return dict(
         collection_name=config.QDRANT_COLLECTION_NAME,
         query_vector=query_embedding,
-        limit=5,  # Increased to 5 for better context
+        query_filter=query_filter,  # Applied through the payload indexes before vectors are compared
+        search_params=qdrant_search_params(),  # Rescoring of quantized candidates, if quantized
+        limit=limit,
         with_payload=True,
-        score_threshold=0.7  # Only include highly relevant results
+        score_threshold=config.RETRIEVAL_SCORE_THRESHOLD  # Only include highly relevant results
+    )
+
+def points_request(point_ids, query_filter=None, with_payload=True):
+    """
+    (method, keyword arguments) of the Qdrant call for fetch_points: a
+    retrieve by ID, or a scroll restricted to the IDs and `query_filter`.
+    """
+    if query_filter is None:
+        return "retrieve", dict(
+            collection_name=config.QDRANT_COLLECTION_NAME,
+            ids=list(point_ids),
+            with_payload=with_payload
+        )
+    return "scroll", dict(
+        collection_name=config.QDRANT_COLLECTION_NAME,
+        scroll_filter=models.Filter(must=[models.HasIdCondition(has_id=list(point_ids)), *query_filter.must]),
+        limit=len(point_ids),
+        with_payload=with_payload,
+        with_vectors=False
+    )
+
+def order_points(records, point_ids):
+    """`records` in the order of `point_ids`, skipping IDs that weren't found."""
+    by_id = {str(record.id): record for record in records}
+    return [by_id[point_id] for point_id in point_ids if point_id in by_id]
+
+def restrict_lexical_hits(lexical_hits, allowed_points):
+    """
+    BM25 hits among `allowed_points`. The BM25 index has no payloads, so
+    Qdrant's payload indexes decide which hits match the filter.
+    """
+    allowed = {str(point.id) for point in allowed_points}
+    return [hit for hit in lexical_hits if hit[0] in allowed]
+
+def exact_match_ids(lexical_hits):
+    """Point IDs that answer a query whose identifiers pin down a circular."""
+    return [point_id for point_id, _, _ in lexical_hits[:config.CONTEXT_CANDIDATES]]
+
+def dense_limit(lexical_hits):
+    """Dense candidates to fetch: more when they are to be fused with BM25 hits."""
+    return max(config.BM25_CANDIDATES, config.CONTEXT_CANDIDATES) if lexical_hits else config.CONTEXT_CANDIDATES
+
+def fuse_ids(dense_results, lexical_hits):
+    """Reciprocal rank fusion of dense and lexical rankings, cut to CONTEXT_CANDIDATES."""
+    return reciprocal_rank_fusion(
+        [str(result.id) for result in dense_results],
+        [point_id for point_id, _, _ in lexical_hits],
+        limit=config.CONTEXT_CANDIDATES
+    )
+
+def missing_fused_ids(fused, dense_results):
+    """Fused IDs that only BM25 found; their points still have to be fetched."""
+    dense_ids = {str(result.id) for result in dense_results}
+    return [point_id for point_id in fused if point_id not in dense_ids]
+
+def fused_hits(fused, dense_results, fetched_points):
+    """Points in fused order, from the dense results (with scores) or fetched by ID."""
+    by_id = {str(point.id): point for point in fetched_points}
+    by_id.update((str(result.id), result) for result in dense_results)
+    return [by_id[point_id] for point_id in fused if point_id in by_id]
+
+def dense_search(query_embedding, limit, query_filter=None):
+    """Top-`limit` chunks by cosine similarity above RETRIEVAL_SCORE_THRESHOLD."""
+    index = get_local_index()
+    if index is not None:
+        return index.search(query_embedding, limit, config.RETRIEVAL_SCORE_THRESHOLD, query_filter)
+    return qdrant_client.search(**dense_search_request(query_embedding, limit, query_filter))
+
+def fetch_points(point_ids, query_filter=None, with_payload=True):
+    """
+    Loads points by ID, in the order given; IDs missing from the collection,
+    or not matching `query_filter`, are skipped.
+    """
+    if not point_ids:
+        return []
+    index = get_local_index()
+    if index is not None:
+        return index.retrieve(point_ids, query_filter, with_payload)
+    method, request = points_request(point_ids, query_filter, with_payload)
+    records = qdrant_client.retrieve(**request) if method == "retrieve" else qdrant_client.scroll(**request)[0]
+    return order_points(records, point_ids)
+
+def graph_expansion_ids(search_results):
+    """
+    Chunks of circulars linked in the graph to the top hits' circulars, as
+    {seed circular number: [point_id]}, best-scoring neighbours first.
+    Empty when GRAPH_EXPANSION_ENABLED is off or nothing is linked.
+    """
+    index = reference_index.get() if graph_expander is not None else None
+    if index is None or not search_results:
+        return {}
+    seeds = {}  # circular number -> first hit
+    for rank, result in enumerate(search_results):
+        seeds.setdefault(result.payload['metadata']['circular_number'], (rank, result))
+        if len(seeds) == config.GRAPH_EXPANSION_SEEDS:
+            break
+    # Hits fetched by ID (named circulars, BM25) have no vector score; rank them by position instead
+    if all(getattr(result, 'score', None) is not None for _, result in seeds.values()):
+        seed_scores = {number: result.score for number, (_, result) in seeds.items()}
+    else:
+        seed_scores = {number: 1.0 - rank / len(search_results) for number, (rank, _) in seeds.items()}
+    present = {result.payload['metadata']['circular_number'] for result in search_results}
+    expansion = {}
+    for circular_number, _, seed in graph_expander.expand(seed_scores, exclude=present):
+        expansion.setdefault(seed, []).extend(index.point_ids([circular_number], config.GRAPH_EXPANSION_CHUNKS))
+    return expansion
+
+def attach_expansion(search_results, expansion, points):
+    """Places the fetched expansion points right after the first hit of the circular they were reached from."""
+    by_id = {str(point.id): point for point in points}
+    print(
+        f"query_rag graph: +{len(by_id)} chunks from "
+        f"{len({point.payload['metadata']['circular_number'] for point in points})} linked circulars"
     )
+    expanded = []
+    for result in search_results:
+        expanded.append(result)
+        point_ids = expansion.pop(result.payload['metadata']['circular_number'], [])
+        expanded.extend(by_id[point_id] for point_id in point_ids if point_id in by_id)
+    return expanded
+
+def expand_with_graph(search_results, query_filter=None):
+    """Search hits plus the chunks of circulars the graph links them to (see graph_expansion_ids)."""
+    expansion = graph_expansion_ids(search_results)
+    if not expansion:
+        return search_results
+    points = fetch_points([point_id for point_ids in expansion.values() for point_id in point_ids], query_filter)
+    return attach_expansion(search_results, expansion, points)
+
+def resolve_filters(query: str, filters=None):
+    """
+    Combines explicit filters (e.g. from UI controls) with those parsed from
+    the question. Returns (filters, qdrant_filter); qdrant_filter is None
+    when nothing is filtered.
+    """
+    parsed = parse_filters(query) if config.QUERY_FILTER_PARSING_ENABLED else {}
+    filters = merge_filters(filters, parsed)
+    if filters:
+        print(f"query_rag filters: {describe_filters(filters)}")
+    return filters, to_qdrant_filter(filters)
+
+def search_points(query: str, query_filter=None):
+    """
+    Hybrid retrieval, restricted to points matching `query_filter` (a Qdrant
+    Filter on indexed payload fields). Returns (query_embedding, hits).
+    A query naming a circular by number is answered with that circular's
+    chunks, fetched by ID; a strong lexical match on an identifier is
+    answered from the BM25 index alone. Neither embeds the query, and
+    query_embedding is then None. Otherwise dense and lexical candidates
+    are fused by rank.
+    """
+    named_points = fetch_points(reference_point_ids(query), query_filter)
+    if named_points:
+        return None, named_points
+
+    lexical_hits, exact = lexical_search(query)
+    if query_filter is not None and lexical_hits:
+        lexical_hits = restrict_lexical_hits(
+            lexical_hits, fetch_points([hit[0] for hit in lexical_hits], query_filter, with_payload=False)
+        )
+    if exact and lexical_hits:
+        return None, fetch_points(exact_match_ids(lexical_hits))
+
+    query_embedding = embed_query(query)
+    dense_results = dense_search(query_embedding, dense_limit(lexical_hits), query_filter)
+    if not lexical_hits:
+        return query_embedding, dense_results
+
+    fused = fuse_ids(dense_results, lexical_hits)
+    return query_embedding, fused_hits(fused, dense_results, fetch_points(missing_fused_ids(fused, dense_results)))
+
+def retrieve_context(query: str, filters=None):
+    """
+    Finds relevant chunks (embedding the query unless a lexical match suffices),
+    restricted by `filters` and any filters the question itself names.
+    Returns (query_embedding, source_ids, context, sources).
+    """
+    # 1-2. Embed the query and search Qdrant, fused with BM25
+    _, query_filter = resolve_filters(query, filters)
+    query_embedding, search_results = search_points(query, query_filter)
+    search_results = expand_with_graph(search_results, query_filter)
 
     # 3. Construct Context and Sources
-    context = ""
+    source_ids, context, sources = build_context(search_results)
+    return query_embedding, source_ids, context, sources
+
+def build_context(search_results):
+    """
+    Turns search hits into prompt context and a de-duplicated source list:
+    a diverse subset (MMR) packed under CONTEXT_TOKEN_BUDGET, grouped by circular.
+    Returns (source_ids, context, sources).
+    """
+    selected, context, stats = assemble_context(search_results)
+    print(
+        f"query_rag context: {stats['chunks']} of {stats['candidates']} chunks from "
+        f"{stats['circulars']} circulars, ~{stats['context_tokens']} tokens"
+    )
     sources = []
     seen_subjects = set()  # To avoid duplicate sources
+    source_ids = [str(result.id) for result in selected]
     
-    for result in search_results:
-        # Add context with clear separation
-        context += f"---\n{result.payload['text']}\n\n"
-        
+    for result in selected:
         # Add source if not already included
         subject = result.payload['metadata']['subject']
         if subject not in seen_subjects:
@@ -63,8 +328,15 @@ def query_rag(query: str) -> tuple[str, str]:
             })
             seen_subjects.add(subject)
 
-    # 4. Generate Response using a detailed prompt
-    prompt = f"""
+    return source_ids, context, sources
+
+def log_prompt_tokens(prompt: str):
+    """Logs the estimated size of the prompt sent to Gemini."""
+    print(f"query_rag prompt: ~{estimate_tokens(prompt)} tokens")
+
+def build_prompt(context: str, query: str) -> str:
+    """Detailed answer prompt around the retrieved context."""
+    return f"""
     You are an expert financial analyst specializing in RBI regulations and circulars.
     Your task is to provide a clear, accurate, and well-structured response based ONLY on the provided context.
     
@@ -85,10 +357,73 @@ def query_rag(query: str) -> tuple[str, str]:
     Please provide a well-structured response that directly addresses the question.
     """
 
-    response = generation_model.generate_content(prompt)
+def query_rag(query: str, filters=None) -> tuple[str, str]:
+    """
+    Queries the RAG system.
+    `filters` optionally restricts the search: {"date_from": epoch, "date_to": epoch,
+    "departments": [...], "audiences": [...]} (see src.retrieval.filters).
+    1. Embeds the query (or reuses a cached embedding), unless a reference
+       number in it already pins down the circular.
+    2. Searches Qdrant for relevant context, fused with BM25 keyword hits, and
+       adds circulars the hits amend, supersede or cite (GRAPH_EXPANSION_ENABLED).
+    3. Reuses a stored answer for a near-duplicate question with the same sources,
+       or generates a response (Gemini, or the configured generation provider).
+    """
+    started = time.perf_counter()
+    query_embedding, source_ids, context, sources = retrieve_context(query, filters)
+
+    # Serve paraphrases of recent questions without calling Gemini again
+    if answer_cache is not None and query_embedding is not None:
+        cached = answer_cache.lookup(query_embedding, source_ids)
+        if cached is not None:
+            record_latency("total", time.perf_counter() - started)
+            return cached
+
+    # 4. Generate Response using a detailed prompt
+    prompt = build_prompt(context, query)
+    log_prompt_tokens(prompt)
+    formatted_response = generator.generate(prompt)
     
     # Format the response with sources
-    formatted_response = response.text
     formatted_sources = format_sources(sources)
     
-    return formatted_response, formatted_sources 
\ No newline at end of file
+    if answer_cache is not None and query_embedding is not None:
+        answer_cache.store(query_embedding, source_ids, formatted_response, formatted_sources)
+    
+    record_latency("total", time.perf_counter() - started)
+    return formatted_response, formatted_sources
+
+def query_rag_stream(query: str, filters=None):
+    """
+    Streaming variant of query_rag.
+    Yields ("text", fragment) events as the generator produces the answer, then a
+    single ("sources", formatted_sources) event.
+    """
+    started = time.perf_counter()
+    query_embedding, source_ids, context, sources = retrieve_context(query, filters)
+
+    if answer_cache is not None and query_embedding is not None:
+        cached = answer_cache.lookup(query_embedding, source_ids)
+        if cached is not None:
+            record_latency("ttft", time.perf_counter() - started)
+            yield "text", cached[0]
+            record_latency("total", time.perf_counter() - started)
+            yield "sources", cached[1]
+            return
+
+    fragments = []
+    prompt = build_prompt(context, query)
+    log_prompt_tokens(prompt)
+    for text in generator.generate_stream(prompt):
+        if not fragments:
+            record_latency("ttft", time.perf_counter() - started)
+        fragments.append(text)
+        yield "text", text
+
+    formatted_response = "".join(fragments)
+    formatted_sources = format_sources(sources)
+    if answer_cache is not None and query_embedding is not None:
+        answer_cache.store(query_embedding, source_ids, formatted_response, formatted_sources)
+
+    record_latency("total", time.perf_counter() - started)
+    yield "sources", formatted_sources
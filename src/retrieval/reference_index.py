@@ -0,0 +1,152 @@
+import json
+import os
+import re
+from src.utils import config
+
+# "RBI/2024-25/100", "RBI/FED/2024-25/78"; in the data it is often glued to the reference that follows
+_RBI_NUMBER = re.compile(r"rbi(?:/[a-z]+)*/\d{4}-\d{2}(?:\d{2})?/\d+", re.IGNORECASE)
+# Identifier-shaped spans in a user query: RBI numbers, or tokens joined by "." "/" "-"
+_QUERY_IDENTIFIER = re.compile(_RBI_NUMBER.pattern + r"|[a-z0-9]+(?:[./\-][a-z0-9]+)+", re.IGNORECASE)
+# FEMA references are prose, e.g. "A. P. (DIR Series) Circular No.05"
+_AP_DIR = re.compile(r"a\.?\s*p\.?\s*\(\s*dir\s+series\s*\)\s*circular\s*no\.?\s*(\d+)", re.IGNORECASE)
+_LONG_YEAR_RANGE = re.compile(r"\b(\d{4})-\d{2}(\d{2})\b")
+_NO_SEGMENT = re.compile(r"(^|[./\-])no\.(?=[a-z0-9])")
+_LEADING_ZEROS = re.compile(r"(?<![0-9])0+(?=[0-9])")
+_REFERENCE_KEY = re.compile(r"[a-z0-9./\-]*[a-z][a-z0-9./\-]*")
+
+
+def normalize_reference(text):
+    """
+    Canonical form of a circular or reference number: lowercase, no spaces,
+    "2024-2025" -> "2024-25", "No." segments and leading zeros dropped, so
+    "DoR.SPE.REC.No.51/13.03.00/2024-2025" and "DOR.SPE.REC.51/13.3.0/2024-25"
+    compare equal.
+    """
+    text = re.sub(r"\s+", "", _LONG_YEAR_RANGE.sub(r"\1-\2", text.lower()))
+    return _LEADING_ZEROS.sub("", _NO_SEGMENT.sub(r"\1", text))
+
+
+def _ap_dir_key(number):
+    return f"a.p.(dir)/{int(number)}"
+
+
+def reference_keys(circular):
+    """Normalized lookup keys for a circular: its RBI number, department reference and department code."""
+    details = circular.get('details', {}).get('circular', {})
+    keys = set()
+    for raw in (circular.get('Circular Number'), details.get('circularNumber'), details.get('referenceNumber')):
+        raw = (raw or "").strip()
+        match = _RBI_NUMBER.match(raw)
+        if match:
+            keys.add(normalize_reference(match.group()))
+            raw = raw[match.end():].strip()
+        if not raw:
+            continue
+        ap_dir = _AP_DIR.search(raw)
+        if ap_dir:
+            keys.add(_ap_dir_key(ap_dir.group(1)))
+            continue
+        reference = normalize_reference(raw)
+        if not _REFERENCE_KEY.fullmatch(reference):
+            continue
+        keys.add(reference)
+        # The department code alone, e.g. "dor.str.rec.54", is what people usually quote
+        code = reference.split("/")[0]
+        if any(c.isdigit() for c in code) and any(c in ".-" for c in code):
+            keys.add(code)
+    return keys
+
+
+def iter_reference_spans(text):
+    """
+    (key, start, end) for every reference-shaped span of `text`, in order:
+    A.P. (DIR Series) circulars and identifier-shaped tokens, normalized.
+    Most spans name no circular at all; callers look the keys up.
+    """
+    spans = [(_ap_dir_key(match.group(1)), match.start(), match.end()) for match in _AP_DIR.finditer(text)]
+    spans.extend(
+        (normalize_reference(match.group()), match.start(), match.end())
+        for match in _QUERY_IDENTIFIER.finditer(text)
+    )
+    return sorted(spans, key=lambda span: span[1])
+
+
+class ReferenceIndexBuilder:
+    """Collects reference keys and point IDs per circular during ingestion."""
+
+    def __init__(self):
+        self.keys = {}    # key -> [circular_number]
+        self.points = {}  # circular_number -> [point_id], in chunk order
+
+    def add_circular(self, circular):
+        circular_number = circular['Circular Number']
+        for key in reference_keys(circular):
+            circulars = self.keys.setdefault(key, [])
+            if circular_number not in circulars:
+                circulars.append(circular_number)
+
+    def add_point(self, circular_number, point_id):
+        self.points.setdefault(circular_number, []).append(point_id)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"keys": self.keys, "points": self.points}, f)
+        os.replace(tmp_path, path)
+
+
+class ReferenceIndex:
+    """Read-only lookup from identifiers in a query to the chunks of the circulars they name."""
+
+    def __init__(self, path):
+        with open(path) as f:
+            data = json.load(f)
+        self.keys = data["keys"]
+        self.points = data["points"]
+
+    def match(self, query):
+        """Circular numbers named in `query`, in order of mention."""
+        found = []
+        candidates = []
+        for key, _, _ in iter_reference_spans(query):
+            # A full reference that differs in its file code still names the department code
+            candidates.append(key if key in self.keys else key.split("/")[0])
+        for key in candidates:
+            for circular_number in self.keys.get(key, []):
+                if circular_number not in found:
+                    found.append(circular_number)
+        return found
+
+    def point_ids(self, circular_numbers, limit):
+        """Up to `limit` point IDs, shared evenly between the circulars, each in document order."""
+        if not circular_numbers:
+            return []
+        per_circular = max(1, limit // len(circular_numbers))
+        return [
+            point_id
+            for circular_number in circular_numbers
+            for point_id in self.points.get(circular_number, [])[:per_circular]
+        ]
+
+
+class ReferenceIndexHandle:
+    """Loads the on-disk index lazily and reloads it when ingestion rewrites the file."""
+
+    def __init__(self, path=None):
+        self.path = path or config.REFERENCE_INDEX_PATH
+        self._index = None
+        self._mtime = None
+
+    def get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            try:
+                self._index = ReferenceIndex(self.path)
+                self._mtime = mtime
+            except Exception as e:
+                print(f"Error loading reference index from {self.path}: {e}")
+        return self._index
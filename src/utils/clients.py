@@ -0,0 +1,221 @@
+"""
+Process-wide service clients, shared by every Streamlit session and rerun
+and by the retrieval modules: one QdrantClient and one Neo4jConnection
+(its driver pool and chat-log writer), each created on first use and
+closed at exit. The Neo4j connection is opened off the request path, by
+the health prober or a background thread; pages only read it.
+
+Service health comes from HealthProber, which checks both services in a
+background thread every HEALTH_CHECK_INTERVAL_SECONDS; readers get the
+last result immediately instead of making a round trip per rerun.
+"""
+import atexit
+import threading
+import time
+from qdrant_client import QdrantClient
+from src.utils import config
+
+_lock = threading.Lock()  # Guards the globals below; never held across network calls
+_neo4j_connect_lock = threading.Lock()  # One Neo4j connection attempt at a time
+_qdrant_client = None
+_neo4j_connection = None
+_neo4j_error = None  # (monotonic time, exception) of the last failed connection attempt
+_neo4j_connecting = False  # A background connection attempt is running
+_prober = None
+
+
+def get_qdrant_client():
+    """The shared QdrantClient."""
+    global _qdrant_client
+    if _qdrant_client is None:
+        with _lock:
+            if _qdrant_client is None:
+                _qdrant_client = QdrantClient(
+                    host=config.QDRANT_HOST,
+                    port=config.QDRANT_PORT,
+                    api_key=config.QDRANT_API_KEY
+                )
+    return _qdrant_client
+
+
+def _neo4j_retry_pending():
+    return _neo4j_error is not None and time.monotonic() - _neo4j_error[0] < config.NEO4J_RETRY_SECONDS
+
+
+def get_neo4j_connection():
+    """
+    The shared Neo4jConnection, connecting first if there is none yet; this
+    can take a full connection timeout, so it is for the prober thread,
+    ingestion and scripts, not the page (see current_neo4j_connection).
+    Raises if Neo4j can't be reached; after a failure, calls within
+    NEO4J_RETRY_SECONDS raise the same error at once.
+    """
+    global _neo4j_connection, _neo4j_error
+    connection = _neo4j_connection
+    if connection is not None:
+        return connection
+    with _neo4j_connect_lock:
+        with _lock:
+            if _neo4j_connection is not None:
+                return _neo4j_connection  # Another caller connected while this one waited
+            if _neo4j_retry_pending():
+                raise _neo4j_error[1]
+        # Imported here: neo4j_utils pulls in streamlit, which scripts using only Qdrant don't need
+        from src.utils.neo4j_utils import Neo4jConnection
+        try:
+            connection = Neo4jConnection(config.NEO4J_URI, config.NEO4J_USERNAME, config.NEO4J_PASSWORD)
+        except Exception as e:
+            with _lock:
+                _neo4j_error = (time.monotonic(), e)
+            raise
+        with _lock:
+            _neo4j_connection, _neo4j_error = connection, None
+        return connection
+
+
+def current_neo4j_connection():
+    """
+    The shared Neo4jConnection if one is open, else None, without waiting.
+    When there is none, a background thread starts connecting (unless an
+    attempt is under way or the last one failed within NEO4J_RETRY_SECONDS),
+    so a later call finds it open.
+    """
+    global _neo4j_connecting
+    connection = _neo4j_connection
+    if connection is not None:
+        return connection
+    with _lock:
+        if _neo4j_connecting or _neo4j_connection is not None or _neo4j_retry_pending():
+            return _neo4j_connection
+        _neo4j_connecting = True
+
+    def connect():
+        global _neo4j_connecting
+        try:
+            get_neo4j_connection()
+        except Exception:
+            pass  # Kept as _neo4j_error; the health prober reports it
+        finally:
+            with _lock:
+                _neo4j_connecting = False
+
+    threading.Thread(target=connect, name="neo4j-connect", daemon=True).start()
+    return None
+
+
+class HealthProber:
+    """
+    Checks Qdrant (listing collections) and Neo4j (verifying connectivity)
+    in a daemon thread. status() and refresh() never make a network call
+    themselves and wait at most the given number of seconds; until the
+    first check of a service finishes, its status is "checking" (ok is
+    None). A result older than HEALTH_CHECK_TTL_SECONDS, because the prober
+    is stuck behind a hanging call, is reported as stale.
+    """
+
+    def __init__(self, interval=None, ttl=None):
+        self.interval = interval or config.HEALTH_CHECK_INTERVAL_SECONDS
+        self.ttl = ttl or config.HEALTH_CHECK_TTL_SECONDS
+        self._results = {}  # service -> {"ok", "detail", "latency_ms", "checked_at"}
+        self._probes = 0  # Completed probe() calls
+        self._probe_lock = threading.Lock()
+        self._updated = threading.Condition()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _check(self, service, check):
+        started = time.monotonic()
+        try:
+            ok, detail = True, check()
+        except Exception as e:
+            ok, detail = False, str(e)
+        with self._updated:
+            self._results[service] = {
+                "ok": ok,
+                "detail": detail,
+                "latency_ms": (time.monotonic() - started) * 1000,
+                "checked_at": time.monotonic(),
+            }
+            self._updated.notify_all()
+
+    def probe(self):
+        """Checks both services now, blocking for as long as that takes, and stores the results."""
+        with self._probe_lock:
+            self._check("qdrant", lambda: [collection.name for collection in get_qdrant_client().get_collections().collections])
+            self._check("neo4j", lambda: get_neo4j_connection().driver.verify_connectivity())
+            with self._updated:
+                self._probes += 1
+                self._updated.notify_all()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+            self._thread.start()
+
+    def refresh(self, wait=0):
+        """
+        Asks the prober thread for a check now, waiting up to `wait` seconds
+        for it to finish. Returns True if it did.
+        """
+        with self._updated:
+            probes = self._probes
+        self._wake.set()
+        with self._updated:
+            return self._updated.wait_for(lambda: self._probes > probes, timeout=wait)
+
+    def status(self, service, wait=0):
+        """
+        {"ok", "detail", "latency_ms", "age_seconds", "stale"} for "qdrant" or
+        "neo4j". If the service hasn't been checked yet, waits up to `wait`
+        seconds for the prober, then reports ok=None ("checking").
+        """
+        with self._updated:
+            self._updated.wait_for(lambda: service in self._results, timeout=wait)
+            result = self._results.get(service)
+        if result is None:
+            return {"ok": None, "detail": "Checking…", "latency_ms": None, "age_seconds": 0.0, "stale": False}
+        age = time.monotonic() - result["checked_at"]
+        return {**result, "age_seconds": age, "stale": age > self.ttl}
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+def get_health_prober():
+    """The shared HealthProber, started on first use."""
+    global _prober
+    if _prober is None:
+        with _lock:
+            if _prober is None:
+                _prober = HealthProber()
+                _prober.start()
+    return _prober
+
+
+def close_clients():
+    """Stops the prober, drains the chat log and closes both clients."""
+    global _qdrant_client, _neo4j_connection, _prober
+    with _lock:
+        prober, _prober = _prober, None
+        neo4j_connection, _neo4j_connection = _neo4j_connection, None
+        qdrant_client, _qdrant_client = _qdrant_client, None
+    if prober is not None:
+        prober.stop()
+    if neo4j_connection is not None:
+        neo4j_connection.close()
+    if qdrant_client is not None:
+        try:
+            qdrant_client.close()
+        except Exception as e:
+            print(f"Error closing Qdrant client: {str(e)}")
+
+
+atexit.register(close_clients)
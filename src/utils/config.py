@@ -13,12 +13,130 @@ QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVC
 QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME", "rbi_circulars")
 
 # --- Gemini Configuration ---
-GEMINI_GENERATION_MODEL = "gemini-2.0-flash"
+GEMINI_GENERATION_MODEL = os.getenv("GEMINI_GENERATION_MODEL", "gemini-2.0-flash")
+GEMINI_EMBEDDING_MODEL = os.getenv("GEMINI_EMBEDDING_MODEL", "models/embedding-001")
+EMBEDDING_DIM = 768
+
+# --- Model Provider Configuration ---
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "gemini")  # "gemini", or "hashing" for offline embeddings
+GENERATION_PROVIDER = os.getenv("GENERATION_PROVIDER", "gemini")  # "gemini", or "template" for offline answers
+LOCAL_EMBEDDING_LATENCY_MS = float(os.getenv("LOCAL_EMBEDDING_LATENCY_MS", "0"))  # Hashing embedder: delay per embed call
+LOCAL_EMBEDDING_JITTER_MS = float(os.getenv("LOCAL_EMBEDDING_JITTER_MS", "0"))  # Hashing embedder: extra random delay, up to this
+LOCAL_GENERATION_LATENCY_MS = float(os.getenv("LOCAL_GENERATION_LATENCY_MS", "0"))  # Template generator: delay before the first fragment
+LOCAL_GENERATION_FRAGMENT_MS = float(os.getenv("LOCAL_GENERATION_FRAGMENT_MS", "0"))  # Template generator: delay between streamed words
+LOCAL_GENERATION_TEMPLATE = os.getenv(
+    "LOCAL_GENERATION_TEMPLATE",
+    "Offline answer to: {question} (generated from a {prompt_chars}-character prompt)"
+)
+
+# --- Embedding Stage Configuration ---
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "50"))  # Documents per API call (max 100)
+EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", "4"))  # Batches in flight at once
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+
+# --- Embedding Cache Configuration ---
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+# --- Retrieval Configuration ---
+RETRIEVAL_LIMIT = int(os.getenv("RETRIEVAL_LIMIT", "5"))  # Chunks placed in the prompt, at most
+RETRIEVAL_SCORE_THRESHOLD = float(os.getenv("RETRIEVAL_SCORE_THRESHOLD", "0.7"))
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "qdrant")  # "qdrant", or "local" for the exported NumPy index
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", ".cache/local_index")
+VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none")  # none | int8 | binary (Qdrant + local) | pca | truncate (local)
+VECTOR_REDUCED_DIM = int(os.getenv("VECTOR_REDUCED_DIM", "256"))  # Dimensions kept by pca / truncate
+RESCORE_ENABLED = os.getenv("RESCORE_ENABLED", "true").lower() == "true"  # Rescore compressed candidates with full vectors
+RESCORE_OVERSAMPLING = float(os.getenv("RESCORE_OVERSAMPLING", "3.0"))  # Candidates per result for rescoring
+QUERY_FILTER_PARSING_ENABLED = os.getenv("QUERY_FILTER_PARSING_ENABLED", "true").lower() == "true"  # Dates, departments, audiences named in questions
+
+# --- Context Assembly Configuration ---
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "15"))  # Retrieved before MMR picks RETRIEVAL_LIMIT of them
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))  # Estimated tokens of retrieved text per prompt
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1.0 = relevance only, lower = more diverse
+
+# --- Hybrid (BM25 + dense) Retrieval Configuration ---
+HYBRID_RETRIEVAL_ENABLED = os.getenv("HYBRID_RETRIEVAL_ENABLED", "true").lower() == "true"
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", ".cache/bm25_index.npz")  # Written by ingestion
+BM25_CANDIDATES = int(os.getenv("BM25_CANDIDATES", "20"))  # Candidates per retriever before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))
+BM25_STRONG_SCORE = float(os.getenv("BM25_STRONG_SCORE", "4.0"))  # Reference-number matches above this score...
+BM25_STRONG_MARGIN = float(os.getenv("BM25_STRONG_MARGIN", "2.0"))  # ...and this lead over other circulars
+
+# --- Reference Number Fast Path ---
+REFERENCE_INDEX_ENABLED = os.getenv("REFERENCE_INDEX_ENABLED", "true").lower() == "true"
+REFERENCE_INDEX_PATH = os.getenv("REFERENCE_INDEX_PATH", ".cache/reference_index.json")  # Written by ingestion
+REFERENCE_MAX_CHUNKS = int(os.getenv("REFERENCE_MAX_CHUNKS", "8"))  # Chunks fetched for circulars named in a query
+
+# --- Async Query Service Configuration ---
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))  # Concurrent Gemini calls per process
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))  # How long to gather queries into one embed call
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+
+# --- Query Cache Configuration ---
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1000"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "86400"))
+QUERY_CACHE_DIR = os.getenv("QUERY_CACHE_DIR", ".cache/query_embeddings")  # Empty disables disk backing
+QUERY_CACHE_DISK_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_DISK_MAX_ENTRIES", "10000"))
+
+# --- Answer Cache Configuration ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # Cosine similarity threshold
+INGEST_VERSION_PATH = os.getenv("INGEST_VERSION_PATH", ".cache/ingest_version")  # Bumped when ingestion changes the collection
 
 # --- Data Configuration ---
 DATA_PATH = os.getenv("DATA_PATH", "data/rbi_circulars.json")
+INGEST_MODE = os.getenv("INGEST_MODE", "sync")  # "sync" (incremental) or "rebuild"
+# --- Chunking Configuration ---
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "2000"))  # 0 keeps one chunk per section
+CHUNK_OVERLAP_CHARS = int(os.getenv("CHUNK_OVERLAP_CHARS", "200"))
+CHUNK_MIN_CHARS = int(os.getenv("CHUNK_MIN_CHARS", "300"))  # Smaller sections are merged with neighbours
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "256"))  # Max items between ingestion stages
 
 # --- Neo4j Configuration ---
 NEO4J_URI = os.getenv("NEO4J_URI", "neo4j+s://8f889fdf.databases.neo4j.io")
 NEO4J_USERNAME = os.getenv("NEO4J_USERNAME", "neo4j")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "BIcxg-LSb4Z9t8HGfJ6OJP1Ju1BzLrTfnGO4ZedDPjQ") 
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "BIcxg-LSb4Z9t8HGfJ6OJP1Ju1BzLrTfnGO4ZedDPjQ")
+NEO4J_RETRY_SECONDS = float(os.getenv("NEO4J_RETRY_SECONDS", "30"))  # After a failed connect, fail fast for this long
+
+# --- Health Check Configuration ---
+HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "15"))  # Background probe period
+HEALTH_CHECK_TTL_SECONDS = float(os.getenv("HEALTH_CHECK_TTL_SECONDS", "60"))  # Older results are shown as stale
+HEALTH_CHECK_WAIT_SECONDS = float(os.getenv("HEALTH_CHECK_WAIT_SECONDS", "2"))  # Longest a page waits for a first or refreshed check
+
+# --- Circular Graph Configuration ---
+GRAPH_INGEST_ENABLED = os.getenv("GRAPH_INGEST_ENABLED", "true").lower() == "true"  # Load the circular graph after embeddings
+GRAPH_INGEST_BATCH_SIZE = int(os.getenv("GRAPH_INGEST_BATCH_SIZE", "500"))  # Circulars per write transaction
+GRAPH_EXPANSION_ENABLED = os.getenv("GRAPH_EXPANSION_ENABLED", "false").lower() == "true"  # Add linked circulars to retrieval hits
+GRAPH_EXPANSION_HOPS = int(os.getenv("GRAPH_EXPANSION_HOPS", "2"))  # Reference edges followed from a hit's circular
+GRAPH_EXPANSION_SEEDS = int(os.getenv("GRAPH_EXPANSION_SEEDS", "3"))  # Top hit circulars expanded
+GRAPH_EXPANSION_MAX_CIRCULARS = int(os.getenv("GRAPH_EXPANSION_MAX_CIRCULARS", "3"))  # Linked circulars added per query
+GRAPH_EXPANSION_MAX_NEIGHBORS = int(os.getenv("GRAPH_EXPANSION_MAX_NEIGHBORS", "20"))  # Neighbours kept per circular
+GRAPH_EXPANSION_CHUNKS = int(os.getenv("GRAPH_EXPANSION_CHUNKS", "2"))  # Leading chunks fetched per linked circular
+GRAPH_EXPANSION_WEIGHTS = {  # Edge weights; a path scores the product of its edges
+    name: float(weight)
+    for name, weight in (
+        item.split(":") for item in os.getenv("GRAPH_EXPANSION_WEIGHTS", "SUPERSEDES:0.9,AMENDS:0.8,REFERS_TO:0.5").split(",")
+    )
+}
+GRAPH_NEIGHBORHOOD_CACHE_SIZE = int(os.getenv("GRAPH_NEIGHBORHOOD_CACHE_SIZE", "1024"))  # Circular neighbourhoods kept in memory
+GRAPH_EXPANSION_TIMEOUT_SECONDS = float(os.getenv("GRAPH_EXPANSION_TIMEOUT_SECONDS", "2"))  # Neo4j query timeout
+GRAPH_EXPANSION_RETRY_SECONDS = float(os.getenv("GRAPH_EXPANSION_RETRY_SECONDS", "30"))  # Expansion paused after a Neo4j error
+
+# --- Chat Log (Neo4j write-behind) Configuration ---
+CHAT_LOG_QUEUE_SIZE = int(os.getenv("CHAT_LOG_QUEUE_SIZE", "1000"))  # Interactions buffered in memory, at most
+CHAT_LOG_BATCH_SIZE = int(os.getenv("CHAT_LOG_BATCH_SIZE", "50"))  # Interactions per write transaction
+CHAT_LOG_FLUSH_INTERVAL_MS = float(os.getenv("CHAT_LOG_FLUSH_INTERVAL_MS", "500"))  # Longest a partial batch waits
+CHAT_LOG_ENQUEUE_TIMEOUT_MS = float(os.getenv("CHAT_LOG_ENQUEUE_TIMEOUT_MS", "50"))  # Full buffer: wait this long, then drop
+CHAT_LOG_MAX_RETRIES = int(os.getenv("CHAT_LOG_MAX_RETRIES", "5"))  # Failed batch writes are retried with backoff
+CHAT_LOG_DRAIN_TIMEOUT_SECONDS = float(os.getenv("CHAT_LOG_DRAIN_TIMEOUT_SECONDS", "10"))  # Shutdown waits this long for pending writes
+
+# --- Chat Graph Configuration ---
+CHAT_GRAPH_PAGE_SIZE = int(os.getenv("CHAT_GRAPH_PAGE_SIZE", "50"))  # Chats per query
+CHAT_GRAPH_MAX_CHATS = int(os.getenv("CHAT_GRAPH_MAX_CHATS", "200"))  # Chats kept in a session's graph
+CHAT_GRAPH_TEXT_CHARS = int(os.getenv("CHAT_GRAPH_TEXT_CHARS", "500"))  # Query/response/source text sent for tooltips
+GRAPH_RENDER_CACHE_SIZE = int(os.getenv("GRAPH_RENDER_CACHE_SIZE", "16"))  # Rendered graph versions kept in memory
+GRAPH_LAYOUT_ITERATIONS = int(os.getenv("GRAPH_LAYOUT_ITERATIONS", "50"))  # Force layout iterations when nodes are added
+GRAPH_LAYOUT_SCALE = float(os.getenv("GRAPH_LAYOUT_SCALE", "120"))  # Canvas pixels per ideal edge length
+GRAPH_SERVER_LAYOUT_MIN_NODES = int(os.getenv("GRAPH_SERVER_LAYOUT_MIN_NODES", "300"))  # Smaller graphs are laid out in the browser
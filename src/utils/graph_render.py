@@ -0,0 +1,269 @@
+"""
+Chat graph rendering with a server-side layout and an in-memory HTML cache.
+
+Node positions for graphs of GRAPH_SERVER_LAYOUT_MIN_NODES or more come
+from a force-directed (Fruchterman-Reingold) layout computed in this
+process and kept between renders: when chats are added, only the new
+nodes are placed, against the fixed positions of the rest, so the work
+grows with the new nodes rather than the whole graph and nothing already
+drawn moves. The browser draws the result with physics off instead of
+running a stabilization pass. Smaller graphs keep the browser layout:
+their stabilization is short, and skipping the layout here makes them
+the cheapest to render.
+
+Rendered HTML is cached per graph version, a hash of the node IDs and
+edges; chat and source IDs are never reused for different content, so
+equal IDs mean an equal drawing. Nothing is
+written to disk, so concurrent sessions can't clobber each other.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict, defaultdict
+import numpy as np
+from pyvis.network import Network
+from src.utils import config
+
+GROUP_STYLES = {
+    "rbi": ("#2ca02c", 40),     # Green for RBI node
+    "chat": ("#1f77b4", 25),    # Blue for chat nodes
+    "source": ("#ff7f0e", 20),  # Orange for source nodes
+}
+
+# Browser-side layout for graphs below GRAPH_SERVER_LAYOUT_MIN_NODES
+BROWSER_PHYSICS = {
+    "forceAtlas2Based": {
+        "gravitationalConstant": -100,
+        "centralGravity": 0.1,
+        "springLength": 200,
+        "springConstant": 0.1
+    },
+    "maxVelocity": 50,
+    "solver": "forceAtlas2Based",
+    "timestep": 0.35,
+    "stabilization": {
+        "enabled": True,
+        "iterations": 1000
+    }
+}
+
+NETWORK_OPTIONS = {
+    "physics": {
+        "enabled": False
+    },
+    "interaction": {
+        "hover": True,
+        "tooltipDelay": 200,
+        "hideEdgesOnDrag": True,
+        "navigationButtons": True
+    },
+    "nodes": {
+        "font": {
+            "size": 14,
+            "face": "Arial",
+            "strokeWidth": 2,
+            "strokeColor": "#ffffff"
+        },
+        "shape": "dot",
+        "borderWidth": 2,
+        "shadow": True
+    },
+    "edges": {
+        "width": 2,
+        "shadow": True,
+        "smooth": {
+            "type": "continuous",
+            "forceDirection": "none"
+        },
+        "arrows": {
+            "to": {
+                "enabled": True,
+                "scaleFactor": 0.5
+            }
+        }
+    }
+}
+
+
+def graph_version(G):
+    """Hash of the graph's node IDs and edges."""
+    digest = hashlib.sha1()
+    for node in sorted(map(str, G.nodes)):
+        digest.update(node.encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(b"\1")
+    for edge in sorted("\0".join(sorted(map(str, edge))) for edge in G.edges):
+        digest.update(edge.encode("utf-8"))
+        digest.update(b"\1")
+    return digest.hexdigest()
+
+
+def force_layout(pos, moving, edges, iterations, temperature, weights=None):
+    """
+    Fruchterman-Reingold with an ideal edge length of 1, moving only the
+    rows `moving` of `pos` (n x 2); every node repels them, scaled by both
+    nodes' `weights` (default 1), and their neighbours attract them.
+    `edges` is a (k x 2) array of (row in `moving`, node) pairs. Each step
+    is capped by a temperature that cools linearly to zero. Returns the
+    new positions of the moving rows.
+    """
+    pos = pos.astype(np.float64)
+    weights = np.ones(len(pos)) if weights is None else np.asarray(weights, dtype=np.float64)
+    rows = np.arange(len(moving))
+    for step in range(iterations):
+        current = pos[moving]
+        # Squared distances as |a|^2 + |b|^2 - 2ab, so the (m, n) work is one matrix product
+        squared = (pos * pos).sum(axis=1)
+        inverse = current @ pos.T
+        inverse *= -2
+        inverse += squared[moving, None]
+        inverse += squared[None, :]
+        np.maximum(inverse, 1e-4, out=inverse)
+        np.reciprocal(inverse, out=inverse)
+        inverse[rows, moving] = 0  # no force on a node from itself
+        # Repulsion w_i w_j / d from every node, w_i sum_j w_j (p_i - p_j) / d_ij^2, and
+        # attraction d^2 towards neighbours (both along the unit vector)
+        move = current * (inverse @ weights)[:, None] - inverse @ (pos * weights[:, None])
+        move *= weights[moving, None]
+        delta = current[edges[:, 0]] - pos[edges[:, 1]]
+        pull = delta * np.sqrt((delta * delta).sum(axis=1))[:, None]
+        np.subtract.at(move, edges[:, 0], pull)
+        length = np.maximum(np.sqrt((move * move).sum(axis=1)), 1e-6)
+        factor = np.minimum(length, temperature * (1 - step / iterations)) / length
+        pos[moving] = current + move * factor[:, None]
+    return pos[moving]
+
+
+class GraphRenderer:
+    """Keeps node positions and recently rendered HTML; safe to share between sessions."""
+
+    def __init__(self, cache_size=None, layout_iterations=None, scale=None, min_nodes=None):
+        self.cache_size = cache_size or config.GRAPH_RENDER_CACHE_SIZE
+        self.layout_iterations = layout_iterations or config.GRAPH_LAYOUT_ITERATIONS
+        self.scale = scale or config.GRAPH_LAYOUT_SCALE
+        self.min_nodes = config.GRAPH_SERVER_LAYOUT_MIN_NODES if min_nodes is None else min_nodes
+        self.positions = {}  # node -> (x, y), in ideal edge lengths
+        self.hits = 0
+        self.misses = 0
+        self._html = OrderedDict()  # graph version -> HTML, least recently used first
+        self._lock = threading.Lock()
+
+    def layout(self, G):
+        """Positions for every node of G, placing only the nodes not seen before."""
+        nodes = list(G.nodes)
+        moving = [i for i, node in enumerate(nodes) if node not in self.positions]
+        if moving:
+            index = {node: i for i, node in enumerate(nodes)}
+            rng = np.random.default_rng(int(graph_version(G)[:8], 16))
+            if len(moving) == len(nodes):
+                pos = self._cold_layout(G, nodes, index, rng)
+            else:
+                pos = np.zeros((len(nodes), 2), dtype=np.float32)
+                for i, node in enumerate(nodes):
+                    if node in self.positions:
+                        pos[i] = self.positions[node]
+                for i in moving:
+                    # Start next to an already placed neighbour, so new chats settle near the hub
+                    anchor = next((index[n] for n in G.neighbors(nodes[i]) if n in self.positions), None)
+                    pos[i] = (pos[anchor] if anchor is not None else pos.mean(axis=0)) + rng.uniform(-1, 1, 2)
+                edges = np.array(
+                    [(row, index[n]) for row, i in enumerate(moving) for n in G.neighbors(nodes[i])],
+                    dtype=np.int64
+                ).reshape(-1, 2)
+                pos[moving] = force_layout(pos, np.asarray(moving), edges, self.layout_iterations, 1.0)
+            self.positions.update((nodes[i], (float(pos[i, 0]), float(pos[i, 1]))) for i in moving)
+        # Forget nodes that left the graph, so memory follows the graph size (with slack
+        # for sessions showing slightly different pages of the same history)
+        if len(self.positions) > 2 * G.number_of_nodes() + 100:
+            self.positions = {node: self.positions[node] for node in G.nodes}
+        return self.positions
+
+    def _cold_layout(self, G, nodes, index, rng):
+        """
+        First layout of G. Leaves (degree-1 nodes, such as a chat's sources)
+        are left out of the force layout, which then runs on the rest alone:
+        each parent repels as much as itself and its leaves together, and
+        its leaves are fanned out around it afterwards, facing away from its
+        other neighbours. For the chat graph that is one node in six.
+        """
+        parents = {}  # leaf -> its only neighbour
+        for i, node in enumerate(nodes):
+            if G.degree(node) == 1:
+                parent = index[next(iter(G.neighbors(node)))]
+                if G.degree(nodes[parent]) > 1:
+                    parents[i] = parent
+        core = [i for i in range(len(nodes)) if i not in parents]
+        core_index = {i: row for row, i in enumerate(core)}
+        weights = np.ones(len(core))
+        children = defaultdict(list)
+        for leaf, parent in parents.items():
+            weights[core_index[parent]] += 1
+            children[parent].append(leaf)
+        edges = np.array(
+            [(row, core_index[index[n]]) for row, i in enumerate(core)
+             for n in G.neighbors(nodes[i]) if index[n] in core_index],
+            dtype=np.int64
+        ).reshape(-1, 2)
+
+        pos = np.zeros((len(nodes), 2))
+        pos[core] = force_layout(rng.uniform(0, np.sqrt(len(nodes)), (len(core), 2)), np.arange(len(core)), edges,
+                                 self.layout_iterations, float(np.sqrt(len(nodes))) / 10, weights)
+        if len(children) > 1:
+            # Spread the core until nearly all parents are 2.5 apart, so fans of radius 1 stay 0.5 apart
+            spread = pos[list(children)]
+            distance = np.sqrt(((spread[:, None] - spread[None, :]) ** 2).sum(axis=2))
+            np.fill_diagonal(distance, np.inf)
+            pos[core] *= max(1.0, 2.5 / np.percentile(distance.min(axis=1), 5))
+        for parent, leaves in children.items():
+            others = [index[n] for n in G.neighbors(nodes[parent]) if index[n] in core_index]
+            if others:
+                outward = pos[parent] - pos[others].mean(axis=0)
+                # A 240 degree fan, leaving room for the edges to the parent's other neighbours
+                angles = np.arctan2(outward[1], outward[0]) + np.linspace(-2 / 3 * np.pi, 2 / 3 * np.pi, len(leaves) + 2)[1:-1]
+            else:
+                angles = np.linspace(0, 2 * np.pi, len(leaves), endpoint=False)
+            # Further out for many leaves, so neighbouring ones stay 0.8 apart
+            radius = max(1.0, 0.8 / (angles[1] - angles[0])) if len(leaves) > 1 else 1.0
+            pos[leaves] = pos[parent] + radius * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        return pos
+
+    def _build_html(self, G, positions):
+        net = Network(height="500px", width="100%", bgcolor="#ffffff", font_color="black")
+        for node_id, node_data in G.nodes(data=True):
+            color, size = GROUP_STYLES.get(node_data.get("group"), GROUP_STYLES["source"])
+            placement = {}
+            if positions is not None:
+                x, y = positions[node_id]
+                placement = {"x": x * self.scale, "y": y * self.scale}
+            net.add_node(node_id,
+                         label=node_data["label"],
+                         title=node_data["title"],
+                         color=color,
+                         size=size,
+                         **placement)
+        # Network.add_edge scans every node and edge already added, which is quadratic
+        # in the graph size; G has no duplicate edges, so append pyvis's edge records directly
+        net.edges.extend({"from": source, "to": target} for source, target in G.edges())
+        physics = BROWSER_PHYSICS if positions is None else NETWORK_OPTIONS["physics"]
+        net.set_options(json.dumps({**NETWORK_OPTIONS, "physics": physics}))
+        return net.generate_html()
+
+    def render(self, G):
+        """HTML for G, from the cache when this graph version was rendered before."""
+        version = graph_version(G)
+        with self._lock:
+            html = self._html.get(version)
+            if html is not None:
+                self._html.move_to_end(version)
+                self.hits += 1
+                return html
+            self.misses += 1
+            positions = self.layout(G) if G.number_of_nodes() >= self.min_nodes else None
+            html = self._build_html(G, positions)
+            self._html[version] = html
+            while len(self._html) > self.cache_size:
+                self._html.popitem(last=False)
+            return html
+
+
+chat_graph_renderer = GraphRenderer()
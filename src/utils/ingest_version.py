@@ -0,0 +1,23 @@
+import os
+import uuid
+from src.utils import config
+
+
+def read_ingest_version():
+    """Returns the token written by the last ingestion run that changed the collection."""
+    try:
+        with open(config.INGEST_VERSION_PATH, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def bump_ingest_version():
+    """Marks the collection as changed so caches built on the old contents are dropped."""
+    os.makedirs(os.path.dirname(config.INGEST_VERSION_PATH) or ".", exist_ok=True)
+    version = uuid.uuid4().hex
+    tmp_path = config.INGEST_VERSION_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, config.INGEST_VERSION_PATH)
+    return version
@@ -1,12 +1,88 @@
 from neo4j import GraphDatabase
 import networkx as nx
-from pyvis.network import Network
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timezone
+import atexit
 import json
+import queue
 import ssl
+import threading
+import time
+import uuid
+from src.utils import config
+from src.utils.graph_render import chat_graph_renderer
+
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT chat_id_unique IF NOT EXISTS FOR (c:Chat) REQUIRE c.id IS UNIQUE",
+    "CREATE CONSTRAINT source_id_unique IF NOT EXISTS FOR (s:Source) REQUIRE s.id IS UNIQUE",
+    "CREATE INDEX chat_timestamp IF NOT EXISTS FOR (c:Chat) ON (c.timestamp)",
+]
+
+def new_chat_id():
+    """Sortable by time, and unique even for chats stored in the same second."""
+    return f"chat_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:12]}"
+
+def normalize_sources(sources):
+    """Sources as a list of dicts, whether given as a list, a single source or (JSON) text."""
+    if not sources:
+        return []
+    # Parse sources if it's a string
+    if isinstance(sources, str):
+        try:
+            sources = json.loads(sources)
+        except ValueError:
+            sources = [{"content": sources}]
+    # Handle both list and single source
+    if not isinstance(sources, list):
+        sources = [sources]
+    return sources
+
+def build_chat(query, response, sources):
+    """Parameters for one chat interaction, timestamped now (not when it is written)."""
+    chat_id = new_chat_id()
+    return {
+        "chat_id": chat_id,
+        "query": query,
+        "response": response,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "sources": [
+            {
+                "id": f"{chat_id}_source_{i}",
+                "content": source.get("content", str(source)) if isinstance(source, dict) else str(source)
+            }
+            for i, source in enumerate(normalize_sources(sources))
+        ]
+    }
+
+def _write_chats(tx, chats):
+    # One round trip for any number of chats: each chat node, then its sources and edges
+    tx.run("""
+        UNWIND $chats AS chat
+        CREATE (c:Chat {
+            id: chat.chat_id,
+            query: chat.query,
+            response: chat.response,
+            timestamp: datetime(chat.timestamp)
+        })
+        WITH c, chat
+        UNWIND chat.sources AS source
+        CREATE (s:Source {id: source.id, content: source.content})
+        CREATE (c)-[:REFERENCES]->(s)
+    """, {"chats": chats}).consume()
 
 class Neo4jConnection:
+    """
+    Neo4j access for the chat log and its visualization.
+
+    enqueue_chat_interaction() returns immediately: interactions are buffered
+    (at most CHAT_LOG_QUEUE_SIZE) and a background thread writes them in
+    batches of up to CHAT_LOG_BATCH_SIZE, or whatever has arrived after
+    CHAT_LOG_FLUSH_INTERVAL_MS. When the buffer is full, because Neo4j is
+    slow or down, callers wait up to CHAT_LOG_ENQUEUE_TIMEOUT_MS and the
+    interaction is then dropped. close() (also run at exit) drains the buffer.
+    """
+    _schema_ready = set()  # URIs whose constraints and indexes were already ensured by this process
+
     def __init__(self, uri, username, password):
         try:
             # Initialize driver with secure connection
@@ -25,109 +101,167 @@ class Neo4jConnection:
         except Exception as e:
             print(f"Error initializing Neo4j connection: {str(e)}")
             raise
+
+        if uri not in Neo4jConnection._schema_ready:
+            if self.ensure_schema():
+                Neo4jConnection._schema_ready.add(uri)
+
+        # Write-behind buffer for the chat log; the writer thread starts with the first interaction
+        self._chat_queue = queue.Queue(maxsize=config.CHAT_LOG_QUEUE_SIZE)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._closing = threading.Event()
+        self.chats_written = 0
+        self.chats_dropped = 0
         
-    def close(self):
+    def close(self, timeout=None):
+        """Writes pending chat interactions (waiting at most `timeout` seconds), then closes the driver."""
+        if hasattr(self, '_closing') and not self._closing.is_set():
+            self._closing.set()
+            if self._writer is not None:
+                self._writer.join(config.CHAT_LOG_DRAIN_TIMEOUT_SECONDS if timeout is None else timeout)
+                if self._writer.is_alive() or not self._chat_queue.empty():
+                    print(f"Neo4j chat log: closed with about {self._chat_queue.qsize()} interactions unwritten")
         if hasattr(self, 'driver'):
             self.driver.close()
+
+    def ensure_schema(self):
+        """Creates the constraints and indexes chat persistence relies on, if missing."""
+        try:
+            with self.driver.session() as session:
+                for statement in SCHEMA_STATEMENTS:
+                    session.run(statement).consume()
+            return True
+        except Exception as e:
+            # e.g. duplicate chat IDs written before IDs were made unique
+            print(f"Error creating Neo4j constraints and indexes: {str(e)}")
+            return False
         
     def create_chat_interaction(self, query, response, sources):
-        """Create chat interaction nodes and relationships"""
+        """Create chat interaction nodes and relationships in a single write transaction"""
         try:
             with self.driver.session() as session:
-                # Create chat interaction node
-                chat_id = f"chat_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                
-                # Create chat node
-                session.run("""
-                    CREATE (c:Chat {
-                        id: $chat_id,
-                        query: $query,
-                        response: $response,
-                        timestamp: datetime()
-                    })
-                """, {
-                    "chat_id": chat_id,
-                    "query": query,
-                    "response": response
-                })
-                
-                # Create source nodes and relationships if sources exist
-                if sources:
-                    # Parse sources if it's a string
-                    if isinstance(sources, str):
-                        try:
-                            sources = json.loads(sources)
-                        except:
-                            sources = [{"content": sources}]
-                    
-                    # Handle both list and single source
-                    if not isinstance(sources, list):
-                        sources = [sources]
-                    
-                    for i, source in enumerate(sources):
-                        source_id = f"{chat_id}_source_{i}"
-                        source_content = source.get("content", str(source))
-                        
-                        # Create source node
-                        session.run("""
-                            CREATE (s:Source {
-                                id: $source_id,
-                                content: $content
-                            })
-                        """, {
-                            "source_id": source_id,
-                            "content": source_content
-                        })
-                        
-                        # Create relationship
-                        session.run("""
-                            MATCH (c:Chat {id: $chat_id})
-                            MATCH (s:Source {id: $source_id})
-                            CREATE (c)-[:REFERENCES]->(s)
-                        """, {
-                            "chat_id": chat_id,
-                            "source_id": source_id
-                        })
-                
-                return True
+                session.execute_write(_write_chats, [build_chat(query, response, sources)])
+            return True
         except Exception as e:
             print(f"Error storing chat in Neo4j: {str(e)}")
             return False
+
+    def enqueue_chat_interaction(self, query, response, sources):
+        """
+        Buffers a chat interaction for the background writer. Returns False
+        if it was dropped (buffer full, or the connection is closing).
+        """
+        if self._closing.is_set():
+            return False
+        self._start_writer()
+        try:
+            self._chat_queue.put(build_chat(query, response, sources), timeout=config.CHAT_LOG_ENQUEUE_TIMEOUT_MS / 1000)
+            return True
+        except queue.Full:
+            self.chats_dropped += 1
+            if self.chats_dropped == 1 or self.chats_dropped % 100 == 0:  # Once per outage is enough noise
+                print(f"Neo4j chat log: buffer full, dropping interactions ({self.chats_dropped} dropped so far)")
+            return False
+
+    def _start_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="neo4j-chat-log", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _next_batch(self):
+        """Waits for an interaction, then collects more until the batch is full or the flush interval ends."""
+        try:
+            batch = [self._chat_queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + config.CHAT_LOG_FLUSH_INTERVAL_MS / 1000
+        while len(batch) < config.CHAT_LOG_BATCH_SIZE:
+            try:
+                if self._closing.is_set():
+                    batch.append(self._chat_queue.get_nowait())  # Draining: don't wait for stragglers
+                else:
+                    batch.append(self._chat_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch):
+        for attempt in range(config.CHAT_LOG_MAX_RETRIES + 1):
+            try:
+                with self.driver.session() as session:
+                    session.execute_write(_write_chats, batch)
+                self.chats_written += len(batch)
+                return
+            except Exception as e:
+                if attempt == config.CHAT_LOG_MAX_RETRIES or self._closing.is_set():
+                    self.chats_dropped += len(batch)
+                    print(f"Error storing {len(batch)} chats in Neo4j, dropping them: {str(e)}")
+                    return
+                delay = min(2 ** attempt, 30)
+                print(f"Error storing {len(batch)} chats in Neo4j ({str(e)}), retrying in {delay}s...")
+                self._closing.wait(delay)
+
+    def _run_writer(self):
+        while not (self._closing.is_set() and self._chat_queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write_batch(batch)
             
-    def get_chat_graph(self):
-        """Retrieve chat interactions and sources"""
+    def get_chat_graph_page(self, limit=None, before=None, after=None):
+        """
+        One page of chats for the graph, each with its sources collected
+        server-side and texts cut to CHAT_GRAPH_TEXT_CHARS:
+            {"id", "query", "response", "timestamp", "sources": [{"id", "content"}]}
+        Pages run newest first, older than the `before` timestamp cursor if
+        given. With `after`, only chats newer than that cursor are returned,
+        oldest first, so repeated calls catch up on new interactions.
+        A chat's "timestamp" is the cursor for the next call.
+        """
+        limit = limit or config.CHAT_GRAPH_PAGE_SIZE
+        # The range predicate lets Neo4j walk the Chat.timestamp index in order and stop at the limit
+        if after is not None:
+            where, order = "c.timestamp > datetime($after)", "ASC"
+        elif before is not None:
+            where, order = "c.timestamp < datetime($before)", "DESC"
+        else:
+            where, order = "c.timestamp IS NOT NULL", "DESC"
         try:
             with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (c:Chat)-[r:REFERENCES]->(s:Source)
-                    RETURN c, s
-                    ORDER BY c.timestamp DESC
-                    LIMIT 50
-                """)
-                
-                chats = []
-                for record in result:
-                    chat = record["c"]
-                    source = record["s"]
-                    chats.append({
-                        "chat": {
-                            "id": chat["id"],
-                            "query": chat["query"],
-                            "response": chat["response"],
-                            "timestamp": str(chat["timestamp"])
-                        },
-                        "source": {
-                            "id": source["id"],
-                            "content": source["content"]
-                        }
-                    })
-                return chats
+                result = session.run(f"""
+                    MATCH (c:Chat)
+                    WHERE {where}
+                    WITH c ORDER BY c.timestamp {order} LIMIT $limit
+                    RETURN c.id AS id,
+                           left(coalesce(c.query, ''), $chars) AS query,
+                           left(coalesce(c.response, ''), $chars) AS response,
+                           toString(c.timestamp) AS timestamp,
+                           [(c)-[:REFERENCES]->(s:Source) | {{id: s.id, content: left(coalesce(s.content, ''), $chars)}}] AS sources
+                    ORDER BY c.timestamp {order}
+                """, {"after": after, "before": before, "limit": limit, "chars": config.CHAT_GRAPH_TEXT_CHARS})
+                return [record.data() for record in result]
         except Exception as e:
             print(f"Error retrieving chat graph: {str(e)}")
             return []
 
+    def get_new_chats(self, since, max_chats=None):
+        """Every chat newer than the `since` cursor (up to `max_chats`), newest first."""
+        max_chats = max_chats or config.CHAT_GRAPH_MAX_CHATS
+        chats = []
+        while len(chats) < max_chats:
+            page = self.get_chat_graph_page(min(config.CHAT_GRAPH_PAGE_SIZE, max_chats - len(chats)), after=since)
+            chats.extend(page)
+            if len(page) < config.CHAT_GRAPH_PAGE_SIZE:
+                break
+            since = page[-1]["timestamp"]
+        return chats[::-1]
+
 def create_visualization(chat_data):
-    """Create a NetworkX graph from chat data"""
+    """Create a NetworkX graph from chats as returned by get_chat_graph_page"""
     G = nx.Graph()
     
     # Add RBI Circulars central node
@@ -138,10 +272,7 @@ def create_visualization(chat_data):
               size=40)
     
     # Add nodes and edges
-    for item in chat_data:
-        chat = item["chat"]
-        source = item["source"]
-        
+    for chat in chat_data:
         # Add chat node with more detailed information
         G.add_node(chat["id"], 
                   label=f"Q: {chat['query'][:30]}...",
@@ -155,21 +286,22 @@ def create_visualization(chat_data):
                   </div>
                   """,
                   group="chat")
-        
-        # Add source node with more detailed information
-        G.add_node(source["id"],
-                  label=f"S: {source['content'][:30]}...",
-                  title=f"""
-                  <div style='font-family: Arial; padding: 10px;'>
-                    <h3 style='color: #ff7f0e;'>Source:</h3>
-                    <p>{source['content']}</p>
-                  </div>
-                  """,
-                  group="source")
-        
-        # Add edges: RBI -> Query -> Source
         G.add_edge("rbi_circulars", chat["id"])
-        G.add_edge(chat["id"], source["id"])
+        
+        for source in chat["sources"]:
+            # Add source node with more detailed information
+            G.add_node(source["id"],
+                      label=f"S: {source['content'][:30]}...",
+                      title=f"""
+                      <div style='font-family: Arial; padding: 10px;'>
+                        <h3 style='color: #ff7f0e;'>Source:</h3>
+                        <p>{source['content']}</p>
+                      </div>
+                      """,
+                      group="source")
+            
+            # Add edges: RBI -> Query -> Source
+            G.add_edge(chat["id"], source["id"])
     
     return G
 
@@ -182,88 +314,6 @@ def visualize_chat_graph(chat_data):
     # Create NetworkX graph
     G = create_visualization(chat_data)
     
-    # Create Pyvis network
-    net = Network(height="500px", width="100%", bgcolor="#ffffff", font_color="black")
-    
-    # Add nodes and edges from NetworkX graph
-    for node in G.nodes(data=True):
-        node_id = node[0]
-        node_data = node[1]
-        
-        # Set node colors based on group
-        if node_data["group"] == "rbi":
-            color = "#2ca02c"  # Green for RBI node
-            size = 40
-        elif node_data["group"] == "chat":
-            color = "#1f77b4"  # Blue for chat nodes
-            size = 25
-        else:
-            color = "#ff7f0e"  # Orange for source nodes
-            size = 20
-        
-        net.add_node(node_id,
-                    label=node_data["label"],
-                    title=node_data["title"],
-                    color=color,
-                    size=size)
-    
-    for edge in G.edges():
-        net.add_edge(edge[0], edge[1])
-    
-    # Set physics layout and interaction options
-    net.set_options("""
-    {
-        "physics": {
-            "forceAtlas2Based": {
-                "gravitationalConstant": -100,
-                "centralGravity": 0.1,
-                "springLength": 200,
-                "springConstant": 0.1
-            },
-            "maxVelocity": 50,
-            "solver": "forceAtlas2Based",
-            "timestep": 0.35,
-            "stabilization": {
-                "enabled": true,
-                "iterations": 1000
-            }
-        },
-        "interaction": {
-            "hover": true,
-            "tooltipDelay": 200,
-            "hideEdgesOnDrag": true,
-            "navigationButtons": true
-        },
-        "nodes": {
-            "font": {
-                "size": 14,
-                "face": "Arial",
-                "strokeWidth": 2,
-                "strokeColor": "#ffffff"
-            },
-            "shape": "dot",
-            "borderWidth": 2,
-            "shadow": true
-        },
-        "edges": {
-            "width": 2,
-            "shadow": true,
-            "smooth": {
-                "type": "continuous",
-                "forceDirection": "none"
-            },
-            "arrows": {
-                "to": {
-                    "enabled": true,
-                    "scaleFactor": 0.5
-                }
-            }
-        }
-    }
-    """)
-    
-    # Save and display the graph
-    net.save_graph("chat_graph.html")
-    with open("chat_graph.html", "r", encoding="utf-8") as f:
-        html = f.read()
-    st.components.v1.html(html, height=600, scrolling=True) 
\ No newline at end of file
+    # Lay out new nodes and render, or reuse the HTML of an unchanged graph
+    html = chat_graph_renderer.render(G)
+    st.components.v1.html(html, height=600, scrolling=True)
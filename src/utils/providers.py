@@ -0,0 +1,202 @@
+"""
+Embedding and generation providers.
+
+Ingestion and query_rag reach the models only through the provider
+returned by get_embedder() / get_generator(), chosen by
+EMBEDDING_PROVIDER and GENERATION_PROVIDER:
+
+    gemini    the Gemini API (configured on first use, not at import)
+    hashing   deterministic offline embeddings: every token maps to a fixed
+              pseudo-random direction, weighted by log term frequency, with
+              an optional per-call delay standing in for the API round trip
+    template  offline answers filled from LOCAL_GENERATION_TEMPLATE after a
+              configurable delay, streamed in word-sized fragments
+
+The offline providers need no network or API key, so ingestion and query
+throughput can be load-tested and profiled anywhere. Their output is only
+meaningful for timing: hashing similarities reflect shared words, not
+meaning, and are not on Gemini's score scale.
+
+Embedders expose `model_name`, which goes into embedding cache keys and
+content hashes so vectors from different providers never mix.
+"""
+import asyncio
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+from src.utils import config
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_QUESTION = re.compile(r"QUESTION:\s*(.*?)\s*(?:\n\s*\n|$)", re.DOTALL)
+
+_lock = threading.Lock()
+_embedder = None
+_generator = None
+_genai_configured = False
+
+
+def _genai():
+    """google.generativeai, configured with GOOGLE_API_KEY the first time it is needed."""
+    global _genai_configured
+    import google.generativeai as genai
+    with _lock:
+        if not _genai_configured:
+            if not config.GOOGLE_API_KEY:
+                raise ValueError("GOOGLE_API_KEY is not set in environment variables")
+            genai.configure(api_key=config.GOOGLE_API_KEY)
+            _genai_configured = True
+    return genai
+
+
+class GeminiEmbedder:
+    def __init__(self, model=None):
+        self.model_name = model or config.GEMINI_EMBEDDING_MODEL
+
+    def embed(self, texts, task_type="retrieval_document"):
+        """One embedding (list of floats) per text, from a single API call."""
+        result = _genai().embed_content(model=self.model_name, content=list(texts), task_type=task_type)
+        if not result or "embedding" not in result:
+            raise ValueError("Invalid embedding result")
+        return result["embedding"]
+
+
+class HashingEmbedder:
+    """
+    Sum of per-token random unit directions (seeded by a hash of the token),
+    weighted by 1 + log(term frequency) and normalized. The same text always
+    gets the same vector, in any process. Each embed() call first sleeps
+    `latency_ms` plus up to `jitter_ms` at random, like one batch request.
+    """
+
+    def __init__(self, dim=None, seed=0, latency_ms=None, jitter_ms=None):
+        self.dim = dim or config.EMBEDDING_DIM
+        self.seed = seed
+        self.model_name = f"hashing-{self.dim}-{seed}"
+        self.latency = (config.LOCAL_EMBEDDING_LATENCY_MS if latency_ms is None else latency_ms) / 1000
+        self.jitter = (config.LOCAL_EMBEDDING_JITTER_MS if jitter_ms is None else jitter_ms) / 1000
+        self._direction = lru_cache(maxsize=100_000)(self._token_direction)
+
+    def _token_direction(self, token):
+        rng = np.random.default_rng([zlib.crc32(token.encode("utf-8")), self.seed])
+        return rng.standard_normal(self.dim).astype(np.float32)
+
+    def embed_one(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token, tf in Counter(_TOKEN.findall(text.lower())).items():
+            vector += (1 + math.log(tf)) * self._direction(token)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed(self, texts, task_type="retrieval_document"):
+        # Task type only tunes Gemini's embedding; queries and documents share one space here
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        return [self.embed_one(text) for text in texts]
+
+
+class GeminiGenerator:
+    def __init__(self, model=None):
+        self.model_name = model or config.GEMINI_GENERATION_MODEL
+        self._model = None
+
+    def _get_model(self):
+        if self._model is None:
+            self._model = _genai().GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt):
+        return self._get_model().generate_content(prompt).text
+
+    def generate_stream(self, prompt):
+        """Yields text fragments as Gemini produces them."""
+        for chunk in self._get_model().generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # Chunks without text parts (e.g. safety metadata only)
+            if text:
+                yield text
+
+    async def generate_async(self, prompt):
+        response = await self._get_model().generate_content_async(prompt)
+        return response.text
+
+
+class TemplateGenerator:
+    """
+    Answers from `template` ({question}, {prompt_chars}) after `latency_ms`;
+    streams it as words, `fragment_ms` apart, after the same first delay.
+    """
+
+    def __init__(self, template=None, latency_ms=None, fragment_ms=None):
+        self.model_name = "template"
+        self.template = template or config.LOCAL_GENERATION_TEMPLATE
+        self.latency = (config.LOCAL_GENERATION_LATENCY_MS if latency_ms is None else latency_ms) / 1000
+        self.fragment_delay = (config.LOCAL_GENERATION_FRAGMENT_MS if fragment_ms is None else fragment_ms) / 1000
+
+    def _answer(self, prompt):
+        # Prompts from rag.build_prompt end with a QUESTION: section; otherwise quote the last line
+        match = _QUESTION.search(prompt)
+        question = match.group(1) if match else (prompt.strip().splitlines() or [""])[-1]
+        return self.template.format(question=question, prompt_chars=len(prompt))
+
+    def generate(self, prompt):
+        answer = self._answer(prompt)
+        time.sleep(self.latency + self.fragment_delay * len(answer.split()))
+        return answer
+
+    def generate_stream(self, prompt):
+        time.sleep(self.latency)
+        for position, word in enumerate(self._answer(prompt).split(" ")):
+            if position:
+                time.sleep(self.fragment_delay)
+            yield word if position == 0 else " " + word
+
+    async def generate_async(self, prompt):
+        answer = self._answer(prompt)
+        await asyncio.sleep(self.latency + self.fragment_delay * len(answer.split()))
+        return answer
+
+
+def make_embedder(name=None):
+    name = name or config.EMBEDDING_PROVIDER
+    if name == "gemini":
+        return GeminiEmbedder()
+    if name == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"Unknown embedding provider {name!r}; expected 'gemini' or 'hashing'")
+
+
+def make_generator(name=None):
+    name = name or config.GENERATION_PROVIDER
+    if name == "gemini":
+        return GeminiGenerator()
+    if name == "template":
+        return TemplateGenerator()
+    raise ValueError(f"Unknown generation provider {name!r}; expected 'gemini' or 'template'")
+
+
+def get_embedder():
+    """The process-wide embedder for EMBEDDING_PROVIDER."""
+    global _embedder
+    if _embedder is None:
+        with _lock:
+            if _embedder is None:
+                _embedder = make_embedder()
+    return _embedder
+
+
+def get_generator():
+    """The process-wide generator for GENERATION_PROVIDER."""
+    global _generator
+    if _generator is None:
+        with _lock:
+            if _generator is None:
+                _generator = make_generator()
+    return _generator
@@ -0,0 +1,55 @@
+import pytest
+from src.retrieval.bm25 import (
+    BM25Index, BM25IndexBuilder, identifier_query, is_strong_lexical_match, reciprocal_rank_fusion, tokenize
+)
+
+
+@pytest.fixture
+def index(tmp_path):
+    builder = BM25IndexBuilder()
+    builder.add("p1", "Master Direction on KYC for banks, DOR.AML.REC.49/14.01.001/2024-25", "RBI/2024-25/01")
+    builder.add("p2", "Interest subvention scheme for short term crop loans", "RBI/2024-25/02")
+    builder.add("p3", "KYC updation for low risk customers of banks", "RBI/2024-25/03")
+    builder.add("p4", "Priority sector lending targets", "RBI/2024-25/04")
+    path = str(tmp_path / "bm25.npz")
+    builder.save(path)
+    return BM25Index(path)
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    tokens = tokenize("See RBI/2024-2025/99 and DOR.STR.REC.54")
+    assert "rbi/2024-25/99" in tokens
+    assert "dor.str.rec.54" in tokens and "str" in tokens
+    assert "99" not in tokens  # Bare serials inside identifiers are dropped
+
+
+def test_identifier_query_keeps_only_identifiers():
+    assert identifier_query("What does DOR.STR.REC.54 say about KYC?") == "dor.str.rec.54"
+    assert identifier_query("What are the KYC norms?") == ""
+
+
+def test_search_ranks_matching_documents(index):
+    hits = index.search("KYC updation", 10)
+    assert [point_id for point_id, _, _ in hits] == ["p3", "p1"]
+    assert hits[0][2] == "RBI/2024-25/03"
+    assert hits[0][1] > hits[1][1] > 0
+
+
+def test_search_respects_limit_and_unknown_terms(index):
+    assert len(index.search("banks KYC", 1)) == 1
+    assert index.search("unrelated words", 10) == []
+
+
+def test_exact_identifier_is_a_strong_match(index):
+    hits = index.search(identifier_query("DOR.AML.REC.49/14.01.001/2024-25"), 10)
+    assert hits[0][0] == "p1"
+    assert is_strong_lexical_match(hits, min_score=1.0, min_margin=2.0)
+    assert not is_strong_lexical_match(index.search("banks", 10), min_score=0.1, min_margin=2.0)
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion(["a", "b", "c"], ["c", "a", "d"], k=60)
+    assert fused[:2] == ["a", "c"]
+    assert set(fused) == {"a", "b", "c", "d"}
+    assert reciprocal_rank_fusion(["a", "b"], ["b"], k=60, limit=1) == ["b"]
+    assert reciprocal_rank_fusion([], k=60) == []
@@ -0,0 +1,83 @@
+from src.ingestion.chunking import chunk_circular, split_chunk_header, split_text
+
+
+def make_circular(*sections):
+    return {
+        "Circular Number": "RBI/2024-25/12",
+        "Subject": "Know Your Customer",
+        "Date Of Issue": "02.04.2024",
+        "Department": "DoR",
+        "Meant For": "All Commercial Banks",
+        "link": "https://rbi.org.in/12",
+        "details": {"circular": {"contentSections": [
+            {"title": title, "content": content} for title, content in sections
+        ]}},
+    }
+
+
+def sentences(count, length=60):
+    return " ".join(f"Sentence {i} " + "x" * (length - len(f"Sentence {i} .") - 1) + "." for i in range(count))
+
+
+def test_short_text_is_one_window():
+    assert split_text("Short text.", 100) == [(0, 11)]
+
+
+def test_windows_respect_max_chars_and_end_on_sentences():
+    text = sentences(20)
+    windows = split_text(text, 200, 0)
+    assert len(windows) > 1
+    for start, end in windows:
+        assert end - start <= 200
+        assert text[end - 1] == "."
+    # Without overlap the windows cover the text in order, without repeats
+    assert [start for start, _ in windows] == sorted({start for start, _ in windows})
+
+
+def test_windows_overlap_by_trailing_sentences():
+    text = sentences(20)
+    windows = split_text(text, 200, 70)
+    for (_, previous_end), (start, _) in zip(windows, windows[1:]):
+        assert start < previous_end
+
+
+def test_overlong_sentence_is_split_on_whitespace():
+    text = " ".join(["word"] * 100)
+    windows = split_text(text, 50)
+    assert all(end - start <= 50 for start, end in windows)
+    assert all(text[start] != " " for start, _ in windows)
+
+
+def test_small_sections_are_merged():
+    chunks = list(chunk_circular(make_circular(("A", "a" * 50), ("B", "b" * 50), ("C", "c" * 500)), 600, 0, 200))
+    assert [chunk["chunk_key"] for chunk in chunks] == ["0-1", "2"]
+    assert chunks[0]["metadata"]["section_titles"] == ["A", "B"]
+
+
+def test_long_section_is_windowed_with_offsets():
+    content = sentences(30)
+    chunks = list(chunk_circular(make_circular(("Long", content)), 500, 50, 0))
+    assert len(chunks) > 1
+    for part, chunk in enumerate(chunks):
+        metadata = chunk["metadata"]
+        assert chunk["chunk_key"] == f"0.{part}"
+        assert metadata["parts"] == len(chunks)
+        assert chunk["chunk"].endswith("\n\n" + content[metadata["char_start"]:metadata["char_end"]])
+
+
+def test_max_chars_zero_keeps_one_chunk_per_section():
+    chunks = list(chunk_circular(make_circular(("A", "a"), ("Empty", "  "), ("B", sentences(50))), 0, 0, 0))
+    assert [chunk["chunk_key"] for chunk in chunks] == ["0", "2"]
+
+
+def test_chunk_metadata_is_normalized_for_filters():
+    metadata = next(chunk_circular(make_circular(("A", "text")), 0, 0, 0))["metadata"]
+    assert metadata["issue_date"] == 1712016000
+    assert metadata["department"] == "Department of Regulation"
+    assert metadata["audience"] == ["commercial_banks"]
+
+
+def test_chunk_header_round_trip():
+    chunk = next(chunk_circular(make_circular(("Scope", "Applies to all banks.")), 0, 0, 0))
+    assert split_chunk_header(chunk["chunk"]) == ("Scope", "Applies to all banks.")
+    assert split_chunk_header("plain text") == (None, "plain text")
@@ -0,0 +1,68 @@
+import sys
+import threading
+import time
+import types
+import pytest
+from src.utils import clients, config
+
+
+class SlowConnection:
+    attempts = 0
+    fail = False
+
+    def __init__(self, uri, username, password):
+        SlowConnection.attempts += 1
+        time.sleep(0.3)
+        if SlowConnection.fail:
+            raise ConnectionError("neo4j down")
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fake_neo4j(monkeypatch):
+    monkeypatch.setitem(sys.modules, "src.utils.neo4j_utils", types.SimpleNamespace(Neo4jConnection=SlowConnection))
+    monkeypatch.setattr(clients, "_neo4j_connection", None)
+    monkeypatch.setattr(clients, "_neo4j_error", None)
+    monkeypatch.setattr(clients, "_neo4j_connecting", False)
+    monkeypatch.setattr(config, "NEO4J_RETRY_SECONDS", 30)
+    SlowConnection.attempts, SlowConnection.fail = 0, False
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_current_connection_never_waits_for_the_connect():
+    started = time.monotonic()
+    assert clients.current_neo4j_connection() is None
+    assert clients.current_neo4j_connection() is None  # Attempt already under way: no second one
+    assert time.monotonic() - started < 0.1
+    assert wait_for(lambda: clients.current_neo4j_connection() is not None)
+    assert SlowConnection.attempts == 1
+
+
+def test_failed_connect_is_not_retried_within_the_retry_window():
+    SlowConnection.fail = True
+    assert clients.current_neo4j_connection() is None
+    assert wait_for(lambda: clients._neo4j_error is not None and not clients._neo4j_connecting)
+    assert clients.current_neo4j_connection() is None
+    with pytest.raises(ConnectionError):
+        clients.get_neo4j_connection()
+    assert SlowConnection.attempts == 1
+
+
+def test_connect_does_not_hold_the_client_lock():
+    connecting = threading.Thread(target=clients.get_neo4j_connection)
+    connecting.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with clients._lock:
+        pass
+    assert time.monotonic() - started < 0.1
+    connecting.join()
+    assert clients.current_neo4j_connection() is not None
@@ -0,0 +1,80 @@
+import calendar
+from datetime import datetime
+import pytest
+from src.retrieval.filters import expand_audiences, merge_filters, parse_filters, to_qdrant_filter
+
+
+def epoch(year, month, day):
+    return calendar.timegm(datetime(year, month, day).timetuple())
+
+
+@pytest.mark.parametrize("query", [
+    "relaxation for co-operative banks on interest rates",
+    "rules for regulated entities on DRS",
+    "What is the timeline for NEFT settlement?",
+    "What are the KYC norms?",
+])
+def test_ordinary_wording_does_not_filter(query):
+    assert parse_filters(query) == {}
+
+
+@pytest.mark.parametrize("query, audiences", [
+    ("circulars applicable to NBFCs on KYC", ["nbfcs"]),
+    ("which circulars are meant for all co-operative banks?", ["cooperative_banks"]),
+    ("instructions issued to regional rural banks", ["regional_rural_banks"]),
+])
+def test_explicit_audience_phrasing(query, audiences):
+    assert parse_filters(query)["audiences"] == audiences
+
+
+def test_year_and_month_ranges():
+    assert parse_filters("circulars issued in 2023") == {"date_from": epoch(2023, 1, 1), "date_to": epoch(2024, 1, 1) - 1}
+    assert parse_filters("changes since March 2024") == {"date_from": epoch(2024, 3, 1)}
+    assert parse_filters("anything before 2020") == {"date_to": epoch(2020, 1, 1) - 1}
+
+
+def test_between_dates():
+    filters = parse_filters("circulars between 01.02.2024 and 15.02.2024")
+    assert filters == {"date_from": epoch(2024, 2, 1), "date_to": epoch(2024, 2, 16) - 1}
+
+
+def test_invalid_date_is_ignored():
+    assert "date_from" not in parse_filters("since 31.02.2024")
+
+
+def test_department_code_only_when_capitalised():
+    assert parse_filters("FED circulars on remittances")["departments"] == ["Foreign Exchange Department"]
+    assert parse_filters("the fed raised rates") == {}
+    assert "departments" not in parse_filters("circular FED.CO.No.12 on remittances")
+
+
+def test_explicit_filters_win_over_parsed():
+    merged = merge_filters({"audiences": ["nbfcs"], "departments": []}, {"audiences": ["all_banks"], "date_from": 1})
+    assert merged == {"audiences": ["nbfcs"], "date_from": 1}
+
+
+def test_audiences_expand_to_umbrella_keys():
+    assert expand_audiences(["cooperative_banks"]) == ["all_banks", "cooperative_banks", "regulated_entities"]
+    assert expand_audiences(["payment_system_operators"]) == ["payment_system_operators"]
+
+
+def test_no_filters_means_no_qdrant_filter():
+    assert to_qdrant_filter({}) is None
+    assert len(to_qdrant_filter({"audiences": ["nbfcs"], "date_from": 1}).must) == 2
+
+
+def test_dated_names_a_referenced_circular_not_a_date_filter():
+    assert parse_filters("What changed after the amendment to the circular dated 01.04.2024?") == {}
+
+
+@pytest.mark.parametrize("query", [
+    "What is the limit under LRS in 2024-25?",
+    "LRS limit in FY 2024-2025",
+])
+def test_financial_year_runs_april_to_march(query):
+    assert parse_filters(query) == {"date_from": epoch(2024, 4, 1), "date_to": epoch(2025, 4, 1) - 1}
+
+
+def test_financial_year_bounds_open_ranges():
+    assert parse_filters("changes since 2024-25") == {"date_from": epoch(2024, 4, 1)}
+    assert parse_filters("in 2024-26") == {}  # Not a financial year
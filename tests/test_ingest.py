@@ -0,0 +1,23 @@
+from src.ingestion.ingest import content_hash_for, point_id_for
+
+
+def test_point_id_is_deterministic_uuid():
+    point_id = point_id_for("RBI/2024-25/12", "3")
+    assert point_id == point_id_for("RBI/2024-25/12", "3")
+    assert len(point_id) == 36 and point_id.count("-") == 4
+
+
+def test_point_id_depends_on_circular_and_chunk_key():
+    ids = {point_id_for("RBI/2024-25/12", "3"), point_id_for("RBI/2024-25/12", "3.0"),
+           point_id_for("RBI/2024-25/12", "3-4"), point_id_for("RBI/2024-25/13", "3")}
+    assert len(ids) == 4
+
+
+def test_content_hash_ignores_metadata_key_order():
+    assert content_hash_for("text", {"a": 1, "b": [2]}) == content_hash_for("text", {"b": [2], "a": 1})
+
+
+def test_content_hash_changes_with_text_or_metadata():
+    base = content_hash_for("text", {"subject": "KYC"})
+    assert content_hash_for("text.", {"subject": "KYC"}) != base
+    assert content_hash_for("text", {"subject": "KYC norms"}) != base
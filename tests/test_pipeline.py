@@ -0,0 +1,62 @@
+import threading
+import pytest
+from src.ingestion.pipeline import Pipeline
+
+
+def test_stages_run_in_order():
+    collected = []
+
+    def sink(items):
+        for item in items:
+            collected.append(item)
+            yield item
+
+    stats = (
+        Pipeline(queue_size=2)
+        .add_stage("source", lambda: range(10))
+        .add_stage("double", lambda items: (item * 2 for item in items))
+        .add_stage("sink", sink)
+        .run()
+    )
+    assert collected == [item * 2 for item in range(10)]
+    assert [stage.items for stage in stats] == [10, 10, 10]
+
+
+def test_error_in_middle_stage_propagates_and_stops_the_source():
+    produced = []
+
+    def source():
+        for item in range(100_000):
+            produced.append(item)
+            yield item
+
+    def failing(items):
+        for item in items:
+            if item == 5:
+                raise ValueError("bad item")
+            yield item
+
+    with pytest.raises(ValueError, match="bad item"):
+        Pipeline(queue_size=2).add_stage("source", source).add_stage("fail", failing).add_stage("sink", list).run()
+    # Backpressure plus the stop signal keep the source from running to the end
+    assert len(produced) < 100_000
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("pipeline-")]
+
+
+def test_error_in_last_stage_propagates():
+    def sink(items):
+        for item in items:
+            raise RuntimeError("sink failed")
+        yield
+
+    with pytest.raises(RuntimeError, match="sink failed"):
+        Pipeline(queue_size=1).add_stage("source", lambda: iter(range(1000))).add_stage("sink", sink).run()
+
+
+def test_error_in_first_stage_propagates():
+    def source():
+        yield 1
+        raise OSError("read failed")
+
+    with pytest.raises(OSError, match="read failed"):
+        Pipeline().add_stage("source", source).add_stage("sink", list).run()
@@ -0,0 +1,94 @@
+import time
+import pytest
+from src.ingestion.embedding_cache import EmbeddingCache
+from src.retrieval.query_cache import QueryEmbeddingCache, normalize_query
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+
+def test_normalize_query_ignores_case_spacing_and_trailing_punctuation():
+    assert normalize_query("  What is  KYC?? ") == normalize_query("what is kyc")
+
+
+def test_memory_entry_expires_after_ttl(clock):
+    cache = QueryEmbeddingCache(max_entries=10, ttl_seconds=60)
+    cache.put("kyc norms", [1.0, 0.0])
+    clock.now += 59
+    assert cache.get("kyc norms") == [1.0, 0.0]
+    clock.now += 2
+    assert cache.get("kyc norms") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_entry_is_not_served_from_disk(clock, tmp_path):
+    disk = EmbeddingCache(str(tmp_path), dim=2, max_entries=10)
+    cache = QueryEmbeddingCache(max_entries=10, ttl_seconds=60, disk_cache=disk)
+    cache.put("kyc norms", [1.0, 0.0])
+    clock.now += 61
+    assert cache.get("kyc norms") is None
+    assert cache.stats()["disk_hits"] == 0
+    assert len(disk) == 0
+
+
+def test_disk_entry_keeps_its_write_time_across_restarts(clock, tmp_path):
+    disk = EmbeddingCache(str(tmp_path), dim=2, max_entries=10)
+    QueryEmbeddingCache(ttl_seconds=60, disk_cache=disk).put("kyc norms", [1.0, 0.0])
+    disk.save()
+
+    clock.now += 30
+    restarted = QueryEmbeddingCache(ttl_seconds=60, disk_cache=EmbeddingCache(str(tmp_path), dim=2, max_entries=10))
+    assert restarted.get("kyc norms") == [1.0, 0.0]
+    assert restarted.stats()["disk_hits"] == 1
+
+    # Promoted to memory with the original write time, so it still expires 60s after the put
+    clock.now += 31
+    assert restarted.get("kyc norms") is None
+
+
+def test_embedding_cache_treats_entries_without_write_time_as_expired(clock, tmp_path):
+    disk = EmbeddingCache(str(tmp_path), dim=2, max_entries=10)
+    disk.put("key", [0.5, 0.5])
+    disk._written.clear()
+    disk.save()
+    reopened = EmbeddingCache(str(tmp_path), dim=2, max_entries=10)
+    assert reopened.get("key") == [0.5, 0.5]
+    assert reopened.get("key", max_age=3600) is None
+
+
+def test_expiring_an_entry_does_not_write_the_index(clock, tmp_path):
+    disk = EmbeddingCache(str(tmp_path), dim=2, max_entries=10)
+    disk.put("key", [0.5, 0.5])
+    disk.save()
+    saved = (tmp_path / "index.json").read_text()
+
+    clock.now += 120
+    assert disk.get("key", max_age=60) is None
+    assert (tmp_path / "index.json").read_text() == saved
+    assert disk.dirty
+
+
+def test_expired_slot_is_reused_only_after_the_index_is_saved(clock, tmp_path):
+    disk = EmbeddingCache(str(tmp_path), dim=2, max_entries=1)
+    disk.put("old", [1.0, 0.0])
+    disk.save()
+    clock.now += 120
+    assert disk.get("old", max_age=60) is None
+
+    # The only slot is taken over by a new key without an explicit save; the
+    # index on disk must no longer send "old" to it
+    disk.put("new", [0.0, 1.0])
+    reopened = EmbeddingCache(str(tmp_path), dim=2, max_entries=1)
+    assert reopened.get("old") is None